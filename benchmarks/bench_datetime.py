@@ -0,0 +1,134 @@
+"""Benchmark _calculate_datetime against its previous implementation, on the
+timestamps of tests/test_datetime.py, repeated up to the number of values:
+
+    python benchmarks/bench_datetime.py [number of values, default 1000000]
+"""
+
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import cycle, islice
+
+from pybird import PyBird
+
+# values of tests/test_datetime.py
+VALUES = (
+    "2019-12-10 10:12:19",
+    "2019-12-10",
+    "4:20",
+    "10:12",
+    "14:20",
+    "Jun29",
+    "Dec10",
+    "Dec31",
+    "2019",
+)
+
+
+def legacy_calculate_datetime(value, now=None):
+    """_calculate_datetime before format detection and memoization"""
+    if not now:
+        now = datetime.now()
+
+    # Case: YYYY-MM-DD HH:MM:SS
+    try:
+        return datetime(
+            *map(
+                int,
+                (
+                    value[:4],
+                    value[5:7],
+                    value[8:10],
+                    value[11:13],
+                    value[14:16],
+                    value[17:19],
+                ),
+            )
+        )
+    except ValueError:
+        pass
+
+    # Case: YYYY-MM-DD
+    try:
+        return datetime(*map(int, (value[:4], value[5:7], value[8:10])))
+    except ValueError:
+        pass
+
+    # Case: HH:mm:ss.nnn or HH:mm or HH:mm:ss timestamp
+    try:
+        value = value.split(".")[0]  # strip any "".nnn" suffix
+        try:
+            parsed_value = datetime.strptime(value, "%H:%M")
+
+        except ValueError:
+            parsed_value = datetime.strptime(value, "%H:%M:%S")
+
+        result_date = datetime(
+            now.year, now.month, now.day, parsed_value.hour, parsed_value.minute
+        )
+
+        if now.hour < parsed_value.hour or (
+            now.hour == parsed_value.hour and now.minute < parsed_value.minute
+        ):
+            result_date = result_date - timedelta(days=1)
+
+        return result_date
+    except ValueError:
+        # It's a different format, keep on processing
+        pass
+
+    # Case: "Jun13" timestamp
+    try:
+        parsed = datetime.strptime(value, "%b%d")
+
+        # if now is past the month, it's this year, else last year
+        if now.month == parsed.month:
+            # bird shows time for same day
+            if now.day <= parsed.day:
+                year = now.year - 1
+            else:
+                year = now.year
+
+        elif now.month > parsed.month:
+            year = now.year
+
+        else:
+            year = now.year - 1
+
+        result_date = datetime(year, parsed.month, parsed.day)
+        return result_date
+    except ValueError:
+        pass
+
+    # Case: plain year
+    try:
+        year = int(value)
+        return datetime(year, 1, 1)
+    except ValueError:
+        raise ValueError("Can not parse datetime: [%s]" % value)
+
+
+def run(calculate_datetime, values, now=None):
+    start = time.perf_counter()
+    results = [calculate_datetime(value, now) for value in values]
+    return time.perf_counter() - start, results
+
+
+def main(count=1000000):
+    values = list(islice(cycle(VALUES), count))
+    now = datetime(2019, 12, 10, 10, 12, 19)
+    print(f"values: {count}")
+    for now_name, now_value in (("now", None), ("fixed now", now)):
+        legacy = run(legacy_calculate_datetime, values, now_value)
+        fast = run(PyBird(None)._calculate_datetime, values, now_value)
+        if now_value:
+            assert legacy[1] == fast[1]
+        for name, (elapsed, _) in (("legacy", legacy), ("memoized", fast)):
+            print(
+                f"{now_name:>9}, {name:>8}: {elapsed:.2f}s,"
+                f" {count / elapsed:9.0f} values/s"
+            )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
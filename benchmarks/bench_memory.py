@@ -0,0 +1,40 @@
+"""Compare the memory held by a parsed full table, with a dict per route,
+with Route objects and with LazyRoute objects.
+
+    python benchmarks/bench_memory.py [number of routes, default 200000]
+"""
+
+import gc
+import sys
+import tracemalloc
+
+from generate import route_lines
+
+from pybird import LazyRoute, PyBird, Route
+
+
+def measure(record_type, count):
+    bird = PyBird(None)
+    gc.collect()
+    tracemalloc.start()
+    lines = route_lines(count, static=0)
+    routes = list(bird._iter_route_data(lines, record_type=record_type))
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(routes) == count
+    return held
+
+
+def main(count=200000):
+    print(f"routes: {count}")
+    for record_type in (dict, Route, LazyRoute):
+        held = measure(record_type, count)
+        print(
+            f"{record_type.__name__:>9}: {held / 1024 / 1024:6.1f} MB held,"
+            f" {held / count:4.0f} bytes per route"
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
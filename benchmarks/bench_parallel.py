@@ -0,0 +1,43 @@
+"""Benchmark parsing a large `show route all` reply in parallel, with an
+increasing number of worker processes.
+
+    python benchmarks/bench_parallel.py [number of routes, default 1000000]
+        [worker counts, default 1 2 4 ... up to the number of CPUs]
+"""
+
+import os
+import sys
+import time
+
+from generate import reply, route_lines
+
+from pybird import PyBird
+
+
+def worker_counts():
+    counts = [1]
+    while counts[-1] * 2 <= (os.cpu_count() or 1):
+        counts.append(counts[-1] * 2)
+    return counts
+
+
+def main(count=1000000, *workers):
+    data = reply(route_lines(count, static=0))
+    bird = PyBird(None)
+    print(f"routes: {count}, reply size: {len(data) / 1024 / 1024:.0f} MB")
+    print(f"CPUs: {os.cpu_count()}")
+    serial = None
+    for worker_count in workers or worker_counts():
+        start = time.perf_counter()
+        routes = bird._parse_route_data(data, workers=worker_count)
+        elapsed = time.perf_counter() - start
+        assert len(routes) == count
+        serial = serial or elapsed
+        print(
+            f"{worker_count:3} workers: {elapsed:6.2f}s,"
+            f" {count / elapsed:8.0f} routes/s, speedup {serial / elapsed:4.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
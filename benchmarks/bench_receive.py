@@ -0,0 +1,128 @@
+"""Benchmark the control socket receive path on a large synthetic
+`show route all` reply, against the previous implementation.
+
+    python benchmarks/bench_receive.py [size in MB, default 100]
+"""
+
+import socket
+import sys
+import time
+import tracemalloc
+from threading import Thread
+
+from pybird import PyBird, _ReplyReader
+
+ROUTE = (
+    "1007-10.{}.{}.0/24     via 10.203.0.143 on eth0 [peer1 2017-01-15] * (100) [AS65001i]\n"
+    "1008-   Type: BGP unicast univ\n"
+    "1012-   BGP.origin: IGP\n"
+    "        BGP.as_path: 65001 65002 65003\n"
+    "        BGP.next_hop: 10.203.0.143\n"
+    "        BGP.local_pref: 100\n"
+    "        BGP.community: (65003,54321) (65001,12345)\n"
+)
+
+
+def make_reply(size):
+    """Return a reply of about size bytes"""
+    count = size // len(ROUTE.format(0, 0))
+    routes = "".join(ROUTE.format(i // 256 % 256, i % 256) for i in range(count))
+    return ("0001 BIRD 1.6.0 ready.\n" + routes + "0000\n").encode("utf-8")
+
+
+def legacy_receive(sock, fields=PyBird.reply_end_fields):
+    """The receive loop of _socket_query before the buffer rework"""
+    data = []
+    while True:
+        this_read = sock.recv(1024 * 1024)
+        if not this_read:
+            raise ValueError("Could not read additional data from BIRD")
+        data.append(this_read)
+        if len(this_read) > 256:
+            tail = this_read[-256:].decode("utf-8")
+        else:
+            tail = b"".join(data[-2:])[-256:].decode("utf-8")
+        if any([tail.find(f"\n{code:04}") != -1 for code in fields]):
+            break
+    return b"".join(data).decode("utf-8")
+
+
+def legacy_receive_lines(sock, is_reply_end=PyBird(None)._is_reply_end):
+    """The streaming receive loop before the buffer rework, decoding and
+    checking every line separately"""
+    rest = b""
+    while True:
+        this_read = sock.recv(1024 * 1024)
+        if not this_read:
+            raise ValueError("Could not read additional data from BIRD")
+        lines = (rest + this_read).split(b"\n")
+        rest = lines.pop()
+        for line in lines:
+            line = line.decode("utf-8")
+            yield line
+            if is_reply_end(line):
+                return
+
+
+def reader_receive(sock):
+    return _ReplyReader(sock, PyBird.reply_end_fields).read_reply()
+
+
+def reader_receive_lines(sock):
+    return _ReplyReader(sock, PyBird.reply_end_fields).read_lines()
+
+
+class ReusedReader:
+    """a keepalive session reads all replies into the same buffer"""
+
+    def __init__(self):
+        self.reader = _ReplyReader(None, PyBird.reply_end_fields)
+
+    def __call__(self, sock):
+        self.reader.sock = sock
+        return self.reader.read_reply()
+
+
+def run(receive, reply, trace=False):
+    sock, peer = socket.socketpair()
+    sender = Thread(target=peer.sendall, args=(reply,))
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    sender.start()
+    result = receive(sock)
+    if not isinstance(result, str):
+        # consume the lines, like a parser would
+        size = sum(len(line) + 1 for line in result)
+    else:
+        size = len(result)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if trace else 0
+    tracemalloc.stop()
+    sender.join()
+    sock.close()
+    peer.close()
+    assert size == len(reply)
+    return elapsed, peak
+
+
+def main(size_mb=100, rounds=3):
+    reply = make_reply(size_mb * 1024 * 1024)
+    print(f"reply size: {len(reply) / 1024 / 1024:.1f} MB")
+    for name, receive in (
+        ("full reply, legacy", legacy_receive),
+        ("full reply, reader", reader_receive),
+        ("full reply, reused reader", ReusedReader()),
+        ("lines, legacy", legacy_receive_lines),
+        ("lines, reader", reader_receive_lines),
+    ):
+        elapsed = min(run(receive, reply)[0] for _ in range(rounds))
+        peak = run(receive, reply, trace=True)[1]
+        print(
+            f"{name:>26}: {elapsed:.3f}s {len(reply) / elapsed / 1024 / 1024:5.0f} MB/s,"
+            f" peak allocated {peak / 1024 / 1024:4.0f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
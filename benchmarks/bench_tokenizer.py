@@ -0,0 +1,154 @@
+"""Benchmark parsing `show route all` replies with the protocol tokenizer,
+against the previous regex based line parsing.
+
+The replies in tests/data/parse/route are repeated up to the number of
+routes:
+
+    python benchmarks/bench_tokenizer.py [number of routes, default 1000000]
+"""
+
+import glob
+import os
+import re
+import sys
+import time
+from itertools import chain, repeat
+
+from pybird import PyBird
+
+data_dir = os.path.join(
+    os.path.dirname(__file__), "..", "tests", "data", "parse", "route", "data"
+)
+
+
+class LegacyPyBird(PyBird):
+    """Route parsing before the tokenizer"""
+
+    field_number_re = re.compile(r"^(\d+)[ -]")
+
+    def _extract_field_number(self, line):
+        matches = self.field_number_re.findall(line)
+
+        if len(matches):
+            field_number = int(matches[0])
+            cleaned_line = self.field_number_re.sub("", line).strip("-")
+            return (field_number, cleaned_line)
+        else:
+            return (None, line)
+
+    def _re_route_summary_compile(self):
+        return re.compile(
+            r"(?P<prefix>[a-f0-9\.:\/]+)?\s+"
+            r"(?:via\s+(?P<peer>[^\s]+) on (?P<interface>[^\s]+)|(?:\w+)?)?\s*"
+            r"\[(?P<source>[^\s]+) (?P<time>[^\]\s]+)(?: from (?P<peer2>[^\s]+))?\]"
+        )
+
+    def _parse_route_summary(self, line):
+        match = self._re_route_summary_compile().match(line)
+        if not match:
+            raise ValueError(f"couldn't parse line '{line}'")
+        route = match.groupdict()
+        if not route["peer"]:
+            route["peer"] = route.pop("peer2")
+        else:
+            del route["peer2"]
+        return route
+
+    def _parse_route_detail(self, lines):
+        for line in lines:
+            self.log.debug("PyBird: parse route details: %s", line.strip())
+        return super()._parse_route_detail(lines)
+
+    def _iter_route_data(self, lines, record_type=dict):
+        lines = iter(lines)
+        route_summary = None
+        pending = None
+
+        while True:
+            if pending is not None:
+                line, pending = pending, None
+            else:
+                line = next(lines, None)
+                if line is None:
+                    return
+            line = line.strip()
+            self.log.debug("PyBird: parse route data: %s", line)
+            (field_number, line) = self._extract_field_number(line)
+
+            if field_number in self.ignored_field_numbers:
+                continue
+
+            if field_number == 1007:
+                try:
+                    route_summary = self._parse_route_summary(line)
+                except ValueError:
+                    line = next(lines, "").strip()
+                    route_summary = self._parse_route_summary(line)
+
+            if field_number == 1012:
+                if not route_summary:
+                    continue
+
+                route_detail_raw = []
+                while line is not None and "BGP." in line:
+                    route_detail_raw.append(line)
+                    line = next(lines, None)
+                    self.log.debug("PyBird: parse route data: %s", line)
+                pending = line
+
+                route_detail = self._parse_route_detail(route_detail_raw)
+                route_detail.update(route_summary)
+                route_summary = None
+                yield route_detail
+
+                if line is None:
+                    return
+
+            if field_number == 8001:
+                return
+
+
+def route_blocks():
+    """Return the route lines of the test replies, and their number of
+    routes"""
+    lines = []
+    for path in sorted(glob.glob(os.path.join(data_dir, "*.input"))):
+        with open(path) as fobj:
+            lines += [
+                line
+                for line in fobj.read().splitlines()
+                if not line.startswith(("0001 ", "0000"))
+            ]
+    return lines, sum(line.startswith("1007-") for line in lines)
+
+
+def make_lines(count):
+    block, routes = route_blocks()
+    return chain(
+        ["0001 BIRD 1.6.0 ready."],
+        chain.from_iterable(repeat(block, count // routes)),
+        ["0000"],
+    )
+
+
+def run(bird, count):
+    start = time.perf_counter()
+    parsed = sum(1 for _ in bird._iter_route_data(make_lines(count)))
+    return time.perf_counter() - start, parsed
+
+
+def main(count=1000000):
+    print(f"routes: {count}")
+    results = []
+    for name, bird in (("legacy", LegacyPyBird(None)), ("tokenizer", PyBird(None))):
+        elapsed, parsed = run(bird, count)
+        results.append(parsed)
+        print(
+            f"{name:>10}: {elapsed:.2f}s, {count / elapsed:8.0f} routes/s,"
+            f" {parsed} BGP routes"
+        )
+    assert results[0] == results[1]
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,227 @@
+"""Generate synthetic BIRD replies, for benchmarks.
+
+Replies to `show route all` and `show protocols all` are generated at any
+size, in the format of BIRD 1.6 or 2.x, with IPv4 and IPv6 routes of BGP
+peers and static routes. Write one to a file, as read by
+pybird.parse.routes_from_file():
+
+    python benchmarks/generate.py routes 1000000 --version 2 > routes.txt
+    python benchmarks/generate.py protocols 500 > protocols.txt
+
+The output of a seed is always the same, so benchmark runs are comparable.
+"""
+
+import argparse
+import random
+import sys
+from itertools import islice
+
+# banner per BIRD version
+BANNERS = {"1": "0001 BIRD 1.6.8 ready.", "2": "0001 BIRD 2.0.8 ready."}
+TIMES = ("12:46", "2022-01-22", "Jun13", "12:46:10")
+
+
+def _peer(number, ipv6=False):
+    """Return (name, address, ASN) of peer number"""
+    if ipv6:
+        address = "2001:db8:ffff::%x" % (number + 1)
+    else:
+        address = "10.%d.%d.%d" % (
+            200 + number // 65536,
+            number // 256 % 256,
+            number % 256,
+        )
+    return (f"PS{number}", address, 64512 + number % 1000)
+
+
+def _prefix(number, ipv6=False):
+    if ipv6:
+        return "2001:%x:%x::/48" % (0x1000 + number // 65536, number % 65536)
+    return "%d.%d.%d.0/24" % (
+        1 + number // 65536 % 220,
+        number // 256 % 256,
+        number % 256,
+    )
+
+
+def _bgp_detail(rng, asn, address, version):
+    path = [asn] + [rng.randrange(1, 65000) for _ in range(rng.randrange(0, 5))]
+    communities = " ".join(
+        "(%d,%d)" % (asn, rng.randrange(1, 1000)) for _ in range(rng.randrange(0, 8))
+    )
+    if version == "2":
+        (indent, route_type) = ("\t", "BGP univ")
+    else:
+        (indent, route_type) = ("    ", "BGP unicast univ")
+    lines = [
+        f"1008-{indent}Type: {route_type}",
+        f"1012-{indent}BGP.origin: IGP",
+        f" {indent}BGP.as_path: " + " ".join(map(str, path)),
+        f" {indent}BGP.next_hop: {address}",
+        f" {indent}BGP.local_pref: 100",
+    ]
+    if rng.random() < 0.3:
+        lines.append(f" {indent}BGP.med: {rng.randrange(0, 100)}")
+    if communities:
+        lines.append(f" {indent}BGP.community: {communities}")
+    if rng.random() < 0.2:
+        lines.append(
+            f" {indent}BGP.large_community: ({asn}, 1101, {rng.randrange(1, 20)})"
+        )
+    return lines
+
+
+def route_lines(count, version="2", peers=10, ipv6=0.3, static=0.05, seed=0):
+    """Yield the lines of a `show route all` reply with about count routes,
+    learned from peers BGP peers. ipv6 and static are the shares of IPv6 and
+    static routes. BIRD 2 replies list routes by table, the first route
+    summary is a continuation of the table line, and a route to a prefix
+    known from an earlier peer is an alternative path, without the prefix.
+    """
+    rng = random.Random(seed)
+    yield BANNERS[version]
+    ipv6_count = int(count * ipv6)
+    for family, family_count in ((4, count - ipv6_count), (6, ipv6_count)):
+        if not family_count:
+            continue
+        is_ipv6 = family == 6
+        if version == "2":
+            yield f"1007-Table master{family}:"
+        # BIRD only prints the reply code of a line if it differs from the
+        # code of the line before
+        code = " " if version == "2" else "1007-"
+        number = 0
+        routes = 0
+        while routes < family_count:
+            prefix = _prefix(number, is_ipv6)
+            number += 1
+            if rng.random() < static:
+                yield f"{code}{prefix:<20} blackhole [static1 {TIMES[1]}] * (200)"
+                if version == "2":
+                    yield "1008-\tType: static univ"
+                else:
+                    yield "1008-   Type: static unicast univ"
+                code = "1007-"
+                routes += 1
+                continue
+            # a few prefixes are learned from more than one peer
+            paths = min(1 + (rng.random() < 0.2), family_count - routes)
+            for path in range(paths):
+                (name, address, asn) = _peer(rng.randrange(peers), is_ipv6)
+                time = rng.choice(TIMES)
+                best = " *" if path == 0 else ""
+                if version == "2":
+                    shown = prefix if path == 0 else ""
+                    yield (
+                        f"{code}{shown:<20} unicast [{name} {time} from {address}]"
+                        f"{best} (100) [AS{asn}i]"
+                    )
+                    yield f" \tvia {address} on eth0"
+                else:
+                    yield (
+                        f"{code}{prefix:<20} via {address} on eth0 [{name} {time}]"
+                        f"{best} (100) [AS{asn}i]"
+                    )
+                yield from _bgp_detail(rng, asn, address, version)
+                code = "1007-"
+                routes += 1
+    yield "0000"
+
+
+def protocol_lines(count, version="2", seed=0):
+    """Yield the lines of a `show protocols all` reply with count BGP peers,
+    and a device and a static protocol."""
+    rng = random.Random(seed)
+    yield BANNERS[version]
+    yield "2002-Name       Proto      Table      State  Since         Info"
+    yield "1002-device1    Device     ---        up     2022-01-22    "
+    yield "1006-"
+    yield ""
+    yield "1002-static1    Static     master4    up     2022-01-22    "
+    yield "1006-  Channel ipv4" if version == "2" else "1006-  Preference:     200"
+    yield "    Routes:         10 imported, 0 exported, 10 preferred"
+    yield ""
+    for number in range(count):
+        (name, address, asn) = _peer(number, ipv6=number % 3 == 2)
+        established = rng.random() < 0.9
+        state = "up" if established else "start"
+        if established:
+            info = "Established"
+        else:
+            info = "Active        Socket: Connection refused"
+        table = "master6" if ":" in address else "master4"
+        if version != "2":
+            table = f"T_{name}"
+        since = rng.choice(TIMES)
+        yield f"1002-{name:<10} BGP        {table:<10} {state:<6} {since:<13} {info}"
+        yield f"1006-  Description:    Peering AS{asn}"
+        yield "  BGP state:          " + ("Established" if established else "Active")
+        yield f"    Neighbor address: {address}"
+        yield f"    Neighbor AS:      {asn}"
+        if established:
+            yield f"    Neighbor ID:      10.255.{number // 256 % 256}.{number % 256}"
+            yield "    Hold timer:       112/180"
+            yield "    Keepalive timer:  16/60"
+        if version == "2":
+            yield "  Channel ipv6" if ":" in address else "  Channel ipv4"
+            yield "    State:          UP"
+        imported = rng.randrange(0, 1000) if established else 0
+        exported = rng.randrange(0, 1000) if established else 0
+        yield from _route_stats(imported, exported)
+        yield ""
+    yield "0000"
+
+
+def _route_stats(imported, exported):
+    received = imported + 10
+    yield f"    Routes:         {imported} imported, {exported} exported, 0 preferred"
+    yield (
+        "    Route change stats:     received   rejected   filtered    ignored"
+        "   accepted"
+    )
+    yield f"      Import updates:     {received:10} {0:10} {10:10} {0:10} {imported:10}"
+    yield f"      Import withdraws:   {0:10} {0:10}        --- {0:10} {0:10}"
+    yield (
+        f"      Export updates:     {exported:10} {0:10} {0:10}        ---"
+        f" {exported:10}"
+    )
+    yield f"      Export withdraws:   {0:10}        ---        ---        --- {0:10}"
+
+
+def reply(lines):
+    """Return the lines of a reply as one string"""
+    return "\n".join(lines) + "\n"
+
+
+def encoded_chunks(lines, size=1024 * 1024):
+    """Yield the lines of a reply as utf-8 encoded chunks of about size bytes,
+    to send a large reply without building it in memory"""
+    lines = iter(lines)
+    while True:
+        chunk = "\n".join(islice(lines, size // 64))
+        if not chunk:
+            return
+        yield (chunk + "\n").encode("utf-8")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("reply", choices=("routes", "protocols"))
+    parser.add_argument("count", type=int, help="number of routes or BGP peers")
+    parser.add_argument("--version", choices=sorted(BANNERS), default="2")
+    parser.add_argument("--peers", type=int, default=10)
+    parser.add_argument("--ipv6", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.reply == "routes":
+        lines = route_lines(
+            args.count, args.version, args.peers, args.ipv6, seed=args.seed
+        )
+    else:
+        lines = protocol_lines(args.count, args.version, seed=args.seed)
+    for chunk in encoded_chunks(lines):
+        sys.stdout.buffer.write(chunk)
+
+
+if __name__ == "__main__":
+    main()
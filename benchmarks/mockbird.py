@@ -0,0 +1,105 @@
+"""A fake BIRD control socket, that streams large generated replies.
+
+Unlike the MockBird of the tests, replies are not read from files, but sent
+in chunks while they are generated, so replies can be larger than memory:
+
+    with StreamingMockBird({"show route all": lambda: route_lines(1000000)}) as mock:
+        PyBird(mock.socket_file).get_routes()
+
+Run as a script, it serves `show route all` and `show protocols all` in its
+own process, so generating replies doesn't slow down the client:
+
+    python benchmarks/mockbird.py /tmp/bird.ctl --routes 1000000 --peers 500
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import tempfile
+from threading import Thread
+
+from generate import encoded_chunks, protocol_lines, route_lines
+
+
+class StreamingMockBird(Thread):
+    """Answer one query per connection, like BIRD does without keepalive.
+
+    replies maps queries to functions, that return the lines of the reply.
+    sent counts the bytes sent.
+    """
+
+    def __init__(self, replies, socket_file=None):
+        super().__init__(daemon=True)
+        self.replies = replies
+        self.sent = 0
+        if socket_file is None:
+            socket_file = os.path.join(tempfile.mkdtemp(), "bird.ctl")
+        self.socket_file = socket_file
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.bind(socket_file)
+        self.socket.listen(1)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def run(self):
+        while True:
+            try:
+                (conn, _) = self.socket.accept()
+            except OSError:
+                # stopped
+                return
+            with conn:
+                self.serve(conn)
+
+    def serve(self, conn):
+        query = b""
+        while b"\n" not in query:
+            data = conn.recv(1024)
+            if not data:
+                return
+            query += data
+        lines = self.replies[query.split(b"\n", 1)[0].decode("utf-8")]()
+        try:
+            for chunk in encoded_chunks(lines):
+                conn.sendall(chunk)
+                self.sent += len(chunk)
+        except OSError:
+            # the client disconnected before the end of the reply
+            pass
+
+    def stop(self):
+        # wakes up accept()
+        self.socket.shutdown(socket.SHUT_RDWR)
+        self.socket.close()
+        os.remove(self.socket_file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve generated BIRD replies.")
+    parser.add_argument("socket_file")
+    parser.add_argument("--routes", type=int, default=100000)
+    parser.add_argument("--peers", type=int, default=10)
+    parser.add_argument("--version", choices=("1", "2"), default="2")
+    args = parser.parse_args(argv)
+    replies = {
+        "show route all": lambda: route_lines(args.routes, args.version, args.peers),
+        "show protocols all": lambda: protocol_lines(args.peers, args.version),
+    }
+    mock = StreamingMockBird(replies, args.socket_file)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print("ready", flush=True)
+    try:
+        mock.run()
+    finally:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Benchmark suite for parsing and receiving BIRD replies.
+
+Every benchmark runs in its own process, on replies of benchmarks/generate.py,
+and reports its throughput and the peak resident memory of its process:
+
+    python benchmarks/run.py [--routes 100000] [--peers 1000] [benchmark ...]
+
+With --json, results are appended to a file as JSON lines, to track them
+across changes. Run with --help to list the benchmarks.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from generate import TIMES, protocol_lines, reply, route_lines
+
+from pybird import PyBird
+from pybird.exporter import BirdExporter
+
+BENCHMARKS = {}
+
+
+def benchmark(unit):
+    """Register a benchmark, a generator that prepares its input, yields a
+    function that runs it and returns the number of units processed, and
+    cleans up when it is resumed."""
+
+    def register(func):
+        BENCHMARKS[func.__name__] = (func, unit)
+        return func
+
+    return register
+
+
+@benchmark("routes")
+def parse_routes_bird1(args):
+    data = reply(route_lines(args.routes, "1", args.peers))
+    yield lambda: len(PyBird(None)._parse_route_data(data))
+
+
+@benchmark("routes")
+def parse_routes_bird2(args):
+    data = reply(route_lines(args.routes, "2", args.peers))
+    yield lambda: len(PyBird(None)._parse_route_data(data))
+
+
+@benchmark("peers")
+def parse_protocols(args):
+    data = reply(protocol_lines(args.peers))
+    yield lambda: len(PyBird(None)._parse_peer_data(data, data_contains_detail=True))
+
+
+@benchmark("values")
+def calculate_datetime(args):
+    values = [TIMES[i % len(TIMES)] for i in range(args.routes)]
+    bird = PyBird(None)
+    yield lambda: sum(1 for value in values if bird._calculate_datetime(value))
+
+
+@benchmark("peers")
+def export_metrics(args):
+    """Refresh the exporter from a `show protocols all` reply, in which no
+    peer changed, and render its metrics"""
+    data = reply(protocol_lines(args.peers))
+    exporter = BirdExporter(PyBird(None))
+    exporter._poller.update(data)
+    status = {"version": "2.0.8", "last_reboot": datetime(2022, 1, 22)}
+
+    def run():
+        exporter._poller.update(data)
+        exporter.render(status, exporter._poller.peers, 0.0)
+        return args.peers
+
+    yield run
+
+
+@contextmanager
+def mock_bird(args):
+    """Run benchmarks/mockbird.py in a process, yield its socket file"""
+    socket_file = os.path.join(tempfile.mkdtemp(), "bird.ctl")
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mockbird.py")
+    command = [sys.executable, script, socket_file]
+    command += ["--routes", str(args.routes), "--peers", str(args.peers)]
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    try:
+        if proc.stdout.readline().strip() != "ready":
+            raise RuntimeError("mockbird.py failed to start")
+        yield socket_file
+    finally:
+        proc.terminate()
+        proc.wait()
+        os.rmdir(os.path.dirname(socket_file))
+
+
+@benchmark("MB")
+def socket_query(args):
+    """Receive a `show route all` reply from the control socket"""
+    with mock_bird(args) as socket_file:
+        bird = PyBird(socket_file)
+        yield lambda: len(bird._socket_query("show route all")) / 1024 / 1024
+
+
+@benchmark("routes")
+def socket_iter_routes(args):
+    """Receive and parse a `show route all` reply while it is streamed"""
+    with mock_bird(args) as socket_file:
+        bird = PyBird(socket_file)
+        yield lambda: sum(1 for _ in bird.iter_routes())
+
+
+def peak_rss():
+    """Return the peak resident memory of this process in bytes, since
+    reset_peak_rss()"""
+    try:
+        with open("/proc/self/status") as fobj:
+            for line in fobj:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB elsewhere
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def reset_peak_rss():
+    """Reset the peak resident memory to the current one, if the system
+    supports it (Linux), so it doesn't include preparing the input."""
+    try:
+        with open("/proc/self/clear_refs", "w") as fobj:
+            fobj.write("5")
+    except OSError:
+        pass
+
+
+def run_benchmark(name, args):
+    """Run a benchmark, in a worker process"""
+    (func, unit) = BENCHMARKS[name]
+    setup = func(args)
+    run = next(setup)
+    reset_peak_rss()
+    start = time.perf_counter()
+    count = run()
+    elapsed = time.perf_counter() - start
+    # clean up
+    next(setup, None)
+    return {
+        "benchmark": name,
+        "count": count,
+        "unit": unit,
+        "seconds": elapsed,
+        "per_second": count / elapsed,
+        "peak_rss": peak_rss(),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark parsing and receiving BIRD replies.",
+        epilog="benchmarks: " + ", ".join(BENCHMARKS),
+    )
+    parser.add_argument("benchmarks", nargs="*", metavar="benchmark")
+    parser.add_argument("--routes", type=int, default=100000)
+    parser.add_argument("--peers", type=int, default=1000)
+    parser.add_argument("--json", help="append results to this file")
+    args = parser.parse_args(argv)
+    names = args.benchmarks or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark: {name}")
+
+    print(f"routes: {args.routes}, peers: {args.peers}")
+    results = []
+    # a new process per benchmark, for its own peak memory
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        with context.Pool(1) as pool:
+            result = pool.apply(run_benchmark, (name, args))
+        results.append(result)
+        print(
+            f"{name:>20}: {result['seconds']:7.3f}s,"
+            f" {result['per_second']:10.0f} {result['unit']}/s,"
+            f" peak RSS {result['peak_rss'] / 1024 / 1024:6.0f} MB"
+        )
+
+    if args.json:
+        run_info = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "routes": args.routes,
+            "peers": args.peers,
+        }
+        with open(args.json, "a") as fobj:
+            for result in results:
+                fobj.write(json.dumps(dict(run_info, **result)) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,58 @@
+import atexit
 import logging
+import os
 import re
+import shutil
 import socket
-from datetime import datetime, timedelta
-from subprocess import PIPE, Popen
+import tempfile
+import threading
+import time
+import weakref
+from collections import Counter
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+from itertools import repeat
+from subprocess import DEVNULL, PIPE, Popen, TimeoutExpired
+
+from pybird.attributes import TypedAttributes
+from pybird.index import PrefixIndex
+from pybird.instrument import QueryTimer, iter_parse_step, parse_step
+from pybird.protocol import tokenize
+from pybird.route import LazyRoute, Route, iter_prefixed, origin_asn
+from pybird.snapshot import RouteSnapshot
+from pybird.table import RouteTable
+from pybird.timestamp import parse_timestamp
+
+__all__ = [
+    "LazyRoute",
+    "PrefixIndex",
+    "PyBird",
+    "Route",
+    "RouteSnapshot",
+    "RouteTable",
+    "TypedAttributes",
+]
 
 
 class PyBird:
     # BIRD reply codes: https://github.com/CZ-NIC/bird/blob/6c11dbcf28faa145cfb7310310a2a261fd4dd1f2/doc/reply_codes
     ignored_field_numbers = (0, 1, 13, 1008, 2002, 9001)
     error_fields = (13, 19, 8001, 8002, 8003, 9000, 9001, 9002)
-    success_fields = (0, 3, 4, 18, 20)
+    success_fields = (0, 3, 4, 14, 18, 20)
+    # a line starting with one of these codes is the last line of a reply
+    reply_end_fields = error_fields + success_fields
+
+    # replies shorter than this are parsed in a single process, even with
+    # get_routes(workers=...)
+    parallel_parse_min_size = 8 * 1024 * 1024
+    # chunks per worker process, so a slow chunk doesn't leave others idle
+    parallel_parse_chunks = 4
+
+    ssh_cmd = "ssh"
+    # seconds an idle shared ssh connection is kept open, with keepalive
+    ssh_control_persist = 600
 
     def __init__(
         self,
@@ -18,23 +61,149 @@ class PyBird:
         user=None,
         config_file=None,
         bird_cmd=None,
+        keepalive=False,
+        cache=None,
+        typed_attributes=None,
+        route_times=False,
+        timeout=None,
+        max_reply_size=None,
+        instrument=None,
     ):
         """Basic pybird setup.
-        Required argument: socket_file: full path to the BIRD control socket."""
+        Required argument: socket_file: full path to the BIRD control socket.
+
+        With keepalive=True, a single control socket connection is kept open
+        and reused for all queries, until close() is called. PyBird can also
+        be used as a context manager, which closes the connection on exit.
+        For a remote BIRD (hostname set), keepalive shares a single ssh
+        connection to the host between all ssh commands. The connection is
+        busy until a streamed reply, like that of iter_routes(), has been
+        read completely, queries from other threads wait for it, and queries
+        from the thread iterating over it raise RuntimeError.
+
+        cache is an optional pybird.cache.QueryCache, to reuse replies to
+        repeated queries. It can be shared by PyBird instances of different
+        BIRDs, configure() and put_config() invalidate the replies of their
+        BIRD.
+        With a cache, streaming queries like iter_routes() read the whole
+        reply before the first route is parsed, so it can be cached.
+
+        typed_attributes is an optional pybird.attributes.TypedAttributes, to
+        parse BGP attributes of routes into ints and tuples, instead of
+        strings. With route_times=True, the time of routes is a datetime,
+        like the last_change of peers.
+
+        timeout is the default number of seconds a query may take, including
+        connecting to BIRD, see deadline(). Queries raise TimeoutError when
+        it has passed. max_reply_size limits the size of a reply in bytes,
+        larger replies raise ValueError instead of being read into memory.
+
+        instrument is an optional pybird.instrument.Instrumentation, that gets
+        the timing and size of every query, and the time spent parsing it."""
         self.socket_file = socket_file
         self.hostname = hostname
         self.user = user
         self.config_file = config_file
+        self.keepalive = keepalive
+        self.cache = cache
+        self.typed_attributes = typed_attributes
+        self.route_times = route_times
+        self.timeout = timeout
+        self.max_reply_size = max_reply_size
+        self.instrument = instrument
+        self._session = None
+        # notified when the persistent session is released
+        self._session_free = threading.Condition()
+        # ident of the thread using the persistent session, None if it's free
+        self._session_owner = None
+        # weakref.finalize() to stop using the shared ssh connection
+        self._ssh_master = None
+        # per thread deadline of deadline()
+        self._deadline = threading.local()
+        # functions that abort the queries in progress, for cancel()
+        self._running = set()
+        self._running_lock = threading.Lock()
         if not bird_cmd:
             self.bird_cmd = "birdc"
         else:
             self.bird_cmd = bird_cmd
 
         self.clean_input_re = re.compile(r"\W+")
-        self.field_number_re = re.compile(r"^(\d+)[ -]")
         self.routes_field_re = re.compile(r"(\d+) imported,.* (\d+) exported")
         self.log = logging.getLogger(__name__)
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the persistent control socket or ssh connection, if there is
+        one. The ssh connection to a host is shared, it's only closed when no
+        other PyBird uses it."""
+        session, self._session = self._session, None
+        if session:
+            session.sock.close()
+
+        master, self._ssh_master = self._ssh_master, None
+        # the destination, if no other instance uses the connection
+        destination = master() if master is not None else None
+        if destination is not None:
+            _stop_ssh_master(self._ssh_options(), destination)
+
+    @contextmanager
+    def deadline(self, seconds):
+        """Context manager to complete the queries made in it, by this thread,
+        within seconds. Queries that are still running at that point raise
+        TimeoutError. Nested deadlines can only make it earlier, and the
+        timeout of each query applies as well:
+
+            with bird.deadline(5):
+                status = bird.get_bird_status()
+                peers = bird.get_peer_status()
+        """
+        deadline = time.monotonic() + seconds
+        outer = getattr(self._deadline, "value", None)
+        if outer is not None:
+            deadline = min(deadline, outer)
+        self._deadline.value = deadline
+        try:
+            yield
+        finally:
+            self._deadline.value = outer
+
+    def cancel(self):
+        """Abort all queries in progress, from another thread, including
+        those waiting for the keepalive connection. Aborted queries raise
+        concurrent.futures.CancelledError, partially read replies are
+        discarded."""
+        with self._running_lock:
+            running = list(self._running)
+        for stop in running:
+            stop()
+
+    def _query_deadline(self):
+        """Return the time.monotonic() time a query started now must be
+        complete by, None if there is no limit."""
+        deadline = getattr(self._deadline, "value", None)
+        if self.timeout is not None:
+            own = time.monotonic() + self.timeout
+            if deadline is None or own < deadline:
+                deadline = own
+        return deadline
+
+    @contextmanager
+    def _cancellable(self, stop):
+        """Let cancel() call stop, to abort the query made in the block."""
+        with self._running_lock:
+            self._running.add(stop)
+        try:
+            yield
+        finally:
+            with self._running_lock:
+                self._running.discard(stop)
+
     def get_config(self):
         if not self.config_file:
             raise ValueError("config_file is not set")
@@ -43,6 +212,7 @@ class PyBird:
     def put_config(self, data):
         if not self.config_file:
             raise ValueError("config_file is not set")
+        self._invalidate_cache()
         return self._write_file(data, self.config_file)
 
     def commit_config(self):
@@ -75,20 +245,13 @@ class PyBird:
             return data
         return self._parse_status(data)
 
+    @parse_step("status")
     def _parse_status(self, data):
-        line_iterator = iter(data.splitlines())
-        data = {}
-
-        for line in line_iterator:
-            line = line.strip()
-            self.log.debug("PyBird: parse status: %s", line)
-            (field_number, line) = self._extract_field_number(line)
-
-            if field_number in self.ignored_field_numbers:
-                continue
+        result = {}
 
-            if field_number == 1000:
-                data["version"] = line.split(" ")[1]
+        for field_number, continuation, line in tokenize(data, self.log):
+            if field_number == 1000 and not continuation:
+                result["version"] = line.split(" ")[1]
 
             elif field_number == 1011:
                 # Parse the status section, which looks like:
@@ -97,28 +260,21 @@ class PyBird:
                 # Current server time is 10-01-2012 10:24:37
                 # Last reboot on 03-01-2012 12:46:40
                 # Last reconfiguration on 03-01-2012 12:46:40
-                data["router_id"] = self._parse_router_status_line(line)
-
-                line = next(line_iterator)
-                if line.lstrip().startswith("Hostname is"):
-                    data["hostname"] = line.split(" is ")[1]
-                    line = next(line_iterator)
-                # skip current server time
-                self.log.debug("PyBird: parse status: %s", line)
-
-                line = next(line_iterator)
-                self.log.debug("PyBird: parse status: %s", line)
-                data["last_reboot"] = self._parse_router_status_line(
-                    line, parse_date=True
-                )
+                line = line.strip()
+                if line.startswith("Router ID is"):
+                    result["router_id"] = self._parse_router_status_line(line)
+                elif line.startswith("Hostname is"):
+                    result["hostname"] = line.split(" is ")[1]
+                elif line.startswith("Last reboot on"):
+                    result["last_reboot"] = self._parse_router_status_line(
+                        line, parse_date=True
+                    )
+                elif line.startswith("Last reconfiguration on"):
+                    result["last_reconfiguration"] = self._parse_router_status_line(
+                        line, parse_date=True
+                    )
 
-                line = next(line_iterator)
-                self.log.debug("PyBird: parse status: %s", line)
-                data["last_reconfiguration"] = self._parse_router_status_line(
-                    line, parse_date=True
-                )
-
-        return data
+        return result
 
     def _parse_configure(self, data):
         """
@@ -140,9 +296,9 @@ class PyBird:
 
         """
 
-        for line in data.splitlines():
-            self.log.debug("PyBird: parse configure: %s", line)
-            fieldno, line = self._extract_field_number(line)
+        for fieldno, continuation, line in tokenize(data, self.log):
+            if continuation:
+                continue
 
             if fieldno == 2:
                 if not self.config_file:
@@ -176,6 +332,7 @@ class PyBird:
         """
         query = "configure"
         data = self._send_query(query)
+        self._invalidate_cache()
         if not self.socket_file:
             return data
 
@@ -183,30 +340,201 @@ class PyBird:
         if err:
             raise ValueError(err)
 
-    def get_routes(self, prefix=None, peer=None):
+    def get_routes(
+        self,
+        prefix=None,
+        peer=None,
+        table=None,
+        record_type=dict,
+        columnar=False,
+        workers=None,
+        fields=None,
+    ):
+        """Get all routes, or those for a prefix, peer and/or table.
+
+        Every route is returned as a dict, or with record_type=Route, as a
+        more compact Route object. With record_type=LazyRoute, the BGP
+        attributes of a route are parsed when they are first read. With
+        columnar=True, the routes are returned in a RouteTable instead of a
+        list.
+
+        With fields, only these BGP attributes are parsed, the fields of the
+        route summary line, like prefix and peer, are always included.
+
+        With workers, a large reply is parsed in that many processes, see
+        _parse_route_data()."""
+        if workers:
+            data = self._send_query(self._routes_query(prefix, peer, table))
+            routes = self._parse_route_data(data, record_type, workers, fields)
+        else:
+            routes = self.iter_routes(
+                prefix=prefix,
+                peer=peer,
+                table=table,
+                record_type=record_type,
+                fields=fields,
+            )
+        if columnar:
+            return RouteTable.from_routes(routes)
+        return list(routes)
+
+    def iter_routes(
+        self, prefix=None, peer=None, table=None, record_type=dict, fields=None
+    ):
+        """Get routes like get_routes(), but yield each route as soon as its
+        detail block has been read from BIRD, instead of reading and parsing
+        the whole reply first. Memory use stays flat, no matter how many
+        routes the reply contains, unless the PyBird has a cache, then the
+        reply is read completely, to cache it."""
+        query = self._routes_query(prefix, peer, table)
+        lines = self._send_query_lines(query)
+        if self.instrument is not None:
+            parse = partial(
+                self._iter_route_data, record_type=record_type, fields=fields
+            )
+            return iter_parse_step(self.instrument, "routes", parse, lines)
+        return self._iter_route_data(lines, record_type=record_type, fields=fields)
+
+    def get_route_snapshot(self, prefix=None, peer=None, table=None):
+        """Get routes like get_routes(), as a RouteSnapshot, to compare with
+        the snapshot of a later poll."""
+        return RouteSnapshot.from_routes(
+            self.iter_routes(prefix=prefix, peer=peer, table=table)
+        )
+
+    def get_prefix_index(self, peer=None, table=None):
+        """Get routes like get_routes(), in a PrefixIndex, for prefix lookups
+        without further queries. Refresh it with:
+
+            index.refresh(bird.iter_routes(peer=peer, table=table))
+        """
+        return PrefixIndex.from_routes(self.iter_routes(peer=peer, table=table))
+
+    def _routes_query(self, prefix=None, peer=None, table=None):
         query = "show route all"
         if prefix:
             query += f" for {prefix}"
+        if table:
+            query += f" table {table}"
         if peer:
             query += f" protocol {peer}"
-        data = self._send_query(query)
-        return self._parse_route_data(data)
+        return query
+
+    def get_route_count(self, table=None, peer=None, filter=None):
+        """Count routes, optionally those of a table, peer and/or those
+        accepted by a filter configured in BIRD, without transferring them.
+
+        Returns a dict with the fields:
+        - routes: number of routes, that the filter accepted
+        - total_routes: number of routes, before the filter
+        - networks: number of networks of the routes
+        - tables: BIRD 2 also counts routes per table, a dict of these fields
+          by table name
+        """
+        data = self._send_query(self._route_count_query(table, peer, filter))
+        if not self.socket_file:
+            return data
+        return self._parse_route_count(data)
+
+    def _route_count_query(self, table=None, peer=None, filter=None):
+        query = "show route"
+        if table:
+            query += " table %s" % self._clean_input(table)
+        if filter:
+            query += " filter %s" % self._clean_input(filter)
+        if peer:
+            query += " protocol %s" % self._clean_input(peer)
+        return query + " count"
+
+    _re_route_count = re.compile(
+        r"(\d+) of (\d+) routes for (\d+) networks(?: in table (\S+))?"
+    )
+
+    @parse_step("route_count")
+    def _parse_route_count(self, data):
+        """Parse a reply like, from BIRD 1:
+        0014 1100 of 1200 routes for 1000 networks
+
+        or BIRD 2:
+        1007-1100 of 1200 routes for 1000 networks in table master4
+         600 of 600 routes for 500 networks in table master6
+        0014 Total: 1700 of 1800 routes for 1500 networks in 2 tables
+        """
+        total = None
+        tables = {}
+        for field_number, _, line in tokenize(data, self.log):
+            if field_number in self.error_fields:
+                raise ValueError(line)
+            match = self._re_route_count.search(line)
+            if not match:
+                continue
+            counts = {
+                "routes": int(match.group(1)),
+                "total_routes": int(match.group(2)),
+                "networks": int(match.group(3)),
+            }
+            if match.group(4) and not line.lstrip().startswith("Total:"):
+                tables[match.group(4)] = counts
+            else:
+                total = counts
+
+        if total is None:
+            if not tables:
+                raise ValueError("unable to parse route count response")
+            # a single table is only counted in the table line
+            total = {
+                field: sum(counts[field] for counts in tables.values())
+                for field in ("routes", "total_routes", "networks")
+            }
+        total["tables"] = tables
+        return total
+
+    def get_route_stats(self):
+        """Get route counts per table and per BGP peer, from `show route
+        count` and the route counts of get_peer_status(). With keepalive, both
+        queries are pipelined.
+
+        Returns a dict with:
+        - total: the route count of get_route_count(), without tables
+        - tables: the count per table, if BIRD counts them (BIRD 2)
+        - protocols: the table, routes_imported and routes_exported per peer
+        """
+        (count_data, peer_data) = self._send_queries(
+            [self._route_count_query(), self._peer_status_query()]
+        )
+        return self._route_stats(count_data, peer_data)
+
+    def _route_stats(self, count_data, peer_data):
+        total = self._parse_route_count(count_data)
+        protocols = {}
+        for peer in self._iter_peer_data(peer_data, data_contains_detail=True):
+            protocols[peer["name"]] = {
+                field: peer.get(field)
+                for field in ("table", "routes_imported", "routes_exported")
+            }
+        return {
+            "total": total,
+            "tables": total.pop("tables"),
+            "protocols": protocols,
+        }
 
     # deprecated by get_routes_received
-    def get_peer_prefixes_announced(self, peer_name):
+    def get_peer_prefixes_announced(self, peer_name, fields=None):
         """Get prefixes announced by a specific peer, without applying
         filters - i.e. this includes routes which were not accepted"""
+        data = self._send_query(self._peer_prefixes_announced_query(peer_name))
+        return self._parse_route_data(data, fields=fields)
+
+    def _peer_prefixes_announced_query(self, peer_name):
         clean_peer_name = self._clean_input(peer_name)
-        query = "show route table T_{} all protocol {}".format(
+        return "show route table T_{} all protocol {}".format(
             clean_peer_name, clean_peer_name
         )
-        data = self._send_query(query)
-        return self._parse_route_data(data)
 
-    def get_routes_received(self, peer=None):
-        return self.get_peer_prefixes_announced(peer)
+    def get_routes_received(self, peer=None, fields=None):
+        return self.get_peer_prefixes_announced(peer, fields)
 
-    def get_peer_prefixes_exported(self, peer_name):
+    def get_peer_prefixes_exported(self, peer_name, fields=None):
         """Get prefixes exported TO a specific peer"""
         clean_peer_name = self._clean_input(peer_name)
         query = "show route all table T_{} export {}".format(
@@ -215,29 +543,126 @@ class PyBird:
         data = self._send_query(query)
         if not self.socket_file:
             return data
-        return self._parse_route_data(data)
+        return self._parse_route_data(data, fields=fields)
 
-    def get_peer_prefixes_accepted(self, peer_name):
+    def get_peer_prefixes_accepted(self, peer_name, fields=None):
         """Get prefixes announced by a specific peer, which were also
         accepted by the filters"""
-        query = "show route all protocol %s" % self._clean_input(peer_name)
-        data = self._send_query(query)
-        return self._parse_route_data(data)
+        data = self._send_query(self._peer_prefixes_accepted_query(peer_name))
+        return self._parse_route_data(data, fields=fields)
+
+    def _peer_prefixes_accepted_query(self, peer_name):
+        return "show route all protocol %s" % self._clean_input(peer_name)
+
+    def get_peer_prefixes_rejected(self, peer_name, fields=None):
+        """Get routes announced by a specific peer, which were not accepted
+        by the filters"""
+        return list(self.iter_peer_prefixes_rejected(peer_name, fields))
+
+    def iter_peer_prefixes_rejected(self, peer_name, fields=None):
+        """Yield the routes announced by a specific peer, which were not
+        accepted by the filters, while the announced routes are read.
+
+        Routes are compared by prefix, next hop and AS path, so if there are
+        multiple paths to a prefix, only those that were rejected are
+        returned. Of the accepted routes, only these keys are held in memory,
+        and only the attributes of the key are parsed. With fields, rejected
+        routes have the attributes in fields and those of the key.
+        """
+        if fields is not None:
+            fields = self.route_key_fields + tuple(fields)
+        replies = self._send_queries_lines(
+            [
+                self._peer_prefixes_accepted_query(peer_name),
+                self._peer_prefixes_announced_query(peer_name),
+            ]
+        )
+        try:
+            accepted = self._iter_route_data(
+                next(replies), fields=self.route_key_fields
+            )
+            accepted_keys = {key for key, _ in self._keyed_routes(accepted)}
+            announced = self._iter_route_data(next(replies), fields=fields)
+            for key, route in self._keyed_routes(announced):
+                if key not in accepted_keys:
+                    yield route
+            # run to the end, so a keepalive session is kept open
+            next(replies, None)
+        finally:
+            replies.close()
+
+    def get_peer_prefixes_rejected_summary(
+        self, peer_name, top=10, reason_community=None
+    ):
+        """Summarize the routes rejected from a peer, without holding them
+        all in memory. Returns a dict with:
+        - count: number of rejected routes
+        - origin_asns: list of (origin ASN, count) of the top ASNs
+        - reasons: if reason_community is set to the first two fields of a
+          large community, like "65535:1101", the count of rejected routes by
+          the third field of that community, an int, and None for routes
+          without it.
+          Route servers tag routes with such a community, with the reason
+          they were rejected.
+        """
+        routes = self.iter_peer_prefixes_rejected(
+            peer_name, fields=self._rejected_summary_fields(reason_community)
+        )
+        return self._rejected_summary(routes, top, reason_community)
+
+    def _rejected_summary_fields(self, reason_community=None):
+        if reason_community:
+            return ("as_path", "large_community")
+        return ("as_path",)
+
+    def _rejected_summary(self, routes, top=10, reason_community=None):
+        count = 0
+        origin_asns = Counter()
+        reasons = Counter()
+        if reason_community:
+            reason_re = re.compile(
+                r"\(%s, (\d+)\)" % re.escape(reason_community).replace(":", ", ")
+            )
+            reason_key = tuple(int(field) for field in reason_community.split(":"))
+
+        for route in routes:
+            count += 1
+            origin_asns[origin_asn(route.get("as_path"))] += 1
+            if reason_community:
+                large_community = route.get("large_community") or ""
+                if isinstance(large_community, str):
+                    found = list(map(int, reason_re.findall(large_community)))
+                else:
+                    found = [
+                        community[2]
+                        for community in large_community
+                        if community[:2] == reason_key
+                    ]
+                for reason in found or [None]:
+                    reasons[reason] += 1
+
+        result = {"count": count, "origin_asns": origin_asns.most_common(top)}
+        if reason_community:
+            result["reasons"] = dict(reasons)
+        return result
 
-    def get_peer_prefixes_rejected(self, peer_name):
-        announced = self.get_peer_prefixes_announced(peer_name)
-        accepted = self.get_peer_prefixes_accepted(peer_name)
+    def _rejected_routes(self, announced, accepted):
+        """Return the routes in announced that are not in accepted."""
+        accepted_keys = {key for key, _ in self._keyed_routes(accepted)}
+        return [
+            route
+            for key, route in self._keyed_routes(announced)
+            if key not in accepted_keys
+        ]
 
-        announced_prefixes = [i["prefix"] for i in announced]
-        accepted_prefixes = [i["prefix"] for i in accepted]
+    # BGP attributes routes are compared by, along with the prefix
+    route_key_fields = ("next_hop", "as_path")
 
-        rejected_prefixes = [
-            item for item in announced_prefixes if item not in accepted_prefixes
-        ]
-        rejected_routes = [
-            item for item in announced if item["prefix"] in rejected_prefixes
-        ]
-        return rejected_routes
+    def _keyed_routes(self, routes):
+        """Yield (key, route) for routes, the key is the prefix, next hop and
+        AS path."""
+        for prefix, route in iter_prefixed(routes):
+            yield ((prefix, route.get("next_hop"), route.get("as_path")), route)
 
     def get_prefix_info(self, prefix, peer_name=None):
         """Get route-info for specified prefix"""
@@ -249,7 +674,8 @@ class PyBird:
             return data
         return self._parse_route_data(data)
 
-    def _parse_route_data(self, data):
+    @parse_step("routes")
+    def _parse_route_data(self, data, record_type=dict, workers=None, fields=None):
         """Parse a blob like:
         0001 BIRD 1.3.3 ready.
         1007-2a02:898::/32      via 2001:7f8:1::a500:8954:1 on eth1 [PS2 12:46] * (100) [AS8283i]
@@ -261,75 +687,129 @@ class PyBird:
             BGP.community: (8954,620)
         [....]
         0000
+
+        With workers > 1, and data of at least parallel_parse_min_size
+        characters, data is split into chunks at route boundaries, which are
+        parsed in a pool of workers processes.
         """
-        lines = data.splitlines()
-        routes = []
+        if workers and workers > 1 and len(data) >= self.parallel_parse_min_size:
+            return self._parse_route_data_parallel(data, record_type, workers, fields)
+        return list(self._iter_route_data(data.splitlines(), record_type, fields))
+
+    def _parse_route_data_parallel(self, data, record_type, workers, fields=None):
+        chunks = self._split_route_data(data, workers * self.parallel_parse_chunks)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parsed = executor.map(
+                _parse_route_chunk,
+                repeat(type(self)),
+                chunks,
+                repeat(record_type),
+                repeat(fields),
+                repeat(self.typed_attributes),
+                repeat(self.route_times),
+            )
+            return [route for routes in parsed for route in routes]
 
-        route_summary = None
+    def _split_route_data(self, data, count):
+        """Split route data into about count chunks, each but the first one
+        starting with a route summary line, so they can be parsed separately.
+        """
+        size = len(data) // count + 1
+        chunks = []
+        start = 0
+        while start < len(data):
+            end = data.find("\n1007-", start + size)
+            if end == -1:
+                end = len(data)
+            else:
+                end += 1
+            chunks.append(data[start:end])
+            start = end
+        return chunks
 
-        self.log.debug("PyBird: parse route data: lines=%d", len(lines))
-        line_counter = -1
-        while line_counter < len(lines) - 1:
-            line_counter += 1
-            line = lines[line_counter].strip()
-            self.log.debug("PyBird: parse route data: %s", line)
-            (field_number, line) = self._extract_field_number(line)
+    def _iter_route_data(self, lines, record_type=dict, fields=None):
+        """Parse route data like _parse_route_data() does, from an iterable of
+        lines, yielding every route as soon as its detail block is complete.
 
-            if field_number in self.ignored_field_numbers:
-                continue
+        Routes are dicts, or with record_type=Route, Route objects. With
+        fields, only these BGP attributes are parsed.
+        """
+        route_record = self._route_record_factory(record_type, fields)
+        route_times = self.route_times
+        route_summary = None
+        # detail lines of the route being read
+        route_detail_raw = None
+
+        for field_number, continuation, line in tokenize(lines, self.log):
+            if route_detail_raw is not None:
+                # A route detail spans multiple lines, read them all
+                if "BGP." in line:
+                    route_detail_raw.append(line)
+                    continue
+                yield route_record(route_summary, route_detail_raw)
+                route_summary = route_detail_raw = None
 
             if field_number == 1007:
                 try:
                     route_summary = self._parse_route_summary(line)
                 except ValueError:
-                    # bird2 sends route summary on a new line
-                    line_counter += 1
-                    line = lines[line_counter].strip()
-                    route_summary = self._parse_route_summary(line)
-
-            route_detail = None
-
-            if field_number == 1012:
-                if not route_summary:
-                    # This is not detail of a BGP route
-                    continue
-
-                # A route detail spans multiple lines, read them all
-                route_detail_raw = []
-                while "BGP." in line:
-                    route_detail_raw.append(line)
-                    line_counter += 1
-                    line = lines[line_counter]
-                    self.log.debug("PyBird: parse route data: %s", line)
-                # this loop will have walked a bit too far, correct it
-                line_counter -= 1
-
-                route_detail = self._parse_route_detail(route_detail_raw)
-
-                # Save the summary+detail info in our result
-                route_detail.update(route_summary)
-                # Do not use this summary again on the next run
-                route_summary = None
-                routes.append(route_detail)
-
-            if field_number == 8001:
+                    # bird2 sends the table name, and the route summary on a
+                    # new line, other continuation lines list next hops
+                    if not continuation and not line.endswith(":"):
+                        raise
+                else:
+                    if route_times:
+                        route_summary["time"] = self._calculate_datetime(
+                            route_summary["time"]
+                        )
+
+            elif field_number == 1012:
+                # if there is no summary, or no BGP attributes, this is not
+                # detail of a BGP route
+                if route_summary and "BGP." in line:
+                    route_detail_raw = [line]
+                elif route_summary:
+                    yield route_record(route_summary, [])
+                    route_summary = None
+
+            elif field_number == 8001:
                 # network not in table
-                return []
-
-        return routes
-
-    def _re_route_summary(self):
-        return re.compile(
-            r"(?P<prefix>[a-f0-9\.:\/]+)?\s+"
-            r"(?:via\s+(?P<peer>[^\s]+) on (?P<interface>[^\s]+)|(?:\w+)?)?\s*"
-            r"\[(?P<source>[^\s]+) (?P<time>[^\]\s]+)(?: from (?P<peer2>[^\s]+))?\]"
-        )
+                return
+
+        if route_detail_raw is not None:
+            yield route_record(route_summary, route_detail_raw)
+
+    def _route_record_factory(self, record_type=dict, fields=None):
+        """Return a function, that creates a route of record_type from its
+        parsed summary and raw detail lines."""
+        parse_detail = self._parse_route_detail
+        if fields is not None:
+            fields = frozenset(fields).difference(Route.summary_fields)
+            parse_detail = partial(parse_detail, fields=fields)
+        if record_type is LazyRoute:
+            return partial(LazyRoute, parse=parse_detail)
+
+        def route_record(route_summary, route_detail_raw):
+            route_detail = parse_detail(route_detail_raw)
+            # Save the summary+detail info in our result
+            route_detail.update(route_summary)
+            if record_type is not dict:
+                return record_type.from_dict(route_detail)
+            return route_detail
+
+        return route_record
+
+    _re_route_summary = re.compile(
+        r"(?P<prefix>[a-f0-9\.:\/]+)?\s+"
+        r"(?:via\s+(?P<peer>[^\s]+) on (?P<interface>[^\s]+)|(?:\w+)?)?\s*"
+        r"\[(?P<source>[^\s]+) (?P<time>[^\]\s]+)(?: from (?P<peer2>[^\s]+))?\]"
+    )
 
     def _parse_route_summary(self, line):
         """Parse a line like:
         2a02:898::/32      via 2001:7f8:1::a500:8954:1 on eth1 [PS2 12:46] * (100) [AS8283i]
         """
-        match = self._re_route_summary().match(line)
+        match = self._re_route_summary.match(line)
         if not match:
             raise ValueError(f"couldn't parse line '{line}'")
         # Note that split acts on sections of whitespace - not just single
@@ -343,21 +823,27 @@ class PyBird:
             del route["peer2"]
         return route
 
-    def _parse_route_detail(self, lines):
+    def _parse_route_detail(self, lines, fields=None):
         """Parse a blob like:
         1012-   BGP.origin: IGP
             BGP.as_path: 8954 8283
             BGP.next_hop: 2001:7f8:1::a500:8954:1 fe80::21f:caff:fe16:e02
             BGP.local_pref: 100
             BGP.community: (8954,620)
+
+        With fields, a set of attribute names, other attributes are skipped.
         """
         attributes = {}
+        if fields is not None and not fields:
+            return attributes
+        typed_attributes = self.typed_attributes
 
         for line in lines:
             line = line.strip()
-            self.log.debug("PyBird: parse route details: %s", line)
             # remove 'BGP.'
             line = line[4:]
+            if fields is not None and line[: line.find(":")] not in fields:
+                continue
             parts = line.split(": ")
             if len(parts) == 2:
                 (key, value) = parts
@@ -366,7 +852,9 @@ class PyBird:
                 key = parts[0].strip(":")
                 value = True
 
-            if key == "community":
+            if typed_attributes is not None and value is not True:
+                value = typed_attributes.parse(key, value)
+            elif key == "community":
                 # convert (8954,220) (8954,620) to 8954:220 8954:620
                 value = value.replace(",", ":").replace("(", "").replace(")", "")
 
@@ -386,15 +874,32 @@ class PyBird:
         If a peer_name argument is given, returns a single peer, represented
         as a dict. If the peer is not found, returns a zero length array.
         """
-        if peer_name:
-            query = 'show protocols all "%s"' % self._clean_input(peer_name)
-        else:
-            query = "show protocols all"
+        data = self._send_query(self._peer_status_query(peer_name))
+        if not self.socket_file:
+            return data
 
-        data = self._send_query(query)
+        return self._peer_status_result(data, peer_name)
+
+    def get_peer_summaries(self):
+        """Get the summary of all peers, from the one line per protocol of
+        `show protocols`, without the detail get_peer_status() returns.
+        This is much less to read and parse with many protocols.
+
+        Returns a list of peers, each a dict with the fields: name, protocol,
+        table, last_change, state, up and info."""
+        data = self._send_query("show protocols")
         if not self.socket_file:
             return data
+        return self._parse_peer_data(data, data_contains_detail=False)
 
+    def _peer_status_query(self, peer_name=None):
+        if peer_name:
+            return 'show protocols all "%s"' % self._clean_input(peer_name)
+        return "show protocols all"
+
+    def _peer_status_result(self, data, peer_name=None):
+        """Parse the reply to a _peer_status_query() into the return value of
+        get_peer_status()."""
         peers = self._parse_peer_data(data=data, data_contains_detail=True)
 
         if not peer_name:
@@ -409,72 +914,90 @@ class PyBird:
         else:
             return peers[0]
 
+    @parse_step("peers")
     def _parse_peer_data(self, data, data_contains_detail):
         """Parse the data from BIRD to find peer information."""
-        lineiterator = iter(data.splitlines())
-        peers = []
-
-        peer_summary = None
-
-        for line in lineiterator:
-            line = line.strip()
-            (field_number, line) = self._extract_field_number(line)
-
-            if field_number in self.ignored_field_numbers:
-                continue
-
-            if field_number == 1002:
-                peer_summary = self._parse_peer_summary(line)
-                if peer_summary["protocol"] != "BGP":
-                    peer_summary = None
-                    continue
-
-            # If there is no detail section to be expected,
-            # we are done.
-            if not data_contains_detail:
-                peers.append_peer_summary()
-                continue
-
-            peer_detail = None
-            if field_number == 1006:
-                if not peer_summary:
-                    # This is not detail of a BGP peer
+        return list(self._iter_peer_data(data, data_contains_detail))
+
+    def _iter_peer_data(self, data, data_contains_detail):
+        """Parse peer data like _parse_peer_data() does, from a reply or an
+        iterable of lines, yielding every peer as soon as it is complete."""
+        for summary_line, peer_detail_raw in self._iter_peer_blocks(data):
+            peer = self._parse_peer_block(
+                summary_line, peer_detail_raw, data_contains_detail
+            )
+            if peer is not None:
+                yield peer
+
+    def _iter_peer_blocks(self, data):
+        """Yield (summary line, detail lines) for every protocol in a reply to
+        `show protocols [all]`, detail lines is None if there are none."""
+        summary_line = None
+        # detail lines of the protocol being read
+        peer_detail_raw = None
+
+        for field_number, continuation, line in tokenize(data, self.log):
+            if peer_detail_raw is not None:
+                # A peer detail spans multiple lines, up to an empty line
+                if line.strip() and (continuation or field_number == 1006):
+                    peer_detail_raw.append(line)
                     continue
+                yield (summary_line, peer_detail_raw)
+                summary_line = peer_detail_raw = None
 
-                # A peer summary spans multiple lines, read them all
-                peer_detail_raw = []
-                while line.strip() != "":
-                    peer_detail_raw.append(line)
-                    line = next(lineiterator)
+            if field_number == 1002:
+                if summary_line is not None:
+                    yield (summary_line, None)
+                summary_line = line
 
-                peer_detail = self._parse_peer_detail(peer_detail_raw)
+            elif field_number == 1006 and summary_line is not None:
+                peer_detail_raw = [line]
 
-                # Save the summary+detail info in our result
-                peer_detail.update(peer_summary)
-                peers.append(peer_detail)
-                # Do not use this summary again on the next run
-                peer_summary = None
+        if summary_line is not None:
+            yield (summary_line, peer_detail_raw)
 
-        return peers
+    def _parse_peer_block(
+        self, summary_line, peer_detail_raw, data_contains_detail=True
+    ):
+        """Parse a block of _iter_peer_blocks(), return None if it's not a BGP
+        peer, or its detail is missing."""
+        # check the protocol before parsing the rest
+        if summary_line.split(None, 2)[1:2] != ["BGP"]:
+            return None
+        peer_summary = self._parse_peer_summary(summary_line)
+
+        # If there is no detail section to be expected,
+        # we are done.
+        if not data_contains_detail:
+            return peer_summary
+        if peer_detail_raw is None:
+            return None
+        return self._peer_record(peer_summary, peer_detail_raw)
+
+    def _peer_record(self, peer_summary, peer_detail_raw):
+        """Return the summary+detail info of a peer"""
+        peer_detail = self._parse_peer_detail(peer_detail_raw)
+        peer_detail.update(peer_summary)
+        return peer_detail
 
     def _parse_peer_summary(self, line):
         """Parse the summary of a peer line, like:
         PS1      BGP      T_PS1    start  Jun13       Passive
 
         Returns a dict with the fields:
-            name, protocol, last_change, state, up
-            ("PS1", "BGP", "Jun13", "Passive", False)
+            name, protocol, table, last_change, state, up, info
+            ("PS1", "BGP", "T_PS1", "Jun13", "Passive", False, "Passive")
 
         """
         elements = line.split()
 
+        # newer versions include a timestamp before the state
+        if len(elements) > 5 and ":" in elements[5]:
+            info_start = 6
+        else:
+            info_start = 5
         try:
-            if (
-                ":" in elements[5]
-            ):  # newer versions include a timestamp before the state
-                state = elements[6]
-            else:
-                state = elements[5]
+            state = elements[info_start]
             up = state.lower() == "established"
         except IndexError:
             state = None
@@ -486,9 +1009,11 @@ class PyBird:
         return {
             "name": elements[0],
             "protocol": elements[1],
+            "table": elements[2],
             "last_change": last_change,
             "state": state,
             "up": up,
+            "info": " ".join(elements[info_start:]),
         }
 
     def _parse_peer_detail(self, peer_detail_raw):
@@ -574,113 +1099,59 @@ class PyBird:
             return
         result_dict[key_name] = int(value)
 
-    def _extract_field_number(self, line):
-        """Parse the field type number from a line.
-        Line must start with a number, followed by a dash or space.
-
-        Returns a tuple of (field_number, cleaned_line), where field_number
-        is None if no number was found, and cleaned_line is the line without
-        the field number, if applicable.
-        """
-        matches = self.field_number_re.findall(line)
-
-        if len(matches):
-            field_number = int(matches[0])
-            cleaned_line = self.field_number_re.sub("", line).strip("-")
-            return (field_number, cleaned_line)
-        else:
-            return (None, line)
-
     def _calculate_datetime(self, value, now=None):
-        """Turn the BIRD date format into a python datetime."""
-
-        if not now:
-            now = datetime.now()
-
-        # Case: YYYY-MM-DD HH:MM:SS
-        try:
-            return datetime(
-                *map(
-                    int,
-                    (
-                        value[:4],
-                        value[5:7],
-                        value[8:10],
-                        value[11:13],
-                        value[14:16],
-                        value[17:19],
-                    ),
-                )
-            )
-        except ValueError:
-            pass
+        """Turn the BIRD date format into a python datetime, see
+        pybird.timestamp.parse_timestamp()."""
+        return parse_timestamp(value, now)
 
-        # Case: YYYY-MM-DD
-        try:
-            return datetime(*map(int, (value[:4], value[5:7], value[8:10])))
-        except ValueError:
-            pass
-
-        # Case: HH:mm:ss.nnn or HH:mm or HH:mm:ss timestamp
-        try:
-            value = value.split(".")[0]  # strip any "".nnn" suffix
+    def _remote_cmd(self, cmd, inp=None):
+        timeout = _remaining(self._query_deadline())
+        proc = Popen(self._ssh_command(cmd), stdin=PIPE, stdout=PIPE)
+        stop = _ProcessStop(proc)
+        with self._cancellable(stop):
             try:
-                parsed_value = datetime.strptime(value, "%H:%M")
-
-            except ValueError:
-                parsed_value = datetime.strptime(value, "%H:%M:%S")
-
-            result_date = datetime(
-                now.year, now.month, now.day, parsed_value.hour, parsed_value.minute
-            )
-
-            if now.hour < parsed_value.hour or (
-                now.hour == parsed_value.hour and now.minute < parsed_value.minute
-            ):
-                result_date = result_date - timedelta(days=1)
-
-            return result_date
-        except ValueError:
-            # It's a different format, keep on processing
-            pass
-
-        # Case: "Jun13" timestamp
-        try:
-            parsed = datetime.strptime(value, "%b%d")
-
-            # if now is past the month, it's this year, else last year
-            if now.month == parsed.month:
-                # bird shows time for same day
-                if now.day <= parsed.day:
-                    year = now.year - 1
-                else:
-                    year = now.year
-
-            elif now.month > parsed.month:
-                year = now.year
-
-            else:
-                year = now.year - 1
-
-            result_date = datetime(year, parsed.month, parsed.day)
-            return result_date
-        except ValueError:
-            pass
+                res = proc.communicate(input=inp, timeout=timeout)[0]
+            except TimeoutExpired:
+                stop(TimeoutError(_timeout_message))
+                proc.communicate()
+        stop.check()
+        return res
 
-        # Case: plain year
-        try:
-            year = int(value)
-            return datetime(year, 1, 1)
-        except ValueError:
-            raise ValueError("Can not parse datetime: [%s]" % value)
+    def _ssh_command(self, cmd):
+        """Return the argument list to run cmd on the remote host over ssh."""
+        destination = self._ssh_destination()
+        if self.keepalive:
+            self._use_ssh_master(destination)
+        return self._ssh_options() + [destination, cmd]
+
+    def _use_ssh_master(self, destination):
+        """Count this instance as a user of the shared ssh connection to
+        destination, until it is closed or garbage collected."""
+        with _ssh_master_lock:
+            if self._ssh_master is None:
+                _ssh_master_users[destination] += 1
+                _ssh_master_options.setdefault(destination, self._ssh_options())
+                self._ssh_master = weakref.finalize(
+                    self, _release_ssh_master, destination
+                )
 
-    def _remote_cmd(self, cmd, inp=None):
-        to = f"{self.user}@{self.hostname}"
-        proc = Popen(
-            ["ssh", "-o PasswordAuthentication=no", to, cmd], stdin=PIPE, stdout=PIPE
-        )
-        res = proc.communicate(input=inp)[0]
-        return res
+    def _ssh_options(self):
+        options = [self.ssh_cmd, "-o PasswordAuthentication=no"]
+        if self.keepalive:
+            # the first ssh command starts a master process, that stays in
+            # the background to share its connection with the next commands
+            options += [
+                "-o",
+                "ControlMaster=auto",
+                "-o",
+                "ControlPath=" + os.path.join(_ssh_control_dir(), "%C"),
+                "-o",
+                f"ControlPersist={self.ssh_control_persist}",
+            ]
+        return options
+
+    def _ssh_destination(self):
+        return f"{self.user}@{self.hostname}"
 
     def _read_file(self, fname):
         if self.hostname:
@@ -700,55 +1171,776 @@ class PyBird:
             return
 
     def _send_query(self, query):
+        if self.cache is not None:
+            return self.cache.get(
+                query,
+                lambda: self._send_uncached_query(query),
+                self._cache_target(),
+                wait=self._wait_for_reply,
+            )
+        return self._send_uncached_query(query)
+
+    def _wait_for_reply(self, future):
+        """Return the reply of a query another thread sends, from its future,
+        within the deadline, until cancel(), like for a query of our own."""
+        timeout = _remaining(self._query_deadline())
+        # set when the reply is there, or on cancel()
+        finished = threading.Event()
+        future.add_done_callback(lambda future: finished.set())
+        with self._cancellable(finished.set):
+            finished.wait(timeout)
+        if future.done():
+            return future.result()
+        if finished.is_set():
+            raise CancelledError("query was cancelled")
+        raise TimeoutError(_timeout_message)
+
+    def _send_uncached_query(self, query):
         self.log.debug("PyBird: query: %s", query)
         if self.hostname:
             return self._remote_query(query)
         return self._socket_query(query)
 
+    def _invalidate_cache(self):
+        if self.cache is not None:
+            self.cache.invalidate(target=self._cache_target())
+
+    def _cache_target(self):
+        """Return the key of the BIRD queries are sent to, in the cache."""
+        return (self.hostname, self.socket_file)
+
+    def _send_query_lines(self, query):
+        """Send the query like _send_query() does, but return an iterator
+        over the lines of the reply, read from BIRD while iterating.
+
+        With a cache, or if a subclass overrides _send_query(), the reply is
+        read completely by _send_query() instead, and its lines are returned.
+        """
+        if self._whole_replies():
+            return iter(self._send_query(query).splitlines())
+        self.log.debug("PyBird: query: %s", query)
+        if self.hostname:
+            return self._remote_query_lines(query)
+        return self._socket_query_lines(query)
+
+    def _whole_replies(self):
+        """Return True if streamed queries must be sent with _send_query(),
+        because replies are cached, or a subclass overrides it."""
+        send_query = getattr(self._send_query, "__func__", None)
+        return self.cache is not None or send_query is not PyBird._send_query
+
+    def _send_queries_lines(self, queries):
+        """Send multiple queries, and yield an iterator over the lines of each
+        reply, in order, like _send_query_lines() does. Every reply must be
+        consumed before advancing to the next one.
+
+        BIRD gets all queries at once, pipelined with keepalive, or over a
+        connection each, so it works on the next ones while the first reply
+        is being read.
+        """
+        if self._whole_replies():
+            for query in queries:
+                yield iter(self._send_query(query).splitlines())
+            return
+        for query in queries:
+            self.log.debug("PyBird: query: %s", query)
+        if self.hostname:
+            for query in queries:
+                yield self._remote_query_lines(query)
+            return
+        if self.keepalive:
+            yield from self._session_replies(queries, stream=True)
+            return
+
+        deadline = self._query_deadline()
+        readers = []
+
+        def stop():
+            for reader in readers:
+                reader.cancel()
+
+        try:
+            with self._cancellable(stop):
+                for query in queries:
+                    timer = self._query_timer(query)
+                    sock = self._socket_connect(deadline, timer)
+                    readers.append(self._reply_reader(sock, deadline, timer))
+                    sock.sendall(self._encode_query(query))
+                for reader in readers:
+                    with self._reporting(reader.timer):
+                        yield reader.read_lines()
+        finally:
+            for reader in readers:
+                reader.sock.close()
+
     def _remote_query(self, query):
         """
         mimic a direct socket connect over ssh
         """
-        cmd = f"{self.bird_cmd} -v -s {self.socket_file} '{query}'"
-        res = self._remote_cmd(cmd)
-        res += b"0000\n"
-        return res.decode("utf-8")
+        return "\n".join(self._remote_query_lines(query)) + "\n"
+
+    def _remote_query_lines(self, query):
+        """Run the query over ssh like _remote_query(), but yield the output
+        line by line while it is being received."""
+        timeout = _remaining(self._query_deadline())
+        query_timer = self._query_timer(query)
+        # ssh must not read the stdin of this process
+        proc = Popen(
+            self._ssh_command(self._birdc_command(query)), stdin=DEVNULL, stdout=PIPE
+        )
+        stop = _ProcessStop(proc)
+        kill_timer = None
+        if timeout is not None:
+            kill_timer = threading.Timer(
+                timeout, stop, (TimeoutError(_timeout_message),)
+            )
+            kill_timer.daemon = True
+            kill_timer.start()
+        size = 0
+        try:
+            with self._reporting(query_timer), self._cancellable(stop):
+                for line in proc.stdout:
+                    size += len(line)
+                    if self.max_reply_size is not None and size > self.max_reply_size:
+                        raise ValueError(
+                            f"BIRD reply exceeds max_reply_size of"
+                            f" {self.max_reply_size} bytes"
+                        )
+                    if query_timer is not None:
+                        query_timer.received()
+                        query_timer.bytes = size
+                        query_timer.lines += 1
+                    yield line.rstrip(b"\n").decode("utf-8")
+                # killed, the output may be incomplete
+                stop.check()
+            yield "0000"
+        finally:
+            if kill_timer is not None:
+                kill_timer.cancel()
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
+
+    def _birdc_command(self, query):
+        """Return the remote birdc command line for query."""
+        return f"{self.bird_cmd} -v -s {self.socket_file} '{query}'"
 
     def _socket_query(self, query):
         """Open a socket to the BIRD control socket, send the query and get
         the response.
         """
+        if self.keepalive:
+            return self._session_query([query])[0]
+
+        deadline = self._query_deadline()
+        timer = self._query_timer(query)
+        with self._reporting(timer):
+            sock = self._socket_connect(deadline, timer)
+            try:
+                reader = self._reply_reader(sock, deadline, timer)
+                with self._cancellable(reader.cancel):
+                    sock.sendall(self._encode_query(query))
+                    return reader.read_reply()
+            finally:
+                sock.close()
+
+    def _socket_query_lines(self, query):
+        """Open a socket to the BIRD control socket, send the query and yield
+        the response line by line, while it is being received.
+        """
+        if self.keepalive:
+            for reply in self._session_replies([query], stream=True):
+                yield from reply
+            return
+
+        deadline = self._query_deadline()
+        timer = self._query_timer(query)
+        with self._reporting(timer):
+            sock = self._socket_connect(deadline, timer)
+            try:
+                reader = self._reply_reader(sock, deadline, timer)
+                with self._cancellable(reader.cancel):
+                    sock.sendall(self._encode_query(query))
+                    yield from reader.read_lines()
+            finally:
+                sock.close()
+
+    def _send_queries(self, queries):
+        """Send multiple queries, and return a list of their responses.
+
+        With keepalive, the queries are pipelined: all of them are written to
+        the control socket at once, and the replies are read back in order.
+        """
+        if self.hostname or not self.keepalive:
+            return [self._send_query(query) for query in queries]
+        for query in queries:
+            self.log.debug("PyBird: query: %s", query)
+        return self._session_query(queries)
+
+    def _session_query(self, queries):
+        """Send queries over the persistent control socket connection, and
+        return the list of responses."""
+        return list(self._session_replies(queries))
+
+    def _session_replies(self, queries, stream=False):
+        """Send queries over the persistent control socket connection, and
+        yield each reply in order, or with stream=True, an iterator over the
+        lines of each reply.
+
+        Every reply must be consumed completely before advancing to the next
+        one, otherwise the connection is closed. If BIRD closed the connection
+        in the meantime, it's reopened once, before any reply is read.
+        """
+        data = b"".join(self._encode_query(query) for query in queries)
+        deadline = self._query_deadline()
+        timers = [self._query_timer(query) for query in queries]
+
+        stop = _SessionStop(self._session_free)
+        with self._cancellable(stop):
+            with self._reporting_failure(timers):
+                self._session_acquire(deadline, stop)
+            try:
+                with self._reporting_failure(timers):
+                    session = self._session_send(data, deadline, timers[0], stop)
+
+                complete = False
+                try:
+                    for index in range(len(queries)):
+                        last = index == len(queries) - 1
+                        session.timer = timers[index]
+                        with self._reporting(timers[index]):
+                            if stream:
+                                yield session.read_lines(last)
+                            else:
+                                yield session.read_reply(last)
+                    session.timer = None
+                    complete = not session.in_reply
+                finally:
+                    # a partially read reply leaves the connection in an
+                    # unknown state, so it can't be reused
+                    if not complete:
+                        self.close()
+            finally:
+                # cancel() must not abort the next query using the session
+                stop.reader = None
+                self._session_release()
+
+    def _session_acquire(self, deadline, stop):
+        """Wait until no other thread uses the persistent session, and take
+        it. Waiting counts towards the deadline, and ends on cancel()."""
+        if self._session_owner == threading.get_ident():
+            # waiting for the reply this thread is reading would never end
+            raise RuntimeError(
+                "PyBird keepalive connection is busy with a streamed reply of"
+                " this thread, read it completely before the next query"
+            )
+        with self._session_free:
+            while self._session_owner is not None:
+                stop.check()
+                self._session_free.wait(_remaining(deadline))
+            stop.check()
+            self._session_owner = threading.get_ident()
+
+    def _session_release(self):
+        with self._session_free:
+            self._session_owner = None
+            # waiters that were cancelled don't take the session, wake all
+            self._session_free.notify_all()
+
+    def _session_send(self, data, deadline, timer, stop):
+        """Send data over the persistent session, and wait for the reply to
+        start. Return the session."""
+        for attempt in range(2):
+            session = self._session_open(deadline, timer, stop)
+            session.limit(deadline, self.max_reply_size)
+            session.timer = timer
+            try:
+                stop.watch(session)
+                session.sock.sendall(data)
+                session.wait()
+                return session
+            except (TimeoutError, socket.timeout, CancelledError):
+                self.close()
+                raise
+            except (OSError, EOFError):
+                self.close()
+                stop.check()
+                if attempt:
+                    raise ValueError("Could not read additional data from BIRD")
+                self.log.debug("PyBird: session closed by BIRD, reconnecting")
+
+    def _session_open(self, deadline=None, timer=None, stop=None):
+        """Return the persistent session, connect and read the banner first if
+        there is none yet."""
+        if self._session is None:
+            sock = self._socket_connect(deadline, timer)
+            session = self._reply_reader(sock, deadline)
+            try:
+                if stop is not None:
+                    stop.watch(session)
+                banner = session.read_reply(end_re=_ReplyReader.banner_re)
+                self.log.debug("PyBird: session banner: %s", banner.strip())
+            except Exception:
+                sock.close()
+                raise
+            self._session = session
+        return self._session
+
+    def _socket_connect(self, deadline=None, timer=None):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(_remaining(deadline))
+            sock.connect(self.socket_file)
+            if timer is not None:
+                timer.connect_done()
+        except socket.timeout:
+            sock.close()
+            raise TimeoutError(_timeout_message) from None
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _reply_reader(self, sock, deadline=None, timer=None):
+        """Return a _ReplyReader for sock, with the deadline of the query,
+        max_reply_size and the QueryTimer of the query."""
+        reader = _ReplyReader(sock, self.reply_end_fields)
+        reader.limit(deadline, self.max_reply_size)
+        reader.timer = timer
+        return reader
+
+    def _query_timer(self, query):
+        """Return a QueryTimer for query, None without instrumentation."""
+        if self.instrument is None:
+            return None
+        return QueryTimer(query)
+
+    @contextmanager
+    def _reporting(self, timer):
+        """Report the QueryStats of timer to the instrumentation, when the
+        block is done, or raised an exception. Nothing is reported if timer
+        is None, or the block was left while streaming a reply."""
+        if timer is None:
+            yield
+            return
+        try:
+            yield
+        except Exception as exc:
+            self.instrument.query(timer.stats(exc))
+            raise
+        self.instrument.query(timer.stats())
+
+    @contextmanager
+    def _reporting_failure(self, timers):
+        """Report an exception raised in the block for all timers, of queries
+        that failed before their reply was read."""
+        try:
+            yield
+        except Exception as exc:
+            for timer in timers:
+                if timer is not None:
+                    self.instrument.query(timer.stats(exc))
+            raise
+
+    def _encode_query(self, query):
         if not isinstance(query, bytes):
             query = query.encode("utf-8")
         if not query.endswith(b"\n"):
             query += b"\n"
-        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        sock.connect(self.socket_file)
-        sock.send(query)
-
-        data = []
+        return query
 
-        while True:
-            this_read = sock.recv(1024 * 1024)
-            if not this_read:
-                raise ValueError("Could not read additional data from BIRD")
-            data.append(this_read)
-            if len(this_read) > 256:
-                tail = this_read[-256:].decode("utf-8")
-            else:
-                tail = b"".join(data[-2:])[-256:].decode("utf-8")
-            if any(
-                [
-                    tail.find(f"\n{code:04}") != -1
-                    for code in self.error_fields + self.success_fields
-                ]
-            ):
-                break
-
-        sock.close()
-        return b"".join(data).decode("utf-8")
+    def _is_reply_end(self, line):
+        """Return True if line is the last line of a BIRD reply, i.e. starts
+        with one of the reply_end_fields followed by a space, or nothing.
+        """
+        code = line[:4]
+        if len(code) != 4 or not code.isdigit() or line[4:5] == "-":
+            return False
+        return int(code) in self.reply_end_fields
 
     def _clean_input(self, inp):
         """Clean the input string of anything not plain alphanumeric chars,
         return the cleaned string."""
         return self.clean_input_re.sub("", inp).strip()
+
+
+def _parse_route_chunk(
+    cls, data, record_type, fields=None, typed_attributes=None, route_times=False
+):
+    """Parse a chunk of route data, in a worker process"""
+    bird = cls(None, typed_attributes=typed_attributes, route_times=route_times)
+    return list(bird._iter_route_data(data.splitlines(), record_type, fields))
+
+
+_timeout_message = "BIRD did not reply within the deadline"
+
+
+def _remaining(deadline):
+    """Return the seconds left until deadline, a time.monotonic() time, None
+    if deadline is None. Raise TimeoutError if it has passed."""
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError(_timeout_message)
+    return remaining
+
+
+class _ProcessStop:
+    """Kill the process of a remote query, on cancel() or when its deadline
+    has passed, and keep the error the query raises for it."""
+
+    def __init__(self, proc):
+        self.proc = proc
+        self.error = None
+
+    def __call__(self, error=None):
+        if self.error is None:
+            self.error = error or CancelledError("query was cancelled")
+        self.proc.kill()
+
+    def check(self):
+        """Raise the error, if the process was stopped."""
+        if self.error is not None:
+            raise self.error
+
+
+class _SessionStop:
+    """Abort a query over the persistent session on cancel(), while it waits
+    for the session, or for the reply."""
+
+    def __init__(self, session_free):
+        self.session_free = session_free
+        self.cancelled = False
+        self.reader = None
+
+    def __call__(self):
+        self.cancelled = True
+        with self.session_free:
+            self.session_free.notify_all()
+        reader = self.reader
+        if reader is not None:
+            reader.cancel()
+
+    def watch(self, reader):
+        """Cancel reader on cancel(), raise if it was cancelled already."""
+        self.reader = reader
+        self.check()
+
+    def check(self):
+        if self.cancelled:
+            raise CancelledError("query was cancelled")
+
+
+_ssh_control_dir_path = None
+# the number of PyBird instances using the ssh master of a destination, the
+# master is stopped when the last one is closed
+_ssh_master_users = Counter()
+# the ssh options of the master of a destination, to stop it at exit
+_ssh_master_options = {}
+_ssh_master_lock = threading.Lock()
+
+
+def _ssh_control_dir():
+    """Return the private directory for ssh control sockets, shared by all
+    PyBird instances of this process, so there is one connection per host.
+    It's removed at exit."""
+    global _ssh_control_dir_path
+    if _ssh_control_dir_path is None:
+        _ssh_control_dir_path = tempfile.mkdtemp(prefix="pybird-ssh-")
+        atexit.register(_remove_ssh_control_dir)
+    return _ssh_control_dir_path
+
+
+def _remove_ssh_control_dir():
+    """Stop the ssh masters still running, and remove their control
+    sockets."""
+    for destination, options in list(_ssh_master_options.items()):
+        try:
+            _stop_ssh_master(options, destination)
+        except OSError:
+            # the ssh command can't be run anymore
+            pass
+    shutil.rmtree(_ssh_control_dir_path, ignore_errors=True)
+
+
+def _stop_ssh_master(options, destination):
+    """Stop the ssh master process of destination, if it's running."""
+    Popen(
+        options + ["-O", "exit", destination],
+        stdin=DEVNULL,
+        stdout=PIPE,
+        stderr=PIPE,
+    ).communicate()
+
+
+def _release_ssh_master(destination):
+    """Stop using the shared ssh connection to destination, return
+    destination if no other instance uses it, else None."""
+    with _ssh_master_lock:
+        _ssh_master_users[destination] -= 1
+        if _ssh_master_users[destination] > 0:
+            return None
+        del _ssh_master_users[destination]
+        return destination
+
+
+class _ReplyReader:
+    """Read replies from a connected BIRD control socket.
+
+    Data is received with recv_into() into a single buffer, that is reused
+    for all replies read from the connection, and only grows if a reply
+    doesn't fit. The reply is decoded once, when it is complete. After a
+    large reply, the buffer is replaced by one of the initial size again.
+
+    Data received beyond the end of a reply is kept for the next reply, so
+    multiple replies can be read from the same connection. If more replies
+    follow (last=False), the end of a reply is found by scanning only the
+    newly received bytes for a reply code. Nothing can follow the last reply,
+    so then only the last complete line in the buffer needs to be checked.
+
+    Receiving raises TimeoutError once the deadline has passed, and ValueError
+    if a reply is larger than max_size. cancel() aborts the reply being read
+    from another thread.
+    """
+
+    # the 0001 greeting BIRD sends on connect
+    banner_re = re.compile(rb"\n0001 ")
+    # '\n' and 4 digit reply code: bytes to scan again after receiving more,
+    # in case a reply code was split
+    overlap = 5
+
+    def __init__(self, sock, reply_end_fields, bufsize=256 * 1024):
+        self.sock = sock
+        codes = b"|".join(b"%04d" % code for code in reply_end_fields)
+        self.end_re = re.compile(rb"\n(?:" + codes + rb")(?![-0-9])")
+        # True while a reply has been started, but not read completely
+        self.in_reply = False
+        # every line in the buffer is preceded by a newline, including the
+        # first one, so the end of reply scan can always look for "\n<code>"
+        self._bufsize = bufsize
+        self._buf = bytearray(bufsize)
+        self._buf[0:1] = b"\n"
+        # unread data is in _buf[_start:_end]
+        self._start = 1
+        self._end = 1
+        # time.monotonic() time replies must be read by, and their size limit
+        self.deadline = None
+        self.max_size = None
+        self.cancelled = False
+        # QueryTimer of the reply being read, with instrumentation
+        self.timer = None
+        # bytes of the current reply received so far
+        self._size = 0
+
+    def limit(self, deadline=None, max_size=None):
+        """Set the deadline and maximum size of the replies read next."""
+        self.deadline = deadline
+        self.max_size = max_size
+        if deadline is None:
+            self.sock.settimeout(None)
+
+    def cancel(self):
+        """Abort reading, the reader raises CancelledError."""
+        self.cancelled = True
+        try:
+            # wakes up a recv() in progress
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def wait(self):
+        """Wait for data, raise EOFError if the connection was closed."""
+        if self._end > self._start:
+            return
+        if not self._fill():
+            raise EOFError("connection closed by BIRD")
+
+    def read_reply(self, last=True, end_re=None):
+        """Read one reply, and return it as a string."""
+        self.in_reply = True
+        # data received before the reply was started belongs to it
+        self._size = 0
+        self._count(self._end - self._start)
+        if self.timer is not None and self._end > self._start:
+            self.timer.received()
+        end_re = end_re or self.end_re
+        scan = self._start - 1
+        while True:
+            if last:
+                end = self._find_last_line_end(end_re, self._end)
+            else:
+                (end, scan) = self._find_end(end_re, scan, self._end)
+            if end != -1:
+                break
+            # the buffer may be compacted when receiving more
+            scan -= self._start
+            if not self._fill():
+                end = self._find_cut_short_end(end_re)
+                break
+            scan += self._start
+
+        reply = self._decode(self._start, end)
+        if self.timer is not None:
+            self.timer.bytes += end - self._start
+            self.timer.lines += reply.count("\n")
+        self._start = end
+        self.in_reply = False
+        self._shrink()
+        return reply
+
+    def read_lines(self, last=True):
+        """Yield the lines of one reply, while it is being received.
+
+        All complete lines in the buffer are decoded at once, after each
+        receive."""
+        self.in_reply = True
+        # data received before the reply was started belongs to it
+        self._size = 0
+        self._count(self._end - self._start)
+        if self.timer is not None and self._end > self._start:
+            self.timer.received()
+        while True:
+            lines_end = self._buf.rfind(b"\n", self._start, self._end) + 1
+            if lines_end:
+                # all complete lines are consumed below, so every line is
+                # scanned once, and can't be split
+                if last:
+                    end = self._find_last_line_end(self.end_re, lines_end)
+                else:
+                    end = self._find_end(self.end_re, self._start - 1, lines_end)[0]
+                done = end != -1
+                if not done:
+                    end = lines_end
+                lines = self._decode(self._start, end - 1).split("\n")
+                if self.timer is not None:
+                    self.timer.bytes += end - self._start
+                    self.timer.lines += len(lines)
+                self._start = end
+                self.in_reply = not done
+                if done:
+                    self._shrink()
+                yield from lines
+                if done:
+                    return
+
+            if not self._fill():
+                end = self._find_cut_short_end(self.end_re)
+                lines = self._decode(self._start, end).split("\n")
+                if self.timer is not None:
+                    self.timer.bytes += end - self._start
+                    self.timer.lines += len(lines)
+                self._start = end
+                self.in_reply = False
+                self._shrink()
+                yield from lines
+                return
+
+    def _find_end(self, end_re, scan, end):
+        """Scan the buffer from scan up to end for the last line of the
+        reply. Return a tuple of the offset after that line or -1, and the
+        offset to continue scanning from when more data was received."""
+        match = end_re.search(self._buf, scan, end)
+        if match:
+            eol = self._buf.find(b"\n", match.end(), end)
+            if eol != -1:
+                return (eol + 1, scan)
+            # wait for the rest of the line
+            return (-1, match.start())
+        return (-1, max(self._start - 1, end - self.overlap))
+
+    def _find_last_line_end(self, end_re, end):
+        """Return end if the last complete line in the buffer before end is
+        the last line of the reply, else -1."""
+        last_eol = self._buf.rfind(b"\n", self._start, end)
+        if last_eol == -1:
+            return -1
+        line_start = self._buf.rfind(b"\n", 0, last_eol)
+        if end_re.match(self._buf, line_start, last_eol + 1):
+            return last_eol + 1
+        return -1
+
+    def _find_cut_short_end(self, end_re):
+        """At end of file, return the end of the buffer if the final line,
+        that is not followed by a newline, is the last line of the reply.
+        Bird always ends the last line, but don't lose it if it was cut
+        short."""
+        line_start = self._buf.rfind(b"\n", 0, self._end)
+        if line_start >= self._start - 1 and end_re.match(
+            self._buf, line_start, self._end
+        ):
+            return self._end
+        raise ValueError("Could not read additional data from BIRD")
+
+    def _decode(self, start, end):
+        with memoryview(self._buf) as view:
+            return str(view[start:end], "utf-8")
+
+    def _fill(self):
+        """Receive more data, return False on end of file."""
+        if self._start == self._end:
+            # everything was read, start at the beginning of the buffer again
+            self._start = self._end = 1
+        elif self._end == len(self._buf):
+            self._make_room()
+        end = self._end
+        with memoryview(self._buf) as view:
+            received = self._recv_into(view[end:])
+        self._end += received
+        self._count(received)
+        if self.timer is not None and received:
+            self.timer.received()
+        return received > 0
+
+    def _count(self, received):
+        """Add received bytes to the size of the current reply."""
+        self._size += received
+        if self.max_size is not None and self._size > self.max_size:
+            raise ValueError(
+                f"BIRD reply exceeds max_reply_size of {self.max_size} bytes"
+            )
+
+    def _recv_into(self, view):
+        if self.deadline is not None:
+            self.sock.settimeout(_remaining(self.deadline))
+        try:
+            received = self.sock.recv_into(view)
+        except socket.timeout:
+            raise TimeoutError(_timeout_message) from None
+        except OSError:
+            if self.cancelled:
+                raise CancelledError("query was cancelled") from None
+            raise
+        if self.cancelled:
+            raise CancelledError("query was cancelled")
+        return received
+
+    def _make_room(self):
+        # move the unread data to the front, after the newline before it
+        if self._start > 1:
+            size = self._end - self._start + 1
+            self._buf[:size] = self._unread()
+            self._start = 1
+            self._end = size
+        # double the size if less than half of the buffer is free, what's in
+        # the new half doesn't matter, so that's cheaper than zeroing it
+        if self._end > len(self._buf) // 2:
+            self._buf *= 2
+
+    def _shrink(self):
+        """Replace a grown buffer by one of the initial size, once the unread
+        data fits, so a large reply doesn't hold on to its memory."""
+        size = self._end - self._start + 1
+        if len(self._buf) <= self._bufsize or size > self._bufsize:
+            return
+        buf = bytearray(self._bufsize)
+        buf[:size] = self._unread()
+        self._buf = buf
+        self._start = 1
+        self._end = size
+
+    def _unread(self):
+        """Return the unread data, after the newline before it."""
+        start, end = self._start - 1, self._end
+        return self._buf[start:end]
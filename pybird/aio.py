@@ -0,0 +1,365 @@
+"""asyncio interface to BIRD
+
+AsyncPyBird offers the same queries as PyBird, as coroutines, so many BIRD
+instances and peers can be queried concurrently from a single thread:
+
+    bird = AsyncPyBird(socket_file="/var/run/bird.ctl")
+    peers = await bird.get_peer_status()
+    statuses = await gather_limited(
+        (bird.get_peer_status(peer["name"]) for peer in peers), limit=20
+    )
+"""
+
+import asyncio
+import contextvars
+from asyncio.subprocess import PIPE
+
+from pybird import (
+    PrefixIndex,
+    PyBird,
+    RouteSnapshot,
+    RouteTable,
+    _remaining,
+    _timeout_message,
+)
+
+# maximum length of a single line of a BIRD reply
+LINE_LIMIT = 1024 * 1024
+
+
+async def gather_limited(aws, limit=10, return_exceptions=False):
+    """Run awaitables concurrently, with at most limit of them running at
+    the same time, and return their results in order, like asyncio.gather().
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(aw):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(
+        *(run(aw) for aw in aws), return_exceptions=return_exceptions
+    )
+
+
+class AsyncPyBird(PyBird):
+    """PyBird with coroutine query methods, for use with asyncio.
+
+    Queries to a local BIRD use asyncio.open_unix_connection, remote queries
+    run ssh with asyncio.create_subprocess_exec. Replies are parsed with the
+    same methods as PyBird uses.
+
+    timeout and max_reply_size apply like with PyBird, and deadline() to the
+    queries awaited in its block, by the task and the tasks it starts there.
+    For a deadline of a single call, use asyncio.wait_for(), cancelling a
+    query closes its connection or kills its ssh process.
+
+    Replies are read completely before they are parsed, so there is no
+    iter_routes(), use get_routes() instead.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.keepalive and not self.hostname:
+            raise ValueError("keepalive is only supported over ssh by AsyncPyBird")
+        # deadline() is per task, instead of per thread
+        self._deadline = _TaskLocal()
+
+    async def get_config(self):
+        if not self.config_file:
+            raise ValueError("config_file is not set")
+        return await self._read_file(self.config_file)
+
+    async def put_config(self, data):
+        if not self.config_file:
+            raise ValueError("config_file is not set")
+        self._invalidate_cache()
+        return await self._write_file(data, self.config_file)
+
+    async def commit_config(self):
+        return await self.configure()
+
+    async def check_config(self):
+        """Check configuration without applying it, see PyBird.check_config"""
+        data = await self._send_query("configure check")
+        if not self.socket_file:
+            return data
+
+        err = self._parse_configure(data)
+        if err:
+            raise ValueError(err)
+        return None
+
+    async def configure(self, soft=False, timeout=0):
+        data = await self._send_query("configure")
+        self._invalidate_cache()
+        if not self.socket_file:
+            return data
+
+        err = self._parse_configure(data)
+        if err:
+            raise ValueError(err)
+
+    async def get_bird_status(self):
+        data = await self._send_query("show status")
+        if not self.socket_file:
+            return data
+        return self._parse_status(data)
+
+    async def get_routes(
+        self,
+        prefix=None,
+        peer=None,
+        table=None,
+        record_type=dict,
+        columnar=False,
+        workers=None,
+        fields=None,
+    ):
+        data = await self._send_query(self._routes_query(prefix, peer, table))
+        if workers:
+            # don't block the event loop while the worker processes parse
+            routes = await asyncio.get_running_loop().run_in_executor(
+                None, self._parse_route_data, data, record_type, workers, fields
+            )
+        else:
+            routes = self._parse_route_data(data, record_type, fields=fields)
+        if columnar:
+            return RouteTable.from_routes(routes)
+        return routes
+
+    def iter_routes(self, *args, **kwargs):
+        raise TypeError("AsyncPyBird can't stream routes, use await get_routes()")
+
+    async def get_route_snapshot(self, prefix=None, peer=None, table=None):
+        routes = await self.get_routes(prefix=prefix, peer=peer, table=table)
+        return RouteSnapshot.from_routes(routes)
+
+    async def get_prefix_index(self, peer=None, table=None):
+        routes = await self.get_routes(peer=peer, table=table)
+        return PrefixIndex.from_routes(routes)
+
+    async def get_route_count(self, table=None, peer=None, filter=None):
+        data = await self._send_query(self._route_count_query(table, peer, filter))
+        if not self.socket_file:
+            return data
+        return self._parse_route_count(data)
+
+    async def get_route_stats(self):
+        count_data, peer_data = await asyncio.gather(
+            self._send_query(self._route_count_query()),
+            self._send_query(self._peer_status_query()),
+        )
+        return self._route_stats(count_data, peer_data)
+
+    async def get_peer_prefixes_announced(self, peer_name, fields=None):
+        query = self._peer_prefixes_announced_query(peer_name)
+        data = await self._send_query(query)
+        return self._parse_route_data(data, fields=fields)
+
+    async def get_routes_received(self, peer=None, fields=None):
+        return await self.get_peer_prefixes_announced(peer, fields)
+
+    async def get_peer_prefixes_exported(self, peer_name, fields=None):
+        clean_peer_name = self._clean_input(peer_name)
+        query = "show route all table T_{} export {}".format(
+            clean_peer_name, clean_peer_name
+        )
+        data = await self._send_query(query)
+        if not self.socket_file:
+            return data
+        return self._parse_route_data(data, fields=fields)
+
+    async def get_peer_prefixes_accepted(self, peer_name, fields=None):
+        query = self._peer_prefixes_accepted_query(peer_name)
+        data = await self._send_query(query)
+        return self._parse_route_data(data, fields=fields)
+
+    async def get_peer_prefixes_rejected(self, peer_name, fields=None):
+        if fields is not None:
+            fields = self.route_key_fields + tuple(fields)
+        announced, accepted = await asyncio.gather(
+            self.get_peer_prefixes_announced(peer_name, fields),
+            self.get_peer_prefixes_accepted(peer_name, self.route_key_fields),
+        )
+        return self._rejected_routes(announced, accepted)
+
+    def iter_peer_prefixes_rejected(self, *args, **kwargs):
+        raise TypeError(
+            "AsyncPyBird can't stream routes, use await get_peer_prefixes_rejected()"
+        )
+
+    async def get_peer_prefixes_rejected_summary(
+        self, peer_name, top=10, reason_community=None
+    ):
+        rejected = await self.get_peer_prefixes_rejected(
+            peer_name, fields=self._rejected_summary_fields(reason_community)
+        )
+        return self._rejected_summary(rejected, top, reason_community)
+
+    async def get_prefix_info(self, prefix, peer_name=None):
+        query = "show route for %s all" % prefix
+        if peer_name is not None:
+            query += " protocol %s" % peer_name
+        data = await self._send_query(query)
+        if not self.socket_file:
+            return data
+        return self._parse_route_data(data)
+
+    async def get_peer_status(self, peer_name=None):
+        data = await self._send_query(self._peer_status_query(peer_name))
+        if not self.socket_file:
+            return data
+        return self._peer_status_result(data, peer_name)
+
+    async def get_peer_summaries(self):
+        data = await self._send_query("show protocols")
+        if not self.socket_file:
+            return data
+        return self._parse_peer_data(data, data_contains_detail=False)
+
+    async def _remote_cmd(self, cmd, inp=None, max_size=None):
+        """Run cmd over ssh and return its output, raise ValueError if it is
+        longer than max_size bytes."""
+        proc = await asyncio.create_subprocess_exec(
+            *self._ssh_command(cmd), stdin=PIPE, stdout=PIPE
+        )
+        try:
+            if max_size is None:
+                res, _ = await proc.communicate(input=inp)
+                return res
+            proc.stdin.close()
+            chunks = []
+            size = 0
+            while True:
+                chunk = await proc.stdout.read(64 * 1024)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise ValueError(
+                        f"BIRD reply exceeds max_reply_size of {max_size} bytes"
+                    )
+                chunks.append(chunk)
+            await proc.wait()
+            return b"".join(chunks)
+        finally:
+            # cancelled, timed out or too large
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+
+    async def _read_file(self, fname):
+        if self.hostname:
+            return await self._with_timeout(self._remote_cmd("cat " + fname))
+        return super()._read_file(fname)
+
+    async def _write_file(self, data, fname):
+        if self.hostname:
+            await self._with_timeout(self._remote_cmd("cat >" + fname, inp=data))
+            return
+        super()._write_file(data, fname)
+
+    async def _send_query(self, query):
+        if self.cache is not None:
+            return await self.cache.get_async(
+                query, lambda: self._send_uncached_query(query), self._cache_target()
+            )
+        return await self._send_uncached_query(query)
+
+    async def _send_uncached_query(self, query):
+        self.log.debug("PyBird: query: %s", query)
+        timer = self._query_timer(query)
+        if self.hostname:
+            reply = self._remote_query(query, timer)
+        else:
+            reply = self._socket_query(query, timer)
+        with self._reporting(timer):
+            return await self._with_timeout(reply)
+
+    async def _with_timeout(self, aw):
+        """Await aw, cancel it and raise TimeoutError after timeout seconds,
+        or at the deadline()."""
+        try:
+            timeout = _remaining(self._query_deadline())
+        except TimeoutError:
+            aw.close()
+            raise
+        if timeout is None:
+            return await aw
+        try:
+            return await asyncio.wait_for(aw, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(_timeout_message) from None
+
+    async def _remote_query(self, query, timer=None):
+        res = await self._remote_cmd(
+            self._birdc_command(query), max_size=self.max_reply_size
+        )
+        if timer is not None and res:
+            timer.received()
+            timer.bytes = len(res)
+            timer.lines = res.count(b"\n")
+        res += b"0000\n"
+        return res.decode("utf-8")
+
+    async def _socket_query(self, query, timer=None):
+        """Open a connection to the BIRD control socket, send the query and
+        get the response."""
+        reader, writer = await asyncio.open_unix_connection(
+            self.socket_file, limit=LINE_LIMIT
+        )
+        if timer is not None:
+            timer.connect_done()
+        try:
+            writer.write(self._encode_query(query))
+            lines = []
+            size = 0
+            while True:
+                line = await reader.readline()
+                size += len(line)
+                if timer is not None:
+                    timer.received()
+                    timer.bytes = size
+                    timer.lines += 1
+                if self.max_reply_size is not None and size > self.max_reply_size:
+                    raise ValueError(
+                        f"BIRD reply exceeds max_reply_size of"
+                        f" {self.max_reply_size} bytes"
+                    )
+                if not line.endswith(b"\n"):
+                    # end of file, bird always ends the last line, but don't
+                    # lose a final line that was cut short
+                    line = line.decode("utf-8")
+                    if line and self._is_reply_end(line):
+                        lines.append(line)
+                        break
+                    raise ValueError("Could not read additional data from BIRD")
+                line = line[:-1].decode("utf-8")
+                lines.append(line)
+                if self._is_reply_end(line):
+                    break
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                # the connection is closed either way
+                pass
+        return "\n".join(lines) + "\n"
+
+
+class _TaskLocal:
+    """Like threading.local(), for the value attribute only, but per asyncio
+    task. Tasks started by a task start with its value."""
+
+    def __init__(self):
+        self._var = contextvars.ContextVar("pybird_deadline", default=None)
+
+    @property
+    def value(self):
+        return self._var.get()
+
+    @value.setter
+    def value(self, value):
+        self._var.set(value)
@@ -0,0 +1,103 @@
+"""Typed BGP route attributes
+
+By default, BGP attributes of routes are strings, as BIRD prints them. With
+TypedAttributes, they are parsed into values that don't need to be split
+again, and identical values of many routes are shared:
+
+    bird = PyBird(socket_file="/var/run/bird.ctl", typed_attributes=TypedAttributes())
+    route = bird.get_routes(peer="PS1")[0]
+    route["as_path"]  # (8954, 8283)
+    route["community"]  # ((8954, 620),)
+"""
+
+import re
+
+_re_community = re.compile(r"\(([^)]*)\)")
+
+
+def parse_as_path(value):
+    """Parse an AS path like "8954 8283 {65001 65002}" into a tuple of ASNs,
+    with an AS_SET as a frozenset of ASNs."""
+    path = []
+    segment = None
+    for token in value.replace("{", " { ").replace("}", " } ").split():
+        if token == "{":
+            segment = []
+        elif token == "}":
+            path.append(frozenset(segment or ()))
+            segment = None
+        elif token.isdigit():
+            (path if segment is None else segment).append(int(token))
+    return tuple(path)
+
+
+def parse_communities(value):
+    """Parse communities like "(8954,620) (65535, 1101, 5) (rt, 64512, 1)"
+    into a tuple of tuples. Numbers are ints, other fields, like the type of
+    extended communities, are kept as strings."""
+    return tuple(
+        tuple(_community_field(field) for field in community.split(","))
+        for community in _re_community.findall(value)
+    )
+
+
+def _community_field(field):
+    field = field.strip()
+    if field.isdigit():
+        return int(field)
+    if field.startswith("0x"):
+        try:
+            return int(field, 16)
+        except ValueError:
+            pass
+    return field
+
+
+class TypedAttributes:
+    """Parse BGP attributes of routes into typed values, for
+    PyBird(typed_attributes=...):
+
+    - as_path: tuple of ASNs, an AS_SET is a frozenset of ASNs
+    - community, large_community, ext_community: tuple of tuples
+    - local_pref, med: int
+
+    Parsed values are kept in an intern table by their attribute and text,
+    so routes with the same attribute value share one object, which is only
+    parsed once. When the table holds maxsize values, it is cleared.
+    """
+
+    parsers = {
+        "as_path": parse_as_path,
+        "community": parse_communities,
+        "large_community": parse_communities,
+        "ext_community": parse_communities,
+        "local_pref": int,
+        "med": int,
+    }
+
+    def __init__(self, maxsize=65536):
+        self.maxsize = maxsize
+        # (attribute, text): parsed value
+        self._interned = {}
+
+    def parse(self, key, value):
+        """Return the typed value of attribute key, value as text. Values of
+        other attributes are returned as they are."""
+        parse = self.parsers.get(key)
+        if parse is None:
+            return value
+        interned = self._interned.get((key, value))
+        if interned is None:
+            if len(self._interned) >= self.maxsize:
+                self._interned.clear()
+            interned = self._interned[(key, value)] = parse(value)
+        return interned
+
+    def __len__(self):
+        return len(self._interned)
+
+    def __getstate__(self):
+        # don't send the intern table to worker processes
+        state = self.__dict__.copy()
+        state["_interned"] = {}
+        return state
@@ -0,0 +1,186 @@
+"""Caching of BIRD query replies
+
+BIRD handles control socket queries one at a time, so when many clients ask
+for the same information, like a web service showing peer status does, the
+same query can be answered from a cache:
+
+    bird = PyBird(socket_file="/var/run/bird.ctl", cache=QueryCache(ttl=10))
+"""
+
+import asyncio
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from functools import partial
+
+_MISSING = object()
+
+
+class QueryCache:
+    """A cache of replies to BIRD queries, for PyBird(cache=...).
+
+    Replies to "show" queries are kept for ttl seconds. ttls maps queries, or
+    their first words, to their own TTL, the longest match wins, e.g.
+    {"show route": 60, "show status": 0}. A TTL of 0 disables caching, other
+    queries, like "configure", are never cached.
+
+    Replies are cached by query and target, which identifies the BIRD that
+    answered, so one cache can be shared by PyBird instances of different
+    routers. At most maxsize replies are kept, the least recently used are
+    dropped first. Concurrent requests for a query that is not cached share
+    a single BIRD query. hits, misses and coalesced (requests that waited for
+    another request's query) count the requests.
+    """
+
+    def __init__(self, ttl=5, ttls=None, maxsize=256):
+        self.ttls = {"show": ttl}
+        if ttls:
+            self.ttls.update(ttls)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        # (target, query): (expiry time, reply), in least recently used order
+        self._entries = OrderedDict()
+        # (target, query): Future, or for get_async() asyncio.Task, of the
+        # running query
+        self._inflight = {}
+        self._inflight_async = {}
+        # replies of queries started before the last invalidate() of all
+        # targets, or of their target, are stale
+        self._generation = 0
+        self._target_generations = Counter()
+        self._lock = threading.Lock()
+
+    def ttl(self, query):
+        """Return the TTL for query, 0 if it is not cached."""
+        for prefix in sorted(self.ttls, key=len, reverse=True):
+            if query == prefix or query.startswith(prefix + " "):
+                return self.ttls[prefix]
+        return 0
+
+    def get(self, query, fetch, target=None, wait=None):
+        """Return the cached reply for query to target, or call fetch() to get
+        it.
+
+        If another thread is fetching it already, the reply is returned by
+        wait(future), with the future of that thread's reply, by default by
+        future.result().
+        """
+        ttl = self.ttl(query)
+        if ttl <= 0:
+            return fetch()
+
+        key = (target, query)
+        with self._lock:
+            reply = self._lookup(key)
+            if reply is not _MISSING:
+                return reply
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = self._inflight[key] = Future()
+                generation = self._current_generation(target)
+            else:
+                self.coalesced += 1
+        if not leader:
+            if wait is None:
+                return flight.result()
+            return wait(flight)
+
+        try:
+            reply = fetch()
+        except BaseException as exc:
+            with self._lock:
+                del self._inflight[key]
+            flight.set_exception(exc)
+            raise
+        with self._lock:
+            del self._inflight[key]
+            self._store(key, reply, ttl, generation)
+        flight.set_result(reply)
+        return reply
+
+    async def get_async(self, query, fetch, target=None):
+        """Return the cached reply for query to target, or await fetch() to
+        get it."""
+        ttl = self.ttl(query)
+        if ttl <= 0:
+            return await fetch()
+
+        key = (target, query)
+        with self._lock:
+            reply = self._lookup(key)
+            if reply is not _MISSING:
+                return reply
+            task = self._inflight_async.get(key)
+            if task is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                task = self._inflight_async[key] = asyncio.ensure_future(fetch())
+                task.add_done_callback(
+                    partial(self._task_done, key, ttl, self._current_generation(target))
+                )
+        # a cancelled request does not cancel the query others wait for
+        return await asyncio.shield(task)
+
+    def _task_done(self, key, ttl, generation, task):
+        with self._lock:
+            del self._inflight_async[key]
+            if not task.cancelled() and task.exception() is None:
+                self._store(key, task.result(), ttl, generation)
+
+    def invalidate(self, prefix=None, target=None):
+        """Drop all cached replies, or those of queries starting with prefix,
+        of all targets, or of target only. Replies of queries that are running
+        are not cached."""
+        with self._lock:
+            if target is None:
+                self._generation += 1
+            else:
+                self._target_generations[target] += 1
+            stale = [
+                (entry_target, query)
+                for (entry_target, query) in self._entries
+                if target in (None, entry_target)
+                if prefix is None or query.startswith(prefix)
+            ]
+            for key in stale:
+                del self._entries[key]
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "size": len(self._entries),
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _current_generation(self, target):
+        return (self._generation, self._target_generations[target])
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        (expires, reply) = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return reply
+
+    def _store(self, key, reply, ttl, generation):
+        if generation != self._current_generation(key[0]):
+            return
+        self._entries[key] = (time.monotonic() + ttl, reply)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
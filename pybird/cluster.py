@@ -0,0 +1,139 @@
+"""Query many BIRD routers at once
+
+PyBirdCluster runs a PyBird method on all routers concurrently, in a pool of
+threads, so a query to many routers takes as long as the slowest router:
+
+    cluster = PyBirdCluster(
+        {
+            "edge1": "/var/run/bird/edge1.ctl",
+            "edge2": {"hostname": "edge2.example.com", "socket_file": "/run/bird.ctl"},
+        },
+        timeout=10,
+    )
+    for router, status in cluster.get_bird_status().items():
+        print(router, status.result or status.error)
+"""
+
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import ExitStack
+
+from pybird import PyBird
+
+# the outcome of a call on one router:
+# - result: the return value, None if there was an error
+# - error: the exception raised, or a TimeoutError, None if there was none
+# - seconds: how long the call took, the timeout if it timed out
+HostResult = namedtuple("HostResult", ("result", "error", "seconds"))
+
+
+class PyBirdCluster:
+    """A PyBird per router, to run queries on all routers concurrently.
+
+    routers maps router names to their BIRD control socket path, a dict of
+    PyBird arguments, or a PyBird. It can also be a list of socket paths or
+    PyBirds, named by their hostname or socket path. Routers created from
+    paths or arguments get options as further PyBird arguments, keepalive is
+    on by default, so every router keeps its connection open between calls.
+
+    call() runs a method on all routers, or those in hosts, and returns a
+    HostResult for each router by name. Routers that haven't replied within
+    timeout seconds get a TimeoutError. Their queries are made within the
+    same deadline, so a hung router doesn't keep its thread busy for longer.
+    Up to max_workers queries run at the same time. Public
+    PyBird methods can also be called on the cluster directly:
+
+        cluster.get_prefix_info("192.0.2.0/24")
+    """
+
+    def __init__(self, routers, timeout=None, max_workers=None, **options):
+        options.setdefault("keepalive", True)
+        if not hasattr(routers, "items"):
+            routers = {self._router_name(router): router for router in routers}
+        self.birds = {
+            name: self._make_bird(router, options) for name, router in routers.items()
+        }
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or max(len(self.birds), 1),
+            thread_name_prefix="pybird-cluster",
+        )
+
+    def _router_name(self, router):
+        if isinstance(router, PyBird):
+            return router.hostname or router.socket_file
+        return router
+
+    def _make_bird(self, router, options):
+        if isinstance(router, PyBird):
+            return router
+        if isinstance(router, str):
+            router = {"socket_file": router}
+        return PyBird(**dict(options, **router))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the connections of all routers, without waiting for queries
+        that timed out."""
+        for bird in self.birds.values():
+            bird.close()
+        self._executor.shutdown(wait=False)
+
+    def __getattr__(self, name):
+        if name.startswith("_") or not callable(getattr(PyBird, name, None)):
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            return self.call(name, args, kwargs)
+
+        return call
+
+    def call(self, method, args=(), kwargs=None, hosts=None, timeout=None):
+        """Run method, the name of a PyBird method or a function that takes a
+        PyBird, with args and kwargs, on all routers or those named in hosts.
+        Return a dict of HostResult by router name.
+
+        timeout overrides the timeout of the cluster for this call."""
+        if timeout is None:
+            timeout = self.timeout
+        birds = self.birds
+        if hosts is not None:
+            birds = {name: birds[name] for name in hosts}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        futures = {
+            name: self._executor.submit(
+                self._call, bird, method, args, kwargs or {}, deadline
+            )
+            for name, bird in birds.items()
+        }
+        wait(futures.values(), timeout)
+
+        results = {}
+        for name, future in futures.items():
+            if not future.done():
+                future.cancel()
+                error = TimeoutError(f"{name}: no reply within {timeout} seconds")
+                results[name] = HostResult(None, error, timeout)
+            else:
+                results[name] = future.result()
+        return results
+
+    def _call(self, bird, method, args, kwargs, deadline=None):
+        start = time.monotonic()
+        try:
+            with ExitStack() as stack:
+                if deadline is not None:
+                    stack.enter_context(bird.deadline(max(deadline - start, 0)))
+                if isinstance(method, str):
+                    result = getattr(bird, method)(*args, **kwargs)
+                else:
+                    result = method(bird, *args, **kwargs)
+        except Exception as exc:
+            return HostResult(None, exc, time.monotonic() - start)
+        return HostResult(result, None, time.monotonic() - start)
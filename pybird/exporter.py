@@ -0,0 +1,304 @@
+"""Prometheus / OpenMetrics exporter for BIRD
+
+BirdExporter polls the status of BIRD and its BGP peers in a background
+thread, and renders them as OpenMetrics once per refresh. Scrapes are served
+from the last refresh, so they never wait for BIRD, and any number of
+scrapers share one refresh. Peers that didn't change since the last refresh
+are not parsed again.
+
+    exporter = BirdExporter(PyBird("/var/run/bird.ctl", keepalive=True))
+    serve(exporter, port=9324)
+
+Or from the command line:
+
+    python -m pybird.exporter /var/run/bird.ctl --port 9324
+"""
+
+import argparse
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pybird import PyBird
+from pybird.poller import PeerStatusPoller
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+_re_route_change = re.compile(r"(import|export)_(updates|withdraws)_(\w+)$")
+
+log = logging.getLogger(__name__)
+
+
+class BirdExporter:
+    """Keep OpenMetrics of a PyBird up to date, for scrapes.
+
+    Every interval seconds, BIRD is queried for its status and the status of
+    all peers, within timeout seconds, by default the interval. A scrape
+    waits at most scrape_budget seconds, only while there is no refresh yet.
+    labels are added to all metrics, e.g. {"router": "edge1"}.
+    """
+
+    def __init__(self, bird, interval=15, timeout=None, scrape_budget=5, labels=None):
+        self.bird = bird
+        self.interval = interval
+        self.timeout = interval if timeout is None else timeout
+        self.scrape_budget = scrape_budget
+        self.labels = dict(labels or {})
+        self.errors = 0
+        self._poller = PeerStatusPoller(bird)
+        # the rendered metrics of the last refresh, None before the first
+        self._metrics = None
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Refresh now, and then every interval seconds, in a thread."""
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="pybird-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            start = time.monotonic()
+            self.refresh()
+            self._stopped.wait(max(self.interval - (time.monotonic() - start), 0))
+
+    def refresh(self):
+        """Query BIRD, and render the metrics served to the next scrapes."""
+        start = time.monotonic()
+        try:
+            with self.bird.deadline(self.timeout):
+                status = self.bird.get_bird_status()
+                self._poller.poll()
+        except Exception as exc:
+            log.warning("PyBird exporter: refresh failed: %r", exc)
+            self.errors += 1
+            status = None
+        metrics = self.render(status, self._poller.peers, time.monotonic() - start)
+        with self._condition:
+            self._metrics = metrics
+            self._condition.notify_all()
+
+    def scrape(self, budget=None):
+        """Return the metrics of the last refresh as bytes. Before the first
+        refresh, wait for it for up to budget seconds, at most scrape_budget,
+        and return None if there is none yet."""
+        if budget is None or budget > self.scrape_budget:
+            budget = self.scrape_budget
+        with self._condition:
+            self._condition.wait_for(lambda: self._metrics is not None, budget)
+            return self._metrics
+
+    def render(self, status, peers, seconds):
+        """Return the OpenMetrics of BIRD status and peers, as returned by
+        get_bird_status() and get_peer_status(), as bytes. status is None if
+        BIRD could not be queried, then only bird_up and the metrics of the
+        exporter are included."""
+        writer = _MetricsWriter(self.labels)
+        writer.family("bird_up", "gauge", "1 if BIRD could be queried")
+        writer.sample("bird_up", {}, int(status is not None))
+        if status is not None:
+            self._render_status(writer, status)
+            self._render_peers(writer, peers.values())
+
+        writer.family(
+            "bird_exporter_refresh_duration_seconds",
+            "gauge",
+            "Seconds the last refresh took",
+        )
+        writer.sample("bird_exporter_refresh_duration_seconds", {}, seconds)
+        writer.family(
+            "bird_exporter_refresh_errors", "counter", "Refreshes that failed"
+        )
+        writer.sample("bird_exporter_refresh_errors_total", {}, self.errors)
+        return writer.done()
+
+    def _render_status(self, writer, status):
+        now = datetime.now()
+        writer.family("bird", "info", "BIRD version and router ID")
+        info = {
+            key: status[key]
+            for key in ("version", "router_id", "hostname")
+            if status.get(key)
+        }
+        writer.sample("bird_info", info, 1)
+        if status.get("last_reboot"):
+            writer.family("bird_uptime_seconds", "gauge", "Seconds since BIRD started")
+            uptime = (now - status["last_reboot"]).total_seconds()
+            writer.sample("bird_uptime_seconds", {}, uptime)
+        if status.get("last_reconfiguration"):
+            name = "bird_last_reconfiguration_age_seconds"
+            writer.family(name, "gauge", "Seconds since BIRD was last reconfigured")
+            age = (now - status["last_reconfiguration"]).total_seconds()
+            writer.sample(name, {}, age)
+
+    def _render_peers(self, writer, peers):
+        now = datetime.now()
+        peers = sorted(peers, key=lambda peer: peer["name"])
+
+        writer.family("bird_peer", "info", "BGP peers")
+        for peer in peers:
+            info = {"peer": peer["name"]}
+            for key in ("protocol", "table", "asn", "address", "description"):
+                if peer.get(key):
+                    info[key] = peer[key]
+            writer.sample("bird_peer_info", info, 1)
+
+        writer.family("bird_peer_up", "gauge", "1 if the BGP session is established")
+        for peer in peers:
+            writer.sample("bird_peer_up", {"peer": peer["name"]}, int(bool(peer["up"])))
+
+        writer.family("bird_peer_state", "info", "State of the BGP session")
+        for peer in peers:
+            labels = {"peer": peer["name"], "state": peer["state"] or ""}
+            writer.sample("bird_peer_state_info", labels, 1)
+
+        name = "bird_peer_last_change_age_seconds"
+        writer.family(name, "gauge", "Seconds since the state of the peer changed")
+        for peer in peers:
+            if peer.get("last_change"):
+                age = (now - peer["last_change"]).total_seconds()
+                writer.sample(name, {"peer": peer["name"]}, age)
+
+        writer.family("bird_peer_routes", "gauge", "Routes imported and exported")
+        for peer in peers:
+            for direction in ("imported", "exported"):
+                value = peer.get("routes_" + direction)
+                if value is not None:
+                    labels = {"peer": peer["name"], "direction": direction}
+                    writer.sample("bird_peer_routes", labels, value)
+
+        name = "bird_peer_route_changes"
+        writer.family(name, "counter", "Route updates and withdraws, by result")
+        for peer in peers:
+            for key, value in peer.items():
+                match = _re_route_change.match(key)
+                if match:
+                    labels = {
+                        "peer": peer["name"],
+                        "direction": match.group(1),
+                        "kind": match.group(2),
+                        "result": match.group(3),
+                    }
+                    writer.sample(name + "_total", labels, value)
+
+
+class _MetricsWriter:
+    """Build OpenMetrics text, with labels added to all samples."""
+
+    def __init__(self, labels):
+        self.lines = []
+        self.labels = _format_labels(labels)
+
+    def family(self, name, metric_type, help_text):
+        self.lines.append(f"# TYPE {name} {metric_type}")
+        self.lines.append(f"# HELP {name} {help_text}")
+
+    def sample(self, name, labels, value):
+        labels = _format_labels(labels)
+        if self.labels:
+            labels = self.labels + "," + labels if labels else self.labels
+        if isinstance(value, float):
+            value = repr(value)
+        if labels:
+            self.lines.append(f"{name}{{{labels}}} {value}")
+        else:
+            self.lines.append(f"{name} {value}")
+
+    def done(self):
+        self.lines.append("# EOF\n")
+        return "\n".join(self.lines).encode("utf-8")
+
+
+def _format_labels(labels):
+    return ",".join(
+        '%s="%s"' % (key, _escape(str(value))) for key, value in labels.items()
+    )
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        # Prometheus tells how long it waits for the scrape
+        try:
+            budget = float(self.headers["X-Prometheus-Scrape-Timeout-Seconds"])
+        except (TypeError, ValueError):
+            budget = None
+        metrics = self.server.exporter.scrape(budget)
+        if metrics is None:
+            self.send_error(503, "No data from BIRD yet")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(metrics)))
+        self.end_headers()
+        self.wfile.write(metrics)
+
+    def log_message(self, format, *args):
+        log.debug("PyBird exporter: %s", format % args)
+
+
+def make_server(exporter, port=9324, address="127.0.0.1"):
+    """Return an HTTP server, that serves the metrics of exporter on
+    /metrics. Call its serve_forever() to run it."""
+    server = ThreadingHTTPServer((address, port), _Handler)
+    server.daemon_threads = True
+    server.exporter = exporter
+    return server
+
+
+def serve(exporter, port=9324, address="127.0.0.1"):
+    """Start the exporter, and serve its metrics until interrupted."""
+    exporter.start()
+    server = make_server(exporter, port, address)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        exporter.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export BIRD metrics.")
+    parser.add_argument("socket_file", help="BIRD control socket")
+    parser.add_argument("--port", type=int, default=9324)
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--interval", type=float, default=15)
+    parser.add_argument("--timeout", type=float, help="seconds a refresh may take")
+    parser.add_argument("--scrape-budget", type=float, default=5)
+    parser.add_argument(
+        "--label",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="label added to all metrics",
+    )
+    args = parser.parse_args(argv)
+    labels = dict(label.split("=", 1) for label in args.label)
+    bird = PyBird(args.socket_file, keepalive=True)
+    exporter = BirdExporter(
+        bird, args.interval, args.timeout, args.scrape_budget, labels
+    )
+    serve(exporter, args.port, args.address)
+
+
+if __name__ == "__main__":
+    main()
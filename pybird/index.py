@@ -0,0 +1,128 @@
+import socket
+from bisect import bisect_left
+
+from pybird.route import iter_prefixed
+
+# address family: (socket address family, address bits)
+_FAMILIES = {4: (socket.AF_INET, 32), 6: (socket.AF_INET6, 128)}
+# address family: netmask as int, by prefix length
+_MASKS = {
+    family: [
+        ((1 << bits) - 1) ^ ((1 << (bits - length)) - 1) for length in range(bits + 1)
+    ]
+    for family, (_, bits) in _FAMILIES.items()
+}
+
+
+def _parse_prefix(prefix):
+    """Return (family, network, prefixlen) for a prefix or address, with the
+    network address as int, host bits cleared."""
+    (address, _, length) = prefix.partition("/")
+    family = 6 if ":" in address else 4
+    (address_family, bits) = _FAMILIES[family]
+    try:
+        network = int.from_bytes(socket.inet_pton(address_family, address), "big")
+        prefixlen = int(length) if length else bits
+    except (OSError, ValueError):
+        raise ValueError(f"invalid prefix: {prefix}")
+    if not 0 <= prefixlen <= bits:
+        raise ValueError(f"invalid prefix: {prefix}")
+    return (family, network & _MASKS[family][prefixlen], prefixlen)
+
+
+class PrefixIndex:
+    """An index of routes by prefix, for lookups without asking BIRD.
+
+    lookup() finds the routes for the longest prefix matching an address or
+    prefix, like PyBird.get_prefix_info() does, covering() and covered()
+    find the routes for all less and more specific prefixes.
+
+    Routes are stored in a dict by network address, per prefix length. A
+    longest match looks up the address in each prefix length that is in use,
+    longest first. For covered(), the prefixes are also kept in a sorted list,
+    where the more specifics of a prefix form a range.
+
+    Routes are added from route dicts or Route objects.
+    """
+
+    def __init__(self, routes=()):
+        self._state = self._build(routes)
+
+    @classmethod
+    def from_routes(cls, routes):
+        return cls(routes)
+
+    def refresh(self, routes):
+        """Replace the indexed routes with routes. Lookups use the previous
+        routes until the new index is complete."""
+        self._state = self._build(routes)
+
+    def _build(self, routes):
+        # family: {prefixlen: {network: [routes]}}
+        tables = {4: {}, 6: {}}
+        last_prefix = None
+        for prefix, route in iter_prefixed(routes):
+            if prefix != last_prefix:
+                last_prefix = prefix
+                (family, network, prefixlen) = _parse_prefix(prefix)
+            by_network = tables[family].setdefault(prefixlen, {})
+            by_network.setdefault(network, []).append(route)
+
+        lengths = {}
+        networks = {}
+        for family, table in tables.items():
+            lengths[family] = sorted(table, reverse=True)
+            networks[family] = sorted(
+                (network, prefixlen)
+                for prefixlen, by_network in table.items()
+                for network in by_network
+            )
+        return (tables, lengths, networks)
+
+    def __len__(self):
+        """Return the number of prefixes"""
+        return sum(len(networks) for networks in self._state[2].values())
+
+    def lookup(self, prefix):
+        """Return the routes for the longest prefix matching an address or
+        prefix, an empty list if there is none."""
+        (family, network, prefixlen) = _parse_prefix(prefix)
+        (tables, lengths, _) = self._state
+        table = tables[family]
+        masks = _MASKS[family]
+        for length in lengths[family]:
+            if length <= prefixlen:
+                routes = table[length].get(network & masks[length])
+                if routes:
+                    return list(routes)
+        return []
+
+    def covering(self, prefix):
+        """Return the routes for all prefixes that contain an address or
+        prefix, including the prefix itself, most specific first."""
+        (family, network, prefixlen) = _parse_prefix(prefix)
+        (tables, lengths, _) = self._state
+        table = tables[family]
+        masks = _MASKS[family]
+        result = []
+        for length in lengths[family]:
+            if length <= prefixlen:
+                result += table[length].get(network & masks[length], ())
+        return result
+
+    def covered(self, prefix):
+        """Return the routes for the prefix and all its more specifics,
+        ordered by network address and prefix length."""
+        (family, network, prefixlen) = _parse_prefix(prefix)
+        (tables, _, networks) = self._state
+        table = tables[family]
+        keys = networks[family]
+        end = network + (1 << (_FAMILIES[family][1] - prefixlen))
+        result = []
+        # shorter prefixes with the same network address sort before
+        index = bisect_left(keys, (network, prefixlen))
+        while index < len(keys) and keys[index][0] < end:
+            (key_network, length) = keys[index]
+            result += table[length][key_network]
+            index += 1
+        return result
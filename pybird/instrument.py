@@ -0,0 +1,324 @@
+"""Instrumentation of BIRD queries and reply parsing
+
+With PyBird(instrument=...), every query reports where its time went:
+connecting, waiting for BIRD to reply, receiving the reply, and parsing it.
+Subclass Instrumentation, or use one of the adapters:
+
+    logged = PyBird("/var/run/bird.ctl", instrument=LoggingInstrumentation())
+
+    histograms = HistogramInstrumentation()
+    bird = PyBird(socket_file="/var/run/bird.ctl", instrument=histograms)
+    bird.get_routes()
+    histograms.get("parse_seconds", "routes").quantile(0.99)
+
+Without instrumentation, nothing is measured.
+"""
+
+import logging
+import threading
+from bisect import bisect_left
+from collections import Counter, namedtuple
+from functools import wraps
+from time import perf_counter
+
+# a query that was sent to BIRD, and its reply:
+# - command: the query
+# - seconds: how long the query took, from connecting to the end of the reply
+# - connect: seconds to connect, None if an open connection was used
+# - first_byte: seconds from connecting, or starting, to the first byte of
+#   the reply
+# - transfer: seconds from the first to the last byte of the reply
+# - bytes, lines: the size of the reply
+# - error: the exception the query raised, None if there was none
+QueryStats = namedtuple(
+    "QueryStats",
+    (
+        "command",
+        "seconds",
+        "connect",
+        "first_byte",
+        "transfer",
+        "bytes",
+        "lines",
+        "error",
+    ),
+)
+
+# a reply that was parsed:
+# - parser: what was parsed, like "routes", "peers" or "status"
+# - seconds: time spent parsing, without waiting for a streamed reply
+# - records: the number of routes, peers etc. parsed
+ParseStats = namedtuple("ParseStats", ("parser", "seconds", "records"))
+
+
+class Instrumentation:
+    """Receives the stats of queries and parsing, for PyBird(instrument=...).
+
+    Subclasses override query() and parse(), which are called in the thread
+    that made the query, so they must be quick and thread-safe.
+    """
+
+    def query(self, stats):
+        """Called with the QueryStats of every query sent to BIRD."""
+
+    def parse(self, stats):
+        """Called with the ParseStats of every reply parsed."""
+
+
+class QueryTimer:
+    """Measures a query while it runs, for its QueryStats."""
+
+    __slots__ = (
+        "command",
+        "start",
+        "connected",
+        "first_byte",
+        "end",
+        "bytes",
+        "lines",
+    )
+
+    def __init__(self, command):
+        self.command = command
+        self.start = perf_counter()
+        self.connected = None
+        self.first_byte = None
+        self.end = None
+        self.bytes = 0
+        self.lines = 0
+
+    def connect_done(self):
+        self.connected = perf_counter()
+
+    def received(self):
+        """Mark that data of the reply was received."""
+        self.end = perf_counter()
+        if self.first_byte is None:
+            self.first_byte = self.end
+
+    def stats(self, error=None):
+        end = self.end or perf_counter()
+        sent = self.connected or self.start
+        first_byte = self.first_byte
+        return QueryStats(
+            self.command,
+            end - self.start,
+            None if self.connected is None else self.connected - self.start,
+            None if first_byte is None else first_byte - sent,
+            None if first_byte is None else end - first_byte,
+            self.bytes,
+            self.lines,
+            error,
+        )
+
+
+def parse_step(parser):
+    """Decorate a PyBird method that parses a reply, to report its ParseStats
+    to the instrumentation of the PyBird, if it has one."""
+
+    def decorate(method):
+        @wraps(method)
+        def timed(self, *args, **kwargs):
+            if self.instrument is None:
+                return method(self, *args, **kwargs)
+            start = perf_counter()
+            result = method(self, *args, **kwargs)
+            seconds = perf_counter() - start
+            self.instrument.parse(ParseStats(parser, seconds, _records(result)))
+            return result
+
+        return timed
+
+    return decorate
+
+
+def _records(result):
+    if isinstance(result, dict) or not hasattr(result, "__len__"):
+        return 1
+    return len(result)
+
+
+def iter_parse_step(instrument, parser, parse, lines):
+    """Yield the records of parse(lines), an iterator over a reply that is
+    still being received, and report the time spent parsing it, without the
+    time spent waiting for lines, or consuming records."""
+    # seconds spent getting lines, and in parse()
+    waiting = 0.0
+    busy = 0.0
+    records = 0
+
+    def timed_lines():
+        nonlocal waiting
+        lines_iter = iter(lines)
+        while True:
+            start = perf_counter()
+            line = next(lines_iter, None)
+            waiting += perf_counter() - start
+            if line is None:
+                return
+            yield line
+
+    records_iter = parse(timed_lines())
+    try:
+        while True:
+            start = perf_counter()
+            record = next(records_iter, _END)
+            busy += perf_counter() - start
+            if record is _END:
+                return
+            records += 1
+            yield record
+    finally:
+        instrument.parse(ParseStats(parser, max(busy - waiting, 0.0), records))
+
+
+_END = object()
+
+
+class LoggingInstrumentation(Instrumentation):
+    """Log a summary line of every query and parsed reply."""
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger("pybird.instrument")
+        self.level = level
+
+    def query(self, stats):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        self.logger.log(
+            self.level,
+            "PyBird: query %s: %.3fs, connect %s, first byte %s, transfer %s,"
+            " %d bytes, %d lines%s",
+            stats.command,
+            stats.seconds,
+            _seconds(stats.connect),
+            _seconds(stats.first_byte),
+            _seconds(stats.transfer),
+            stats.bytes,
+            stats.lines,
+            "" if stats.error is None else f", error {stats.error!r}",
+        )
+
+    def parse(self, stats):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        self.logger.log(
+            self.level,
+            "PyBird: parse %s: %.3fs, %d records",
+            stats.parser,
+            stats.seconds,
+            stats.records,
+        )
+
+
+def _seconds(value):
+    return "-" if value is None else "%.3fs" % value
+
+
+# upper bounds of histogram buckets, for seconds and sizes
+SECONDS_BUCKETS = (
+    *(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5),
+    *(1, 2.5, 5, 10, 30, 60),
+)
+SIZE_BUCKETS = tuple(4 ** exponent for exponent in range(3, 16))
+
+
+class Histogram:
+    """Counts of observed values in buckets, by upper bound, and their sum.
+    Values larger than the last bound are only counted in count."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def quantile(self, q):
+        """Return the upper bound of the bucket containing the q quantile,
+        None if it is beyond the last bucket, or nothing was observed."""
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total and total >= rank:
+                return bound
+        return None
+
+
+class HistogramInstrumentation(Instrumentation):
+    """Keep histograms of query and parse stats in memory.
+
+    Histograms are kept by metric and label, the first two words of the
+    command for queries, like "show route", and the parser for parsing:
+
+    - query_seconds, connect_seconds, first_byte_seconds, transfer_seconds
+    - reply_bytes, reply_lines
+    - parse_seconds, parse_records
+
+    errors counts failed queries by label.
+    """
+
+    metrics = {
+        "query_seconds": SECONDS_BUCKETS,
+        "connect_seconds": SECONDS_BUCKETS,
+        "first_byte_seconds": SECONDS_BUCKETS,
+        "transfer_seconds": SECONDS_BUCKETS,
+        "reply_bytes": SIZE_BUCKETS,
+        "reply_lines": SIZE_BUCKETS,
+        "parse_seconds": SECONDS_BUCKETS,
+        "parse_records": SIZE_BUCKETS,
+    }
+
+    def __init__(self):
+        # (metric, label): Histogram
+        self.histograms = {}
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    def query(self, stats):
+        label = command_label(stats.command)
+        with self._lock:
+            if stats.error is not None:
+                self.errors[label] += 1
+                return
+            self._observe("query_seconds", label, stats.seconds)
+            self._observe("connect_seconds", label, stats.connect)
+            self._observe("first_byte_seconds", label, stats.first_byte)
+            self._observe("transfer_seconds", label, stats.transfer)
+            self._observe("reply_bytes", label, stats.bytes)
+            self._observe("reply_lines", label, stats.lines)
+
+    def parse(self, stats):
+        with self._lock:
+            self._observe("parse_seconds", stats.parser, stats.seconds)
+            self._observe("parse_records", stats.parser, stats.records)
+
+    def _observe(self, metric, label, value):
+        if value is None:
+            return
+        histogram = self.histograms.get((metric, label))
+        if histogram is None:
+            histogram = Histogram(self.metrics[metric])
+            self.histograms[(metric, label)] = histogram
+        histogram.observe(value)
+
+    def get(self, metric, label):
+        """Return the Histogram of metric and label, None if there is none."""
+        return self.histograms.get((metric, label))
+
+
+def command_label(command):
+    """Return the first two words of a BIRD command, to group queries by
+    command, without the names of peers, prefixes etc."""
+    return " ".join(command.split(None, 2)[:2])
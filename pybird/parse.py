@@ -0,0 +1,78 @@
+"""Parse BIRD output from files, like archived route dumps
+
+Files contain the output of birdc with reply codes, as written by
+`birdc -v show route all`, and may be gzip or zstd compressed. Uncompressed
+files are memory-mapped, and results are yielded while the file is read:
+
+    for route in routes_from_file("/var/backups/bird/routes.txt.gz"):
+        ...
+
+zstd compressed files need the zstandard package.
+"""
+
+import gzip
+import io
+import mmap
+import os
+from contextlib import contextmanager
+
+from pybird import PyBird
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def routes_from_file(path, record_type=dict, fields=None, typed_attributes=None):
+    """Yield the routes in the `show route all` output in the file at path,
+    as dicts, or with record_type=Route, Route objects. With fields, only
+    these BGP attributes are parsed, with typed_attributes, a
+    TypedAttributes, they are parsed into typed values."""
+    bird = PyBird(None, typed_attributes=typed_attributes)
+    with open_lines(path) as lines:
+        yield from bird._iter_route_data(lines, record_type, fields)
+
+
+def peers_from_file(path):
+    """Yield the BGP peers in the `show protocols all` output in the file at
+    path, as dicts like those returned by PyBird.get_peer_status()."""
+    with open_lines(path) as lines:
+        yield from PyBird(None)._iter_peer_data(lines, data_contains_detail=True)
+
+
+@contextmanager
+def open_lines(path):
+    """Open the file at path, and return an iterator over its lines, without
+    line endings. Compressed files are decompressed while they are read."""
+    with open(path, "rb") as fobj:
+        magic = fobj.read(4)
+        fobj.seek(0)
+        if magic.startswith(GZIP_MAGIC):
+            with gzip.open(fobj, "rt", encoding="utf-8") as text:
+                yield _stripped(text)
+        elif magic.startswith(ZSTD_MAGIC):
+            yield _stripped(_zstd_reader(fobj))
+        elif os.fstat(fobj.fileno()).st_size == 0:
+            # an empty file can't be mapped
+            yield iter(())
+        else:
+            with mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield _mmap_lines(data)
+
+
+def _mmap_lines(data):
+    for line in iter(data.readline, b""):
+        yield line.rstrip(b"\r\n").decode("utf-8")
+
+
+def _stripped(lines):
+    for line in lines:
+        yield line.rstrip("\r\n")
+
+
+def _zstd_reader(fobj):
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("reading zstd compressed files requires zstandard")
+    reader = zstandard.ZstdDecompressor().stream_reader(fobj)
+    return io.TextIOWrapper(reader, encoding="utf-8")
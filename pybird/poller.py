@@ -0,0 +1,96 @@
+from collections import namedtuple
+
+# a peer that changed between two polls:
+# - kind: "added", "removed" or "changed"
+# - status: the new status of the peer, as get_peer_status() returns it,
+#   the last known status if it was removed
+# - changes: {field: (old value, new value)} of all changed fields
+# - deltas: {field: new value - old value} of changed counters
+PeerEvent = namedtuple("PeerEvent", ("name", "kind", "status", "changes", "deltas"))
+
+
+class PeerStatusPoller:
+    """Poll the status of all BGP peers, and report only the peers that
+    changed since the last poll:
+
+        poller = PeerStatusPoller(bird)
+        poller.subscribe(print)
+        while True:
+            poller.poll()
+            time.sleep(10)
+
+    The first poll reports every peer as added. Peers whose summary line and
+    detail lines are the same as in the last poll are not parsed again.
+    """
+
+    def __init__(self, bird):
+        self.bird = bird
+        # name: status of the BGP peers of the last poll
+        self.peers = {}
+        # name: (summary line, detail lines) of all protocols of the last poll
+        self._blocks = {}
+        self._callbacks = []
+
+    def subscribe(self, callback):
+        """Call callback with every PeerEvent"""
+        self._callbacks.append(callback)
+
+    def poll(self):
+        """Query the status of all peers, and return the list of PeerEvents
+        of the peers that changed."""
+        return self.update(self.bird._send_query(self.bird._peer_status_query()))
+
+    async def poll_async(self):
+        """poll() for an AsyncPyBird"""
+        data = await self.bird._send_query(self.bird._peer_status_query())
+        return self.update(data)
+
+    def update(self, data):
+        """Update the status of all peers from a reply to
+        `show protocols all`, and return the list of PeerEvents."""
+        events = []
+        blocks = {}
+        for block in self.bird._iter_peer_blocks(data):
+            name = block[0].split(None, 1)[0]
+            blocks[name] = block
+            if self._blocks.get(name) == block:
+                continue
+
+            status = self.bird._parse_peer_block(*block)
+            old_status = self.peers.pop(name, None)
+            if status is None:
+                if old_status is not None:
+                    events.append(PeerEvent(name, "removed", old_status, {}, {}))
+                continue
+            self.peers[name] = status
+            if old_status is None:
+                events.append(PeerEvent(name, "added", status, {}, {}))
+                continue
+            event = self._changed(name, old_status, status)
+            if event:
+                events.append(event)
+
+        for name in [name for name in self.peers if name not in blocks]:
+            events.append(PeerEvent(name, "removed", self.peers.pop(name), {}, {}))
+        self._blocks = blocks
+
+        for event in events:
+            for callback in self._callbacks:
+                callback(event)
+        return events
+
+    def _changed(self, name, old_status, status):
+        """Return the PeerEvent for a peer that was polled before, None if
+        no field changed."""
+        changes = {}
+        deltas = {}
+        for field in old_status.keys() | status.keys():
+            (old, new) = (old_status.get(field), status.get(field))
+            if old == new:
+                continue
+            changes[field] = (old, new)
+            if type(old) is int and type(new) is int:
+                deltas[field] = new - old
+        if not changes:
+            return None
+        return PeerEvent(name, "changed", status, changes, deltas)
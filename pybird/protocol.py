@@ -0,0 +1,48 @@
+"""Tokenizer for replies of the BIRD control socket protocol.
+
+Every line of a reply starts with a 4 digit reply code, followed by "-" if
+more lines follow, or " " on the last line of the reply. A line starting
+with a space continues the line before it, and has the same code:
+
+    1007-2a02:898::/32      via 2001:7f8:1::a500:8954:1 on eth1 [PS2 12:46]
+    1008-   Type: BGP unicast univ
+    1012-   BGP.origin: IGP
+     BGP.as_path: 8954 8283
+    0000
+"""
+
+import logging
+
+# characters following the reply code, "" if the line is just the code
+_CODE_SEPARATORS = frozenset(("-", " ", ""))
+
+
+def tokenize(reply, log=None):
+    """Yield (code, is_continuation, payload) for every line of reply.
+
+    reply is a str or bytes reply, or an iterable of str or bytes lines.
+    payload is the line without its code and separator, or for continuation
+    lines, without the leading space. Continuation lines have the code of the
+    line before them, None before the first line with a code.
+
+    If log is given, every line is logged, if debug logging is enabled.
+    """
+    if isinstance(reply, bytes):
+        reply = reply.decode("utf-8")
+    if isinstance(reply, str):
+        reply = reply.splitlines()
+    debug = log is not None and log.isEnabledFor(logging.DEBUG)
+
+    code = None
+    for line in reply:
+        if line.__class__ is bytes:
+            line = line.decode("utf-8")
+        if debug:
+            log.debug("PyBird: parse: %s", line)
+        if line[:1] == " ":
+            yield (code, True, line[1:])
+        elif line[:4].isdecimal() and line[4:5] in _CODE_SEPARATORS and len(line) > 3:
+            code = int(line[:4])
+            yield (code, False, line[5:])
+        else:
+            yield (code, True, line)
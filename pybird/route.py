@@ -0,0 +1,173 @@
+from collections.abc import Mapping
+
+
+class Route:
+    """A route parsed from BIRD, as a compact alternative to a dict per route.
+
+    The common fields are stored in slots, any other BGP attribute in the
+    extras dict, which is None if there are none. Fields can be read as
+    attributes or, like the dicts returned by default, as items:
+
+        route.prefix == route["prefix"]
+
+    to_dict() returns the same dict PyBird returns for the route by default.
+    """
+
+    # fields of the route summary line, always present
+    summary_fields = ("prefix", "peer", "interface", "source", "time")
+    # BGP attributes, only present if BIRD returned them
+    attribute_fields = (
+        "origin",
+        "as_path",
+        "next_hop",
+        "local_pref",
+        "community",
+        "large_community",
+        "med",
+    )
+    fields = summary_fields + attribute_fields
+
+    __slots__ = fields + ("extras",)
+
+    def __init__(self, extras=None, **fields):
+        for field in self.fields:
+            setattr(self, field, fields.pop(field, None))
+        if fields:
+            raise TypeError("unknown route fields: %s" % ", ".join(fields))
+        self.extras = extras or None
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a route from a route dict, as returned by PyBird."""
+        route = cls.__new__(cls)
+        for field in cls.fields:
+            setattr(route, field, data.get(field))
+        extras = {key: value for key, value in data.items() if key not in cls.fields}
+        route.extras = extras or None
+        return route
+
+    def to_dict(self):
+        result = {}
+        for field in self.attribute_fields:
+            value = getattr(self, field)
+            if value is not None:
+                result[field] = value
+        if self.extras:
+            result.update(self.extras)
+        for field in self.summary_fields:
+            result[field] = getattr(self, field)
+        return result
+
+    def __getitem__(self, key):
+        if key in self.summary_fields:
+            return getattr(self, key)
+        if key in self.attribute_fields:
+            value = getattr(self, key)
+        else:
+            value = (self.extras or {}).get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return self.get(key) is not None or key in self.summary_fields
+
+    def __eq__(self, other):
+        if isinstance(other, Route):
+            other = other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Route({self.to_dict()!r})"
+
+
+class LazyRoute(Mapping):
+    """A route whose BGP attributes are parsed from its detail lines on first
+    access, for get_routes(record_type=LazyRoute).
+
+    The summary fields, like prefix and peer, are parsed right away, reading
+    only those doesn't parse the detail lines. Otherwise it reads like the
+    route dict PyBird returns by default.
+    """
+
+    __slots__ = ("_summary", "_attributes", "_detail_raw", "_parse")
+
+    def __init__(self, summary, detail_raw, parse):
+        self._summary = summary
+        self._attributes = None
+        self._detail_raw = detail_raw
+        self._parse = parse
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = {field: data.get(field) for field in Route.summary_fields}
+        route = cls(summary, None, None)
+        route._attributes = {
+            key: value for key, value in data.items() if key not in summary
+        }
+        return route
+
+    def _parsed(self):
+        if self._attributes is None:
+            self._attributes = self._parse(self._detail_raw)
+            self._detail_raw = self._parse = None
+        return self._attributes
+
+    def to_dict(self):
+        result = dict(self._parsed())
+        result.update(self._summary)
+        return result
+
+    def __getitem__(self, key):
+        if key in self._summary:
+            return self._summary[key]
+        return self._parsed()[key]
+
+    def __iter__(self):
+        return iter(self.to_dict())
+
+    def __len__(self):
+        return len(self._parsed()) + len(self._summary)
+
+    def __reduce__(self):
+        # the parser is not sent to other processes, parse before
+        return (LazyRoute.from_dict, (self.to_dict(),))
+
+    def __repr__(self):
+        return f"LazyRoute({self.to_dict()!r})"
+
+
+def origin_asn(as_path):
+    """Return the origin ASN, the last ASN of an AS path string or tuple, or
+    0 if the path is empty or ends with an AS_SET."""
+    if not as_path:
+        return 0
+    if isinstance(as_path, tuple):
+        last = as_path[-1]
+        return last if isinstance(last, int) else 0
+    last = as_path.rsplit(" ", 1)[-1]
+    if last.isdigit():
+        return int(last)
+    return 0
+
+
+def iter_prefixed(routes, prefix=None):
+    """Yield (prefix, route) for route dicts or Route objects.
+
+    BIRD shows the prefix only with the first route to it, a route without a
+    prefix is a further path to the prefix of the route before it, or for the
+    first route, to prefix. Raise ValueError if there is no such prefix.
+    """
+    for route in routes:
+        prefix = route.get("prefix") or prefix
+        if prefix is None:
+            raise ValueError("route without prefix")
+        yield (prefix, route)
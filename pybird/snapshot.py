@@ -0,0 +1,100 @@
+from collections import namedtuple
+
+from pybird.route import iter_prefixed
+
+# changes from one snapshot to the next:
+# - added, withdrawn: lists of routes
+# - changed: list of (route, {field: (old value, new value)})
+SnapshotDiff = namedtuple("SnapshotDiff", ("added", "withdrawn", "changed"))
+
+
+class RouteSnapshot:
+    """The routes of one poll, keyed by (prefix, peer, next_hop), to find
+    which routes changed between two polls:
+
+        previous = bird.get_route_snapshot(peer="PS1")
+        ...
+        current = bird.get_route_snapshot(peer="PS1")
+        added, withdrawn, changed = previous.diff(current)
+
+    Every route has a fingerprint, a hash of its compared fields, so only
+    routes with different fingerprints have their fields compared. The hash
+    is only stable within a process, don't compare snapshots across
+    processes.
+
+    Routes are added from route dicts or Route objects. Of routes with the
+    same key, the last one is kept.
+    """
+
+    compared_fields = (
+        "as_path",
+        "community",
+        "large_community",
+        "local_pref",
+        "med",
+        "origin",
+    )
+
+    def __init__(self, compared_fields=None):
+        if compared_fields is not None:
+            self.compared_fields = tuple(compared_fields)
+        self.routes = {}
+        self.fingerprints = {}
+        self._last_prefix = None
+
+    @classmethod
+    def from_routes(cls, routes, compared_fields=None):
+        snapshot = cls(compared_fields)
+        snapshot.extend(routes)
+        return snapshot
+
+    def extend(self, routes):
+        for prefix, route in iter_prefixed(routes, self._last_prefix):
+            self._last_prefix = prefix
+            key = (prefix, route.get("peer"), route.get("next_hop"))
+            self.routes[key] = route
+            self.fingerprints[key] = self.fingerprint(route)
+
+    def add(self, route):
+        self.extend((route,))
+
+    def fingerprint(self, route):
+        return hash(tuple(route.get(field) for field in self.compared_fields))
+
+    def __len__(self):
+        return len(self.routes)
+
+    def __contains__(self, key):
+        return key in self.routes
+
+    def __getitem__(self, key):
+        return self.routes[key]
+
+    def __iter__(self):
+        return iter(self.routes)
+
+    def diff(self, other):
+        """Return the SnapshotDiff from this snapshot to other, a later one.
+        Changed routes are those of other, with the fields that changed."""
+        fingerprints = self.fingerprints
+        other_fingerprints = other.fingerprints
+        added = [
+            route for key, route in other.routes.items() if key not in fingerprints
+        ]
+        withdrawn = [
+            route for key, route in self.routes.items() if key not in other_fingerprints
+        ]
+        changed = []
+        for key, fingerprint in other_fingerprints.items():
+            if fingerprints.get(key, fingerprint) == fingerprint:
+                continue
+            old = self.routes[key]
+            new = other.routes[key]
+            deltas = {}
+            for field in other.compared_fields:
+                (old_value, new_value) = (old.get(field), new.get(field))
+                if old_value != new_value:
+                    deltas[field] = (old_value, new_value)
+            if deltas:
+                changed.append((new, deltas))
+        return SnapshotDiff(added, withdrawn, changed)
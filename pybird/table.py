@@ -0,0 +1,275 @@
+import ipaddress
+from array import array
+from collections import Counter
+from functools import lru_cache
+from itertools import compress
+
+from pybird.attributes import _community_field, parse_communities
+from pybird.route import Route, iter_prefixed, origin_asn
+
+
+class Categorical:
+    """A column of values, stored as an array of integer codes into the list
+    of distinct values."""
+
+    def __init__(self):
+        self.codes = array("I")
+        self.values = []
+        self._index = {}
+
+    def append(self, value):
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+    def code_mask(self, match):
+        """Return a bytes object, with a 1 at the index of every code for
+        which match(value) is true."""
+        return bytes(1 if match(value) else 0 for value in self.values)
+
+    def take(self, rows):
+        """Return a new column, with the values of rows only."""
+        column = Categorical()
+        column.values = self.values
+        column._index = self._index
+        column.codes = array("I", map(self.codes.__getitem__, rows))
+        return column
+
+
+def _container(value):
+    """Filter arguments may be a single value, or a collection of values."""
+    if isinstance(value, (set, frozenset, list, tuple, range)):
+        return value
+    return (value,)
+
+
+def _community_values(value):
+    """Community filter arguments may be a single community, which can be a
+    tuple, or a collection of communities."""
+    if isinstance(value, tuple) and value and not isinstance(value[0], (str, tuple)):
+        return (value,)
+    return _container(value)
+
+
+def _community(value):
+    """Return a community like "8954:620" or "(65535, 1101, 5)" as a tuple,
+    like (8954, 620)."""
+    if isinstance(value, tuple):
+        return value
+    if value.startswith("("):
+        return parse_communities(value)[0]
+    return tuple(_community_field(field) for field in value.split(":"))
+
+
+@lru_cache(maxsize=65536)
+def _communities(value):
+    """Return the communities of a route as a tuple of tuples. PyBird
+    formats communities like "8954:220 8954:620", large communities are
+    kept as BIRD prints them, like "(65535, 1101, 5) (65535, 1101, 6)", and
+    with TypedAttributes, they already are tuples."""
+    if not value:
+        return ()
+    if isinstance(value, tuple):
+        return value
+    if value.startswith("("):
+        return parse_communities(value)
+    return tuple(_community(community) for community in value.split())
+
+
+class RouteTable:
+    """Routes stored by column, for analytics over full tables.
+
+    Prefixes are stored as their address family, network address and prefix
+    length in arrays, 128 bit IPv6 network addresses split into two 64 bit
+    arrays. The origin ASN, the last ASN of the AS path, has its own array.
+    The other fields are stored as Categorical columns. Filtering and
+    counting work on these arrays, without creating an object per route.
+
+    Routes are added from route dicts or Route objects, like those that
+    PyBird.iter_routes() yields.
+    """
+
+    categorical_fields = (
+        "peer",
+        "interface",
+        "source",
+        "time",
+        "origin",
+        "as_path",
+        "next_hop",
+        "local_pref",
+        "community",
+        "large_community",
+        "med",
+    )
+
+    def __init__(self):
+        self.family = array("B")
+        self.prefixlen = array("B")
+        self.network_hi = array("Q")
+        self.network_lo = array("Q")
+        self.origin_asn = array("L")
+        self.columns = {field: Categorical() for field in self.categorical_fields}
+        self._last_prefix = None
+
+    @classmethod
+    def from_routes(cls, routes):
+        table = cls()
+        table.extend(routes)
+        return table
+
+    def extend(self, routes):
+        for prefix, route in iter_prefixed(routes, self._last_prefix):
+            if prefix != self._last_prefix:
+                network = ipaddress.ip_network(prefix, strict=False)
+                address = int(network.network_address)
+                self._last_prefix = prefix
+                self._last_network = (
+                    network.version,
+                    network.prefixlen,
+                    address >> 64,
+                    address & 0xFFFFFFFFFFFFFFFF,
+                )
+            (family, prefixlen, network_hi, network_lo) = self._last_network
+            self.family.append(family)
+            self.prefixlen.append(prefixlen)
+            self.network_hi.append(network_hi)
+            self.network_lo.append(network_lo)
+            self.origin_asn.append(origin_asn(route.get("as_path")))
+            for field, column in self.columns.items():
+                column.append(route.get(field))
+
+    def append(self, route):
+        self.extend((route,))
+
+    def __len__(self):
+        return len(self.family)
+
+    def prefix(self, row):
+        address = (self.network_hi[row] << 64) | self.network_lo[row]
+        if self.family[row] == 4:
+            network = ipaddress.IPv4Network((address, self.prefixlen[row]))
+        else:
+            network = ipaddress.IPv6Network((address, self.prefixlen[row]))
+        return str(network)
+
+    def __getitem__(self, row):
+        """Return a route dict for row."""
+        route = {"prefix": self.prefix(row)}
+        for field, column in self.columns.items():
+            value = column[row]
+            if value is not None or field in Route.summary_fields:
+                route[field] = value
+        return route
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def select(
+        self,
+        peer=None,
+        origin_asn=None,
+        prefixlen=None,
+        community=None,
+        large_community=None,
+        family=None,
+    ):
+        """Return the rows matching all given filters, as an array of row
+        numbers. Every filter can be a single value, or a collection of
+        values of which one must match.
+
+        - peer, origin_asn, prefixlen, family (4 or 6) match the field value
+        - community, large_community match routes that have the community,
+          like "8954:620" or "65535:1101:5", as BIRD prints it, like
+          "(65535, 1101, 5)", or as a tuple, like (8954, 620)
+        """
+        rows = range(len(self))
+        if peer is not None:
+            peers = _container(peer)
+            rows = self._select_codes(rows, "peer", lambda value: value in peers)
+        for field, communities in (
+            ("community", community),
+            ("large_community", large_community),
+        ):
+            if communities is not None:
+                communities = {
+                    _community(value) for value in _community_values(communities)
+                }
+                rows = self._select_codes(rows, field, self._has_any(communities))
+        if prefixlen is not None:
+            rows = self._select_array(rows, self.prefixlen, _container(prefixlen))
+        if family is not None:
+            rows = self._select_array(rows, self.family, _container(family))
+        if origin_asn is not None:
+            asns = set(_container(origin_asn))
+            matches = map(asns.__contains__, self._values(self.origin_asn, rows))
+            rows = array("L", compress(rows, matches))
+        return array("L", rows)
+
+    def _has_any(self, communities):
+        def match(value):
+            return not communities.isdisjoint(_communities(value))
+
+        return match
+
+    def _values(self, values, rows):
+        """Return the values in rows, which may be the range of all rows"""
+        if isinstance(rows, range):
+            return values
+        return map(values.__getitem__, rows)
+
+    def _select_codes(self, rows, field, match):
+        column = self.columns[field]
+        mask = column.code_mask(match)
+        matches = map(mask.__getitem__, self._values(column.codes, rows))
+        return array("L", compress(rows, matches))
+
+    def _select_array(self, rows, values, allowed):
+        # values of these arrays are small, look them up in a table
+        mask = bytes(1 if value in allowed else 0 for value in range(256))
+        matches = map(mask.__getitem__, self._values(values, rows))
+        return array("L", compress(rows, matches))
+
+    def count(self, **filters):
+        """Return the number of routes matching the filters of select()."""
+        return len(self.select(**filters))
+
+    def filter(self, **filters):
+        """Return a new RouteTable with the routes matching the filters of
+        select()."""
+        return self.take(self.select(**filters))
+
+    def take(self, rows):
+        """Return a new RouteTable with the routes in rows only."""
+        table = RouteTable()
+        for name in ("family", "prefixlen", "network_hi", "network_lo", "origin_asn"):
+            values = getattr(self, name)
+            values = array(values.typecode, map(values.__getitem__, rows))
+            setattr(table, name, values)
+        table.columns = {
+            field: column.take(rows) for field, column in self.columns.items()
+        }
+        return table
+
+    def counts(self, field, rows=None):
+        """Return a Counter of the values of field, over all routes, or the
+        routes in rows."""
+        if field in self.columns:
+            column = self.columns[field]
+            codes = column.codes
+            if rows is not None:
+                codes = map(codes.__getitem__, rows)
+            return Counter(
+                {column.values[code]: count for code, count in Counter(codes).items()}
+            )
+        values = getattr(self, field)
+        return Counter(values if rows is None else map(values.__getitem__, rows))
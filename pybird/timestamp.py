@@ -0,0 +1,92 @@
+"""Parsing of BIRD timestamps
+
+BIRD shows times in several formats, depending on its version, its timeformat
+settings and how long ago they were:
+
+    2019-12-10 10:12:19, 2019-12-10, 10:12, 10:12:19.123, Dec10, 2019
+
+Times without a date are within the last day, dates without a year within
+the last year, relative to now. The format is chosen by the length and
+characters of the value, and as BIRD repeats the same few timestamps for many
+routes and peers, results are kept in a memo by value and current minute.
+"""
+
+import re
+import time
+from datetime import datetime, timedelta
+
+_MONTHS = {
+    name: number
+    for number, name in enumerate(
+        "jan feb mar apr may jun jul aug sep oct nov dec".split(), 1
+    )
+}
+_re_time = re.compile(r"(\d{1,2}):(\d{1,2})(?::\d{1,2})?(?:\.\d*)?$")
+
+# maximum number of memoized results, the memo is cleared when it is full
+memo_size = 4096
+# (value, minute of now): datetime
+_memo = {}
+
+
+def parse_timestamp(value, now=None):
+    """Turn a BIRD timestamp into a datetime. Times without a date and dates
+    without a year are relative to now, the current time by default."""
+    if now is None:
+        key = (value, int(time.time() // 60))
+    else:
+        key = (value, now.replace(second=0, microsecond=0))
+    result = _memo.get(key)
+    if result is None:
+        result = _parse(value, now or datetime.now())
+        if result is None:
+            raise ValueError("Can not parse datetime: [%s]" % value)
+        if len(_memo) >= memo_size:
+            _memo.clear()
+        _memo[key] = result
+    return result
+
+
+def _parse(value, now):
+    """Return the datetime of value, None if it is not a BIRD timestamp."""
+    try:
+        # Case: YYYY-MM-DD HH:MM:SS, or YYYY-MM-DD
+        if value[4:5] == "-":
+            date = (int(value[:4]), int(value[5:7]), int(value[8:10]))
+            if value[13:14] == ":" and len(value) >= 19:
+                return datetime(
+                    *date, int(value[11:13]), int(value[14:16]), int(value[17:19])
+                )
+            return datetime(*date)
+
+        # Case: HH:mm:ss.nnn or HH:mm or HH:mm:ss timestamp
+        if value[1:2] == ":" or value[2:3] == ":":
+            match = _re_time.match(value)
+            if not match:
+                return None
+            (hour, minute) = (int(match.group(1)), int(match.group(2)))
+            result = datetime(now.year, now.month, now.day, hour, minute)
+            if now.hour < hour or (now.hour == hour and now.minute < minute):
+                result = result - timedelta(days=1)
+            return result
+
+        # Case: "Jun13" timestamp
+        month = _MONTHS.get(value[:3].lower())
+        if month:
+            day = value[3:]
+            if not (day.isdigit() and len(day) <= 2):
+                return None
+            day = int(day)
+            # if now is past the month, it's this year, else last year, bird
+            # shows time for same day
+            if now.month > month or (now.month == month and now.day > day):
+                return datetime(now.year, month, day)
+            return datetime(now.year - 1, month, day)
+
+        # Case: plain year
+        if value.isdigit():
+            return datetime(int(value), 1, 1)
+    except ValueError:
+        # out of range, or not a number
+        pass
+    return None
@@ -0,0 +1,121 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from test_socket import MockBirdTestBase, silent_bird  # noqa: F401
+from test_ssh import make_script
+
+from pybird import PyBird
+from pybird.aio import AsyncPyBird, gather_limited
+
+
+class AsyncPyBirdTestCase(MockBirdTestBase):
+    """Test the asyncio PyBird against the MockBird"""
+
+    def setUp(self):
+        super().setUp()
+        self.pybird = AsyncPyBird(socket_file=self.socket_file)
+        self.sync_pybird = PyBird(socket_file=self.socket_file)
+
+    def test_specific_peer_status(self):
+        ps2_status = asyncio.run(self.pybird.get_peer_status("PS2"))
+        assert ps2_status["up"]
+        assert ps2_status["last_change"] == datetime(2010, 6, 29)
+        assert ps2_status["routes_imported"] == 24
+
+    def test_nonexistant_peer_status(self):
+        assert [] == asyncio.run(self.pybird.get_peer_status("HAMSTER"))
+
+    def test_matches_sync(self):
+        """Test that async results are the same as those of PyBird."""
+        for name in (
+            "get_peer_prefixes_announced",
+            "get_peer_prefixes_accepted",
+            "get_peer_prefixes_rejected",
+            "get_peer_prefixes_rejected_summary",
+        ):
+            result = asyncio.run(getattr(self.pybird, name)("PS1"))
+            assert result == getattr(self.sync_pybird, name)("PS1")
+        routes = asyncio.run(self.pybird.get_routes_received("PS1", ["as_path"]))
+        assert routes == self.sync_pybird.get_routes_received("PS1", ["as_path"])
+
+    def test_peer_summaries(self):
+        summaries = asyncio.run(self.pybird.get_peer_summaries())
+        assert summaries == self.sync_pybird.get_peer_summaries()
+
+    def test_concurrent_peer_status(self):
+        async def query():
+            return await gather_limited(
+                (self.pybird.get_peer_status(name) for name in ("PS1", "PS2")),
+                limit=2,
+            )
+
+        ps1_status, ps2_status = asyncio.run(query())
+        assert ps1_status["name"] == "PS1"
+        assert ps2_status["name"] == "PS2"
+
+    def test_columnar_routes(self):
+        table = asyncio.run(self.pybird.get_routes(peer="PS1", columnar=True))
+        assert list(table) == self.sync_pybird.get_routes(peer="PS1")
+
+    def test_no_streaming(self):
+        with pytest.raises(TypeError, match="get_routes"):
+            self.pybird.iter_routes(peer="PS1")
+        with pytest.raises(TypeError, match="get_peer_prefixes_rejected"):
+            self.pybird.iter_peer_prefixes_rejected("PS1")
+
+    def test_handles_no_output(self):
+        with pytest.raises(ValueError):
+            asyncio.run(self.pybird.get_peer_status("no output"))
+
+
+def test_gather_limited():
+    running = []
+    peak = []
+
+    async def work(i):
+        running.append(i)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(i)
+        return i
+
+    results = asyncio.run(gather_limited((work(i) for i in range(10)), limit=3))
+    assert results == list(range(10))
+    assert max(peak) == 3
+
+
+def test_keepalive_unsupported():
+    with pytest.raises(ValueError):
+        AsyncPyBird(None, keepalive=True)
+
+
+def test_timeout(silent_bird):  # noqa: F811
+    bird = AsyncPyBird(silent_bird, timeout=0.2)
+    with pytest.raises(TimeoutError):
+        asyncio.run(bird.get_bird_status())
+
+
+def test_deadline(silent_bird):  # noqa: F811
+    bird = AsyncPyBird(silent_bird)
+
+    async def query():
+        with bird.deadline(0.2):
+            return await bird.get_bird_status()
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(query())
+    # the deadline of a block doesn't apply to other tasks
+    assert bird._query_deadline() is None
+
+
+def test_remote_timeout(tmpdir):
+    bird = AsyncPyBird(
+        "/run/bird.ctl", hostname="router", timeout=0.2, max_reply_size=100
+    )
+    bird.ssh_cmd = make_script(tmpdir.join("slow_ssh"), "exec sleep 10\n")
+    with pytest.raises(TimeoutError):
+        asyncio.run(bird.get_bird_status())
+    bird.ssh_cmd = make_script(tmpdir.join("ssh"), "exec seq 1000\n")
+    with pytest.raises(ValueError, match="max_reply_size"):
+        asyncio.run(bird.get_bird_status())
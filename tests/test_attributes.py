@@ -0,0 +1,59 @@
+import pickle
+
+from pybird import PyBird, TypedAttributes
+from pybird.attributes import parse_as_path, parse_communities
+
+
+def test_parse_as_path():
+    assert parse_as_path("8954 8283") == (8954, 8283)
+    assert parse_as_path("") == ()
+    assert parse_as_path("65001 {65002 65003}") == (65001, frozenset((65002, 65003)))
+    assert parse_as_path("65001 { 65002 }") == (65001, frozenset((65002,)))
+
+
+def test_parse_communities():
+    assert parse_communities("(8954,220) (8954,620)") == ((8954, 220), (8954, 620))
+    assert parse_communities("(65535, 1101, 5)") == ((65535, 1101, 5),)
+    assert parse_communities("(rt, 64512, 1) (generic, 0x43000000, 0x1)") == (
+        ("rt", 64512, 1),
+        ("generic", 0x43000000, 1),
+    )
+
+
+def test_parse_route_data_typed(data_parse_route_data):
+    data = data_parse_route_data
+    bird = PyBird(None, typed_attributes=TypedAttributes())
+    routes = bird._parse_route_data(data.input)
+    assert len(routes) == len(data.expected)
+    for route, expected in zip(routes, data.expected):
+        if "as_path" in expected:
+            assert route["as_path"] == parse_as_path(expected["as_path"])
+        if "local_pref" in expected:
+            assert route["local_pref"] == int(expected["local_pref"])
+        if "community" in expected:
+            assert route["community"] == tuple(
+                tuple(map(int, community.split(":")))
+                for community in expected["community"].split()
+            )
+
+
+def test_interned():
+    typed = TypedAttributes()
+    as_path = typed.parse("as_path", "8954 8283")
+    assert typed.parse("as_path", "8954 8283") is as_path
+    assert typed.parse("origin", "IGP") == "IGP"
+    assert len(typed) == 1
+
+
+def test_intern_maxsize():
+    typed = TypedAttributes(maxsize=2)
+    for asn in range(3):
+        typed.parse("as_path", str(asn))
+    assert len(typed) == 1
+
+
+def test_pickle():
+    typed = TypedAttributes(maxsize=10)
+    typed.parse("med", "0")
+    typed = pickle.loads(pickle.dumps(typed))
+    assert (typed.maxsize, len(typed)) == (10, 0)
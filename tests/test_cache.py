@@ -0,0 +1,227 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+from test_socket import MockBirdTestBase
+
+from pybird import PyBird
+from pybird.aio import AsyncPyBird
+from pybird.cache import QueryCache
+
+
+def test_ttl():
+    cache = QueryCache(ttl=5, ttls={"show route": 60, "show status": 0})
+    assert cache.ttl("show protocols all") == 5
+    assert cache.ttl("show route all protocol PS1") == 60
+    assert cache.ttl("show status") == 0
+    assert cache.ttl("show routes") == 5
+    assert cache.ttl("configure") == 0
+
+
+def test_hits_and_expiry():
+    cache = QueryCache(ttl=0.05)
+    assert cache.get("show status", lambda: "first") == "first"
+    assert cache.get("show status", lambda: "second") == "first"
+    assert (cache.hits, cache.misses) == (1, 1)
+    time.sleep(0.06)
+    assert cache.get("show status", lambda: "third") == "third"
+    assert cache.get("configure", lambda: "done") == "done"
+    assert cache.stats() == {"hits": 1, "misses": 2, "coalesced": 0, "size": 1}
+
+
+def test_lru():
+    cache = QueryCache(maxsize=2)
+    cache.get("show a", lambda: "a")
+    cache.get("show b", lambda: "b")
+    cache.get("show a", lambda: "a")
+    cache.get("show c", lambda: "c")
+    assert len(cache) == 2
+    assert cache.get("show b", lambda: "new b") == "new b"
+    assert cache.get("show a", lambda: "new a") == "new a"
+
+
+def test_invalidate():
+    cache = QueryCache()
+    cache.get("show route", lambda: "routes")
+    cache.get("show status", lambda: "status")
+    cache.invalidate("show route")
+    assert cache.get("show route", lambda: "new") == "new"
+    assert cache.get("show status", lambda: "new") == "status"
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+def test_targets():
+    cache = QueryCache()
+    assert cache.get("show status", lambda: "r1", target="r1") == "r1"
+    assert cache.get("show status", lambda: "r2", target="r2") == "r2"
+    assert cache.get("show status", lambda: "new", target="r1") == "r1"
+    cache.invalidate(target="r1")
+    assert cache.get("show status", lambda: "new", target="r1") == "new"
+    assert cache.get("show status", lambda: "new", target="r2") == "r2"
+    cache.invalidate("show status")
+    assert len(cache) == 0
+
+
+def test_invalidate_running_query():
+    cache = QueryCache()
+
+    def fetch():
+        cache.invalidate()
+        return "stale"
+
+    assert cache.get("show status", fetch) == "stale"
+    assert len(cache) == 0
+
+
+def test_single_flight():
+    cache = QueryCache()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait()
+        return "reply"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get("show x", fetch)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    while cache.coalesced < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["reply"] * 5
+    assert len(calls) == 1
+    assert (cache.misses, cache.coalesced) == (1, 4)
+
+
+def test_single_flight_error():
+    cache = QueryCache()
+
+    def fetch():
+        raise ValueError("no reply")
+
+    with pytest.raises(ValueError):
+        cache.get("show status", fetch)
+    assert cache.get("show status", lambda: "reply") == "reply"
+
+
+def test_single_flight_async():
+    cache = QueryCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "reply"
+
+    async def query():
+        return await asyncio.gather(
+            *(cache.get_async("show status", fetch) for _ in range(5))
+        )
+
+    assert asyncio.run(query()) == ["reply"] * 5
+    assert len(calls) == 1
+    assert asyncio.run(cache.get_async("show status", fetch)) == "reply"
+    assert cache.stats() == {"hits": 1, "misses": 1, "coalesced": 4, "size": 1}
+
+
+class CachedPyBirdTestCase(MockBirdTestBase):
+    def test_cached_queries(self):
+        pybird = PyBird(socket_file=self.socket_file, cache=QueryCache())
+        status = pybird.get_peer_status("PS1")
+        assert pybird.get_peer_status("PS1") == status
+        assert self.mock_bird.connections == 1
+        assert pybird.cache.hits == 1
+
+    def test_cached_routes(self):
+        pybird = PyBird(socket_file=self.socket_file, cache=QueryCache())
+        routes = pybird.get_routes(peer="PS1")
+        assert routes
+        assert list(pybird.iter_routes(peer="PS1")) == routes
+        assert self.mock_bird.connections == 1
+        assert pybird.cache.hits == 1
+
+    def test_shared_cache(self):
+        """Test that a cache shared by PyBirds of different BIRDs keeps their
+        replies apart."""
+        cache = QueryCache()
+        pybird = PyBird(socket_file=self.socket_file, cache=cache)
+        other = PyBird(socket_file=self.socket_file + ".missing", cache=cache)
+        assert pybird.get_bird_status()
+        with pytest.raises(OSError):
+            other.get_bird_status()
+        other._send_uncached_query = lambda query: "0003 Reconfigured\n"
+        other.configure()
+        assert len(cache) == 1
+
+    def test_coalesced_deadline(self):
+        """Test that a query waiting for another thread's query to the same
+        BIRD keeps its deadline, and can be cancelled."""
+        pybird = PyBird(socket_file=self.socket_file, cache=QueryCache())
+        release = threading.Event()
+
+        def send_query(query):
+            release.wait()
+            return "0001 BIRD 1.3.0 ready.\n0000\n"
+
+        pybird._send_uncached_query = send_query
+        leader = threading.Thread(
+            target=pybird._send_query, args=("show status",), daemon=True
+        )
+        leader.start()
+        while not pybird.cache._inflight:
+            time.sleep(0.01)
+        errors = []
+
+        def follower():
+            try:
+                pybird._send_query("show status")
+            except CancelledError as exc:
+                errors.append(exc)
+
+        try:
+            started = time.monotonic()
+            with pytest.raises(TimeoutError):
+                with pybird.deadline(0.1):
+                    pybird._send_query("show status")
+            assert time.monotonic() - started < 1
+
+            thread = threading.Thread(target=follower, daemon=True)
+            thread.start()
+            while not pybird._running:
+                time.sleep(0.01)
+            pybird.cancel()
+            thread.join(1)
+            assert errors
+        finally:
+            release.set()
+        leader.join()
+
+    def test_configure_invalidates(self):
+        pybird = PyBird(socket_file=self.socket_file, cache=QueryCache())
+        pybird.get_bird_status()
+        assert len(pybird.cache) == 1
+        pybird._send_uncached_query = lambda query: "0003 Reconfigured\n"
+        pybird.configure()
+        assert len(pybird.cache) == 0
+
+    def test_async_cached_queries(self):
+        pybird = AsyncPyBird(socket_file=self.socket_file, cache=QueryCache())
+
+        async def query():
+            return await asyncio.gather(
+                pybird.get_peer_status("PS1"), pybird.get_peer_status("PS1")
+            )
+
+        first, second = asyncio.run(query())
+        assert first == second
+        assert self.mock_bird.connections == 1
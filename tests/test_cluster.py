@@ -0,0 +1,89 @@
+import socket
+import time
+from tempfile import mkdtemp
+
+import pytest
+from test_socket import MockBird, MockBirdTestBase
+
+from pybird.cache import QueryCache
+from pybird.cluster import PyBirdCluster
+
+
+class PyBirdClusterTestCase(MockBirdTestBase):
+    """Test a cluster of two routers on MockBirds, and one without BIRD"""
+
+    multi_query = True
+
+    def setUp(self):
+        super().setUp()
+        self.other_socket_file = "%s/birdmock" % mkdtemp()
+        self.other_mock_bird = MockBird(self.other_socket_file, multi_query=True)
+        self.other_mock_bird.start()
+        self.cluster = PyBirdCluster(
+            {
+                "edge1": self.socket_file,
+                "edge2": {"socket_file": self.other_socket_file},
+                "down": "%s/nobird" % mkdtemp(),
+            },
+            timeout=5,
+        )
+
+    def tearDown(self):
+        self.cluster.close()
+        super().tearDown()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.other_socket_file)
+        sock.send(b"terminate mockserver\n")
+        sock.close()
+
+    def test_call(self):
+        results = self.cluster.get_bird_status()
+        assert set(results) == {"edge1", "edge2", "down"}
+        for name in ("edge1", "edge2"):
+            assert results[name].error is None
+            assert "router_id" in results[name].result
+        assert results["down"].result is None
+        assert isinstance(results["down"].error, OSError)
+
+    def test_keepalive(self):
+        self.cluster.get_bird_status()
+        self.cluster.call("get_peer_status", args=("PS1",), hosts=["edge1"])
+        assert self.mock_bird.connections == 1
+
+    def test_shared_cache(self):
+        """Test that a cache passed to all routers keeps their replies apart."""
+        cluster = PyBirdCluster(
+            [self.socket_file, "%s/nobird" % mkdtemp()], cache=QueryCache()
+        )
+        with cluster:
+            for _ in range(2):
+                results = list(cluster.get_bird_status().values())
+                assert results[0].result
+                assert isinstance(results[1].error, OSError)
+
+    def test_hosts(self):
+        results = self.cluster.get_prefix_info("8.8.8.8", "peer")
+        assert results["edge2"].result == results["edge1"].result
+        results = self.cluster.call("get_bird_status", hosts=["edge2"])
+        assert list(results) == ["edge2"]
+
+    def test_timeout(self):
+        def slow(bird, seconds):
+            time.sleep(seconds)
+            return seconds
+
+        start = time.monotonic()
+        results = self.cluster.call(slow, args=(0.5,), timeout=0.2)
+        assert time.monotonic() - start < 0.5
+        assert all(isinstance(r.error, TimeoutError) for r in results.values())
+        results = self.cluster.call(slow, args=(0.1,), hosts=["edge1", "edge2"])
+        assert [r.result for r in results.values()] == [0.1, 0.1]
+
+    def test_concurrent(self):
+        start = time.monotonic()
+        self.cluster.call(lambda bird: time.sleep(0.3))
+        assert time.monotonic() - start < 0.6
+
+    def test_unknown_method(self):
+        with pytest.raises(AttributeError):
+            self.cluster.no_such_method
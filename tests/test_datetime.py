@@ -2,6 +2,8 @@ import datetime
 
 import pytest
 
+from pybird import timestamp
+
 
 def test_datetime(bird):
     expected = datetime.datetime(2019, 12, 10, 10, 12, 19)
@@ -53,3 +55,37 @@ def test_year(bird):
 def test_fail(bird):
     with pytest.raises(ValueError):
         bird._calculate_datetime("invalid")
+
+
+def test_time_seconds(bird):
+    now = datetime.datetime(2019, 12, 10, 10, 12, 19)
+    expected = datetime.datetime(2019, 12, 10, 4, 20)
+    assert expected == bird._calculate_datetime("04:20:33.123", now=now)
+
+
+def test_datetime_no_seconds(bird):
+    expected = datetime.datetime(2019, 12, 10)
+    assert expected == bird._calculate_datetime("2019-12-10 10:12")
+
+
+def test_memo_minute(bird):
+    value = "10:12"
+    before = datetime.datetime(2019, 12, 10, 10, 11, 59)
+    after = datetime.datetime(2019, 12, 10, 10, 12, 0)
+    assert bird._calculate_datetime(value, now=before).day == 9
+    assert bird._calculate_datetime(value, now=after).day == 10
+    assert bird._calculate_datetime(value, now=before).day == 9
+
+
+def test_memo_size(bird, monkeypatch):
+    monkeypatch.setattr(timestamp, "memo_size", 2)
+    monkeypatch.setattr(timestamp, "_memo", {})
+    for year in range(2000, 2005):
+        bird._calculate_datetime(str(year))
+    assert len(timestamp._memo) <= 2
+
+
+@pytest.mark.parametrize("value", ["", "24:00", "10:12x", "Jun", "Jun123", "Foo12"])
+def test_fail_formats(bird, value):
+    with pytest.raises(ValueError):
+        bird._calculate_datetime(value)
@@ -0,0 +1,125 @@
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+from tempfile import mkdtemp
+
+from test_socket import MockBirdTestBase
+
+from pybird import PyBird
+from pybird.exporter import CONTENT_TYPE, BirdExporter, _escape, make_server
+
+
+class BirdExporterTestCase(MockBirdTestBase):
+    """Test the exporter against the MockBird"""
+
+    def setUp(self):
+        super().setUp()
+        self.exporter = BirdExporter(
+            PyBird(socket_file=self.socket_file), labels={"router": "edge1"}
+        )
+
+    def test_metrics(self):
+        self.exporter.refresh()
+        metrics = self.exporter.scrape().decode("utf-8")
+        lines = metrics.splitlines()
+        assert 'bird_up{router="edge1"} 1' in lines
+        assert 'bird_info{router="edge1",version="1.3.3",' in metrics
+        assert "# TYPE bird_peer_up gauge" in lines
+        assert 'bird_peer_up{router="edge1",peer="PS1"} 0' in lines
+        assert 'bird_peer_up{router="edge1",peer="PS2"} 1' in lines
+        assert (
+            'bird_peer_state_info{router="edge1",peer="PS2",state="Established"} 1'
+            in lines
+        )
+        assert (
+            'bird_peer_route_changes_total{router="edge1",peer="PS1",'
+            'direction="import",kind="updates",result="received"} 0'
+        ) in lines
+        assert any(line.startswith("bird_uptime_seconds{") for line in lines)
+        assert any(
+            line.startswith('bird_peer_last_change_age_seconds{router="edge1"')
+            for line in lines
+        )
+        assert metrics.endswith("# EOF\n")
+
+    def test_http(self):
+        server = make_server(self.exporter, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = "http://127.0.0.1:%d" % server.server_address[1]
+        try:
+            # no data yet
+            self.exporter.scrape_budget = 0
+            try:
+                urllib.request.urlopen(url + "/metrics")
+                raise AssertionError("expected 503")
+            except urllib.error.HTTPError as exc:
+                assert exc.code == 503
+            self.exporter.refresh()
+            with urllib.request.urlopen(url + "/metrics") as response:
+                assert response.headers["Content-Type"] == CONTENT_TYPE
+                assert response.read() == self.exporter.scrape()
+            try:
+                urllib.request.urlopen(url + "/other")
+                raise AssertionError("expected 404")
+            except urllib.error.HTTPError as exc:
+                assert exc.code == 404
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_background_refresh(self):
+        # the first refresh runs right away
+        self.exporter.interval = 60
+        self.exporter.start()
+        try:
+            first = self.exporter.scrape()
+            assert first is not None
+            # scrapes share the last refresh, without querying BIRD
+            assert self.exporter.scrape() is self.exporter.scrape()
+        finally:
+            self.exporter.stop()
+        assert self.exporter._thread is None
+
+
+def test_bird_down():
+    exporter = BirdExporter(PyBird("%s/nobird" % mkdtemp()), timeout=1)
+    assert exporter.scrape(budget=0) is None
+    exporter.refresh()
+    lines = exporter.scrape().decode("utf-8").splitlines()
+    assert "bird_up 0" in lines
+    assert "bird_exporter_refresh_errors_total 1" in lines
+    assert not any(line.startswith("bird_peer") for line in lines)
+
+
+def test_many_peers():
+    exporter = BirdExporter(PyBird(None))
+    changed = datetime.now() - timedelta(hours=1)
+    peers = {
+        f"PS{number}": {
+            "name": f"PS{number}",
+            "protocol": "BGP",
+            "state": "Established",
+            "up": True,
+            "last_change": changed,
+            "routes_imported": number,
+            "routes_exported": 10,
+            "import_updates_received": number * 2,
+            "import_updates_filtered": 1,
+        }
+        for number in range(500)
+    }
+    status = {"version": "2.0.8", "last_reboot": changed}
+    lines = exporter.render(status, peers, 0.1).decode("utf-8").splitlines()
+    assert len([line for line in lines if line.startswith("bird_peer_up")]) == 500
+    assert 'bird_peer_routes{peer="PS499",direction="imported"} 499' in lines
+    assert (
+        'bird_peer_route_changes_total{peer="PS7",direction="import",'
+        'kind="updates",result="received"} 14'
+    ) in lines
+    age = [line for line in lines if line.startswith("bird_peer_last_change_age")][0]
+    assert 3599 < float(age.split()[-1]) < 3700
+
+
+def test_escape():
+    assert _escape('a"b\\c\nd') == 'a\\"b\\\\c\\nd'
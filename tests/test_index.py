@@ -0,0 +1,83 @@
+import pytest
+
+from pybird import PrefixIndex
+
+
+def route(prefix, peer="192.0.2.1"):
+    return {"prefix": prefix, "peer": peer}
+
+
+def make_index():
+    return PrefixIndex.from_routes(
+        [
+            route("10.0.0.0/8"),
+            # another path for the same prefix
+            route(None, peer="192.0.2.2"),
+            route("10.1.0.0/16"),
+            route("10.1.2.0/24"),
+            route("10.2.0.0/16"),
+            route("11.0.0.0/8"),
+            route("0.0.0.0/0"),
+            route("2001:db8::/32"),
+            route("2001:db8:1::/48"),
+        ]
+    )
+
+
+def prefixes(routes):
+    return [route["prefix"] for route in routes]
+
+
+def test_lookup():
+    index = make_index()
+    assert len(index) == 8
+    assert prefixes(index.lookup("10.1.2.3")) == ["10.1.2.0/24"]
+    assert prefixes(index.lookup("10.1.3.1")) == ["10.1.0.0/16"]
+    assert index.lookup("10.3.0.1") == [route("10.0.0.0/8"), route(None, "192.0.2.2")]
+    assert prefixes(index.lookup("10.1.0.0/20")) == ["10.1.0.0/16"]
+    assert prefixes(index.lookup("192.0.2.1")) == ["0.0.0.0/0"]
+    assert prefixes(index.lookup("2001:db8:1::1")) == ["2001:db8:1::/48"]
+    assert index.lookup("2001:db9::1") == []
+
+
+def test_covering():
+    index = make_index()
+    assert prefixes(index.covering("10.1.2.3")) == [
+        "10.1.2.0/24",
+        "10.1.0.0/16",
+        "10.0.0.0/8",
+        None,
+        "0.0.0.0/0",
+    ]
+
+
+def test_covered():
+    index = make_index()
+    assert prefixes(index.covered("10.0.0.0/8")) == [
+        "10.0.0.0/8",
+        None,
+        "10.1.0.0/16",
+        "10.1.2.0/24",
+        "10.2.0.0/16",
+    ]
+    assert prefixes(index.covered("10.1.0.0/15")) == ["10.1.0.0/16", "10.1.2.0/24"]
+    assert prefixes(index.covered("2001:db8::/32")) == [
+        "2001:db8::/32",
+        "2001:db8:1::/48",
+    ]
+
+
+def test_refresh():
+    index = make_index()
+    index.refresh([route("10.0.0.0/8", peer="192.0.2.9")])
+    assert len(index) == 1
+    assert index.lookup("10.1.2.3") == [route("10.0.0.0/8", peer="192.0.2.9")]
+
+
+def test_invalid_prefix():
+    with pytest.raises(ValueError):
+        make_index().lookup("10.0.0.300")
+    with pytest.raises(ValueError):
+        make_index().lookup("10.0.0.0/33")
+    with pytest.raises(ValueError):
+        PrefixIndex([route(None)])
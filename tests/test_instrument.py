@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import os
+
+import pytest
+from test_socket import MockBirdTestBase
+from test_ssh import fake_remote
+
+from pybird import PyBird
+from pybird.aio import AsyncPyBird
+from pybird.instrument import (
+    Histogram,
+    HistogramInstrumentation,
+    Instrumentation,
+    LoggingInstrumentation,
+    ParseStats,
+    QueryStats,
+    command_label,
+)
+
+this_dir = os.path.dirname(__file__)
+data_dir = os.path.join(this_dir, "data")
+
+
+class Recorder(Instrumentation):
+    def __init__(self):
+        self.queries = []
+        self.parsed = []
+
+    def query(self, stats):
+        self.queries.append(stats)
+
+    def parse(self, stats):
+        self.parsed.append(stats)
+
+
+def assert_complete(stats):
+    assert stats.error is None
+    assert stats.bytes > 0
+    assert stats.lines > 0
+    assert stats.first_byte >= 0
+    assert stats.transfer >= 0
+    assert stats.seconds >= stats.first_byte
+
+
+class InstrumentTestCase(MockBirdTestBase):
+    """Test that queries to the MockBird are instrumented"""
+
+    keepalive = False
+
+    def setUp(self):
+        super().setUp()
+        self.recorder = Recorder()
+        self.pybird = PyBird(
+            socket_file=self.socket_file,
+            keepalive=self.keepalive,
+            instrument=self.recorder,
+        )
+
+    def tearDown(self):
+        self.pybird.close()
+        super().tearDown()
+
+    def test_query(self):
+        reply = self.pybird._send_query("show status")
+        [stats] = self.recorder.queries
+        assert stats.command == "show status"
+        assert stats.bytes == len(reply.encode("utf-8"))
+        assert stats.lines == reply.count("\n")
+        assert_complete(stats)
+        assert stats.connect >= 0
+
+    def test_parse(self):
+        self.pybird.get_bird_status()
+        self.pybird.get_peer_status()
+        assert [stats.parser for stats in self.recorder.parsed] == [
+            "status",
+            "peers",
+        ]
+        assert self.recorder.parsed[0].records == 1
+        assert self.recorder.parsed[1].records > 1
+        assert len(self.recorder.queries) == 2
+
+    def test_iter_routes(self):
+        routes = list(self.pybird.iter_routes(peer="PS1"))
+        [stats] = self.recorder.queries
+        assert_complete(stats)
+        [parsed] = self.recorder.parsed
+        assert parsed.parser == "routes"
+        assert parsed.records == len(routes)
+        assert parsed.seconds >= 0
+
+    def test_error(self):
+        with pytest.raises(ValueError):
+            self.pybird.get_peer_status("no output")
+        # the reply is cut short
+        assert isinstance(self.recorder.queries[0].error, ValueError)
+        self.pybird.socket_file += ".missing"
+        self.pybird.close()
+        with pytest.raises(OSError):
+            self.pybird.get_bird_status()
+        assert isinstance(self.recorder.queries[-1].error, OSError)
+
+
+class InstrumentKeepaliveTestCase(InstrumentTestCase):
+    multi_query = True
+    keepalive = True
+
+    def test_pipelined(self):
+        self.pybird._send_queries(["show status", 'show protocols all "PS1"'])
+        assert [stats.command for stats in self.recorder.queries] == [
+            "show status",
+            'show protocols all "PS1"',
+        ]
+        for stats in self.recorder.queries:
+            assert_complete(stats)
+        # the connection is opened for the first query only
+        assert self.recorder.queries[0].connect >= 0
+        assert self.recorder.queries[1].connect is None
+
+
+def test_remote(tmpdir):
+    reply_file = os.path.join(
+        data_dir, "commands", "show_route_all_protocol_PS1", "000.input"
+    )
+    recorder = Recorder()
+    bird = fake_remote(tmpdir, reply_file, instrument=recorder)
+    routes = bird.get_routes(peer="PS1")
+    [stats] = recorder.queries
+    assert_complete(stats)
+    assert stats.connect is None
+    assert stats.bytes == os.path.getsize(reply_file)
+    assert recorder.parsed == [ParseStats("routes", recorder.parsed[0].seconds, 1)]
+    assert len(routes) == 1
+
+
+class AsyncInstrumentTestCase(MockBirdTestBase):
+    def test_query(self):
+        recorder = Recorder()
+        bird = AsyncPyBird(socket_file=self.socket_file, instrument=recorder)
+        asyncio.run(bird.get_bird_status())
+        [stats] = recorder.queries
+        assert_complete(stats)
+        assert [stats.parser for stats in recorder.parsed] == ["status"]
+
+
+def test_disabled():
+    bird = PyBird(None)
+    assert bird._query_timer("show status") is None
+    assert bird._parse_status("0001 BIRD 2.0.8 ready.\n0000\n") == {}
+
+
+def query_stats(command="show route all", seconds=0.2, error=None):
+    return QueryStats(command, seconds, 0.001, 0.1, 0.099, 5000, 100, error)
+
+
+def test_logging(caplog):
+    instrument = LoggingInstrumentation()
+    with caplog.at_level(logging.INFO, logger="pybird.instrument"):
+        instrument.query(query_stats())
+        instrument.query(query_stats(error=TimeoutError("late")))
+        instrument.parse(ParseStats("routes", 0.5, 10))
+    assert caplog.messages == [
+        "PyBird: query show route all: 0.200s, connect 0.001s, first byte 0.100s,"
+        " transfer 0.099s, 5000 bytes, 100 lines",
+        "PyBird: query show route all: 0.200s, connect 0.001s, first byte 0.100s,"
+        " transfer 0.099s, 5000 bytes, 100 lines, error TimeoutError('late')",
+        "PyBird: parse routes: 0.500s, 10 records",
+    ]
+
+
+def test_histogram():
+    histogram = Histogram((1, 2, 4))
+    for value in (0.5, 1, 1.5, 3, 10):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.count == 5
+    assert histogram.sum == 16
+    assert histogram.mean == 3.2
+    assert histogram.quantile(0.5) == 2
+    assert histogram.quantile(0.8) == 4
+    assert histogram.quantile(1) is None
+    assert Histogram((1,)).quantile(0.5) is None
+
+
+def test_histogram_instrumentation():
+    instrument = HistogramInstrumentation()
+    instrument.query(query_stats('show route all protocol "PS1"'))
+    instrument.query(query_stats("show route all", seconds=0.02))
+    instrument.query(query_stats(error=OSError()))
+    instrument.parse(ParseStats("routes", 0.5, 10))
+    query_seconds = instrument.get("query_seconds", "show route")
+    assert query_seconds.count == 2
+    assert query_seconds.quantile(1) == 0.25
+    assert instrument.get("reply_bytes", "show route").sum == 10000
+    assert instrument.get("parse_records", "routes").sum == 10
+    assert instrument.errors == {"show route": 1}
+    assert instrument.get("query_seconds", "show status") is None
+
+
+def test_command_label():
+    assert command_label("show route all protocol PS1") == "show route"
+    assert command_label("show status") == "show status"
+    assert command_label("configure") == "configure"
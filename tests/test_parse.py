@@ -0,0 +1,49 @@
+import gzip
+import os
+
+import pytest
+
+from pybird import PyBird, Route
+from pybird.parse import peers_from_file, routes_from_file
+
+this_dir = os.path.dirname(__file__)
+data_dir = os.path.join(this_dir, "data")
+peers_file = os.path.join(data_dir, "commands", "show_protocols_all", "000.input")
+
+
+def test_routes_from_file(tmpdir, data_parse_route_data):
+    data = data_parse_route_data
+    path = tmpdir.join("routes")
+    path.write(data.input)
+    routes = routes_from_file(str(path))
+    assert not isinstance(routes, list)
+    assert list(routes) == data.expected
+
+
+def test_routes_from_gzip_file(tmpdir, data_parse_route_data):
+    data = data_parse_route_data
+    path = str(tmpdir.join("routes.gz"))
+    with gzip.open(path, "wt") as fobj:
+        fobj.write(data.input)
+    assert list(routes_from_file(path, record_type=Route)) == data.expected
+
+
+def test_routes_from_zstd_file(tmpdir, data_parse_route_data):
+    zstandard = pytest.importorskip("zstandard")
+    data = data_parse_route_data
+    path = tmpdir.join("routes.zst")
+    path.write_binary(zstandard.ZstdCompressor().compress(data.input.encode()))
+    assert list(routes_from_file(str(path))) == data.expected
+
+
+def test_routes_from_empty_file(tmpdir):
+    path = tmpdir.join("empty")
+    path.write("")
+    assert list(routes_from_file(str(path))) == []
+
+
+def test_peers_from_file():
+    peers = list(peers_from_file(peers_file))
+    with open(peers_file) as fobj:
+        assert peers == PyBird(None)._parse_peer_data(fobj.read(), True)
+    assert [peer["name"] for peer in peers][:2] == ["PS1", "PS2"]
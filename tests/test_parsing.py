@@ -1,5 +1,7 @@
 import filedata
 
+from pybird import TypedAttributes
+
 
 def assert_parsed(data, parsed):
     # dump in json format for easily adding expected
@@ -17,5 +19,107 @@ def test_parse_route_data(bird, data_parse_route_data):
     assert_parsed(data, bird._parse_route_data(data.input))
 
 
+def test_iter_route_data(bird, data_parse_route_data):
+    data = data_parse_route_data
+    lines = iter(data.input.splitlines())
+    assert_parsed(data, list(bird._iter_route_data(lines)))
+
+
+summary_fields = {"prefix", "peer", "interface", "source", "time"}
+
+
+def test_parse_route_data_fields(bird, data_parse_route_data):
+    data = data_parse_route_data
+    expected = [
+        {
+            key: value
+            for key, value in route.items()
+            if key in summary_fields or key == "as_path"
+        }
+        for route in data.expected
+    ]
+    parsed = bird._parse_route_data(data.input, fields=("prefix", "as_path"))
+    assert parsed == expected
+
+
+def test_parse_route_data_no_attributes(bird, data_parse_route_data):
+    data = data_parse_route_data
+    routes = bird._parse_route_data(data.input, fields=("prefix",))
+    assert [set(route) for route in routes] == [summary_fields for _ in data.expected]
+
+
+def test_parse_route_data_parallel(bird, data_parse_route_data):
+    data = data_parse_route_data
+    bird.parallel_parse_min_size = 0
+    bird.parallel_parse_chunks = 2
+    assert_parsed(data, bird._parse_route_data(data.input, workers=2))
+
+
+def test_split_route_data(bird, data_parse_route_data):
+    data = data_parse_route_data.input
+    chunks = bird._split_route_data(data, 3)
+    assert "".join(chunks) == data
+    assert all(chunk.startswith("1007-") for chunk in chunks[1:])
+
+
+def test_rejected_routes(bird):
+    announced = [
+        {"prefix": "192.0.2.0/24", "next_hop": "10.0.0.1", "as_path": "1 2"},
+        {"prefix": None, "next_hop": "10.0.0.2", "as_path": "3 2"},
+        {"prefix": "198.51.100.0/24", "next_hop": "10.0.0.1", "as_path": "1 4"},
+    ]
+    accepted = [
+        {"prefix": "192.0.2.0/24", "next_hop": "10.0.0.1", "as_path": "1 2"},
+    ]
+    rejected = bird._rejected_routes(announced, accepted)
+    assert rejected == announced[1:]
+
+
+def test_rejected_summary(bird):
+    routes = [
+        {"as_path": "1 2", "large_community": "(65535, 1101, 5) (65535, 1, 2)"},
+        {"as_path": "1 2", "large_community": "(65535, 1101, 9)"},
+        {"as_path": "3 4"},
+    ]
+    summary = bird._rejected_summary(routes, top=1, reason_community="65535:1101")
+    assert summary == {
+        "count": 3,
+        "origin_asns": [(2, 2)],
+        "reasons": {5: 1, 9: 1, None: 1},
+    }
+
+
+def test_rejected_summary_typed(bird):
+    routes = [
+        {"as_path": (1, 2), "large_community": ((65535, 1101, 5), (65535, 1, 2))},
+        {"as_path": (3, frozenset((4, 5)))},
+    ]
+    summary = bird._rejected_summary(routes, reason_community="65535:1101")
+    assert summary == {
+        "count": 2,
+        "origin_asns": [(2, 1), (0, 1)],
+        "reasons": {5: 1, None: 1},
+    }
+
+
+def test_rejected_summary_typed_same(bird):
+    """Test that typed attributes summarize to the same result, with int
+    reasons."""
+    routes = [
+        {"as_path": "1 2", "large_community": "(65535, 1101, 5) (65535, 1, 2)"},
+        {"as_path": "3 4", "large_community": "(65535, 1101, 9)"},
+        {"as_path": "3 4"},
+    ]
+    typed = TypedAttributes()
+    typed_routes = [
+        {key: typed.parse(key, value) for key, value in route.items()}
+        for route in routes
+    ]
+    summary = bird._rejected_summary(routes, reason_community="65535:1101")
+    assert summary["reasons"] == {5: 1, 9: 1, None: 1}
+    typed_summary = bird._rejected_summary(typed_routes, reason_community="65535:1101")
+    assert typed_summary == summary
+
+
 # pytest doesn't load fixtures at runtime
 # so we can't use def make_parse_test(name)
@@ -0,0 +1,70 @@
+import os
+
+from pybird import PyBird
+from pybird.poller import PeerStatusPoller
+
+this_dir = os.path.dirname(__file__)
+data_dir = os.path.join(this_dir, "data")
+
+with open(
+    os.path.join(data_dir, "commands", "show_protocols_all", "000.input")
+) as fobj:
+    PROTOCOLS = fobj.read()
+
+
+def test_first_poll():
+    bird = PyBird(None)
+    poller = PeerStatusPoller(bird)
+    events = poller.update(PROTOCOLS)
+    assert [(event.name, event.kind) for event in events][:2] == [
+        ("PS1", "added"),
+        ("PS2", "added"),
+    ]
+    assert list(poller.peers.values()) == bird._parse_peer_data(PROTOCOLS, True)
+
+
+def test_changes():
+    poller = PeerStatusPoller(PyBird(None))
+    received = []
+    poller.subscribe(received.append)
+    poller.update(PROTOCOLS)
+
+    data = PROTOCOLS.replace(
+        "1002-PS1      BGP      T_PS1    start  2010-06-29  Passive",
+        "1002-PS1      BGP      T_PS1    up     2010-06-30  Established",
+    ).replace(
+        "Routes:         24 imported, 23 exported",
+        "Routes:         30 imported, 23 exported",
+    )
+    received.clear()
+    events = poller.update(data)
+    assert received == events
+    changes = {event.name: event for event in events}
+    assert set(changes) == {"PS1", "PS2"}
+    assert changes["PS1"].changes["state"] == ("Passive", "Established")
+    assert changes["PS1"].changes["up"] == (False, True)
+    assert changes["PS2"].changes == {"routes_imported": (24, 30)}
+    assert changes["PS2"].deltas == {"routes_imported": 6}
+
+
+def test_unchanged_peers_not_parsed():
+    bird = PyBird(None)
+    poller = PeerStatusPoller(bird)
+    poller.update(PROTOCOLS)
+
+    parsed = []
+    parse_peer_detail = bird._parse_peer_detail
+    bird._parse_peer_detail = lambda raw: parsed.append(raw) or parse_peer_detail(raw)
+    assert poller.update(PROTOCOLS) == []
+    assert parsed == []
+
+
+def test_removed_peer():
+    poller = PeerStatusPoller(PyBird(None))
+    poller.update(PROTOCOLS)
+    events = poller.update(PROTOCOLS.replace("1002-PS1 ", "1002-PS9 "))
+    assert [(event.name, event.kind) for event in events] == [
+        ("PS9", "added"),
+        ("PS1", "removed"),
+    ]
+    assert "PS1" not in poller.peers
@@ -0,0 +1,38 @@
+from pybird.protocol import tokenize
+
+REPLY = """0001 BIRD 2.0.8 ready.
+1007-Table master4:
+ 10.0.0.0/24          unicast [bgp1 2022-01-22] * (100) [AS65001i]
+1012-\tBGP.origin: IGP
+ \tBGP.as_path: 65001
+0000
+"""
+
+
+def test_tokenize():
+    assert list(tokenize(REPLY)) == [
+        (1, False, "BIRD 2.0.8 ready."),
+        (1007, False, "Table master4:"),
+        (
+            1007,
+            True,
+            "10.0.0.0/24          unicast [bgp1 2022-01-22] * (100) [AS65001i]",
+        ),
+        (1012, False, "\tBGP.origin: IGP"),
+        (1012, True, "\tBGP.as_path: 65001"),
+        (0, False, ""),
+    ]
+
+
+def test_tokenize_bytes():
+    assert list(tokenize(REPLY.encode("utf-8"))) == list(tokenize(REPLY))
+    lines = [line.encode("utf-8") for line in REPLY.splitlines()]
+    assert list(tokenize(lines)) == list(tokenize(REPLY))
+
+
+def test_tokenize_no_code():
+    assert list(tokenize(["  first", "123", "2001:db8::/32"])) == [
+        (None, True, " first"),
+        (None, True, "123"),
+        (None, True, "2001:db8::/32"),
+    ]
@@ -9,4 +9,4 @@ route_lines = [
 
 def test_route_summary(bird):
     for each in route_lines:
-        print(bird._re_route_summary().match(each).groupdict())
+        print(bird._re_route_summary.match(each).groupdict())
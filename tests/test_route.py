@@ -0,0 +1,98 @@
+import pickle
+
+import pytest
+
+from pybird import LazyRoute, Route
+from pybird.route import iter_prefixed
+
+
+def test_route_roundtrip(bird, data_parse_route_data):
+    data = data_parse_route_data
+    routes = bird._parse_route_data(data.input, record_type=Route)
+    assert all(isinstance(route, Route) for route in routes)
+    assert [route.to_dict() for route in routes] == data.expected
+    assert routes == data.expected
+
+
+def test_route_fields():
+    route = Route(
+        prefix="10.0.0.0/8",
+        peer="10.203.0.143",
+        as_path="65001",
+        extras={"atomic_aggr": True},
+    )
+    assert route.prefix == route["prefix"] == "10.0.0.0/8"
+    assert route["interface"] is None
+    assert route["atomic_aggr"] is True
+    assert route.get("med") is None
+    assert "as_path" in route
+    assert "med" not in route
+    with pytest.raises(KeyError):
+        route["med"]
+    assert route.to_dict() == {
+        "prefix": "10.0.0.0/8",
+        "peer": "10.203.0.143",
+        "interface": None,
+        "source": None,
+        "time": None,
+        "as_path": "65001",
+        "atomic_aggr": True,
+    }
+
+
+def test_route_unknown_field():
+    with pytest.raises(TypeError):
+        Route(atomic_aggr=True)
+
+
+def test_route_slots():
+    with pytest.raises(AttributeError):
+        Route().atomic_aggr = True
+
+
+def test_lazy_route(bird, data_parse_route_data):
+    data = data_parse_route_data
+    routes = bird._parse_route_data(data.input, record_type=LazyRoute)
+    assert routes == data.expected
+    assert [route.to_dict() for route in routes] == data.expected
+
+
+def test_lazy_route_parse_on_access(bird):
+    parsed = []
+
+    def parse(lines):
+        parsed.append(lines)
+        return bird._parse_route_detail(lines)
+
+    route = LazyRoute(
+        {"prefix": "10.0.0.0/8", "peer": "10.203.0.143"},
+        ["BGP.origin: IGP", "BGP.as_path: 65001", "BGP.atomic_aggr:"],
+        parse,
+    )
+    assert route["prefix"] == "10.0.0.0/8"
+    assert "peer" in route
+    assert not parsed
+    assert route["as_path"] == "65001"
+    assert route.get("med") is None
+    assert route["atomic_aggr"] is True
+    assert len(parsed) == 1
+    assert len(route) == 5
+
+
+def test_lazy_route_pickle(bird, data_parse_route_data):
+    routes = bird._parse_route_data(data_parse_route_data.input, record_type=LazyRoute)
+    assert pickle.loads(pickle.dumps(routes)) == data_parse_route_data.expected
+
+
+def test_iter_prefixed():
+    routes = [
+        {"prefix": "10.0.0.0/8"},
+        Route(peer="192.0.2.1"),
+        {"prefix": "10.1.0.0/16"},
+        {"prefix": None},
+    ]
+    prefixes = [prefix for prefix, _ in iter_prefixed(routes)]
+    assert prefixes == ["10.0.0.0/8", "10.0.0.0/8", "10.1.0.0/16", "10.1.0.0/16"]
+    assert list(iter_prefixed([{}], "10.0.0.0/8")) == [("10.0.0.0/8", {})]
+    with pytest.raises(ValueError):
+        list(iter_prefixed([{"prefix": None}]))
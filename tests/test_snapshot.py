@@ -0,0 +1,80 @@
+from pybird import Route, RouteSnapshot
+
+
+def make_routes():
+    return [
+        {
+            "prefix": "10.0.0.0/8",
+            "peer": "192.0.2.1",
+            "next_hop": "192.0.2.1",
+            "as_path": "65001 65002",
+            "local_pref": "100",
+        },
+        {
+            # another path for the same prefix
+            "prefix": None,
+            "peer": "192.0.2.2",
+            "next_hop": "192.0.2.2",
+            "as_path": "65003 65002",
+            "local_pref": "100",
+        },
+        {
+            "prefix": "192.168.0.0/16",
+            "peer": "192.0.2.1",
+            "next_hop": "192.0.2.1",
+            "as_path": "65001",
+            "community": "65001:100",
+        },
+    ]
+
+
+def test_snapshot():
+    snapshot = RouteSnapshot.from_routes(make_routes())
+    assert len(snapshot) == 3
+    assert ("10.0.0.0/8", "192.0.2.2", "192.0.2.2") in snapshot
+
+
+def test_diff():
+    old_routes = make_routes()
+    new_routes = make_routes()
+    new_routes[0]["as_path"] = "65001 65009 65002"
+    new_routes[0]["local_pref"] = "200"
+    new_routes[1]["time"] = "12:00"
+    del new_routes[2]
+    new_routes.append(
+        {"prefix": "172.16.0.0/12", "peer": "192.0.2.1", "next_hop": "192.0.2.1"}
+    )
+
+    old = RouteSnapshot.from_routes(old_routes)
+    new = RouteSnapshot.from_routes(new_routes)
+    added, withdrawn, changed = old.diff(new)
+    assert added == [new_routes[2]]
+    assert withdrawn == [old_routes[2]]
+    assert changed == [
+        (
+            new_routes[0],
+            {
+                "as_path": ("65001 65002", "65001 65009 65002"),
+                "local_pref": ("100", "200"),
+            },
+        )
+    ]
+    assert new.diff(new) == ([], [], [])
+
+
+def test_diff_route_objects():
+    old = RouteSnapshot.from_routes(Route.from_dict(route) for route in make_routes())
+    routes = make_routes()
+    routes[2]["community"] = "65001:100 65001:200"
+    new = RouteSnapshot.from_routes(Route.from_dict(route) for route in routes)
+    (route, deltas) = old.diff(new).changed[0]
+    assert route.prefix == "192.168.0.0/16"
+    assert deltas == {"community": ("65001:100", "65001:100 65001:200")}
+
+
+def test_compared_fields():
+    old = RouteSnapshot.from_routes(make_routes(), compared_fields=["as_path"])
+    routes = make_routes()
+    routes[0]["local_pref"] = "200"
+    new = RouteSnapshot.from_routes(routes, compared_fields=["as_path"])
+    assert old.diff(new).changed == []
@@ -2,15 +2,16 @@ import os
 import socket
 import traceback
 import unittest
+from concurrent.futures import CancelledError
 from datetime import datetime
 from tempfile import mkdtemp
-from threading import Thread
-from time import sleep
+from threading import Event, Thread
+from time import monotonic, sleep
 
 import filedata
 import pytest
 
-from pybird import PyBird
+from pybird import LazyRoute, PyBird, Route, TypedAttributes, _ReplyReader
 
 this_dir = os.path.dirname(__file__)
 data_dir = os.path.join(this_dir, "data")
@@ -22,11 +23,15 @@ class MockBirdTestBase(unittest.TestCase):
     a unix socket
     """
 
+    multi_query = False
+
     def setUp(self):
         tmp_path = mkdtemp()
         self.socket_file = "%s/birdmock" % tmp_path
 
-        self.mock_bird = MockBird(socket_file=self.socket_file)
+        self.mock_bird = MockBird(
+            socket_file=self.socket_file, multi_query=self.multi_query
+        )
         self.mock_bird.start()
         sleep(0.2)
 
@@ -92,11 +97,17 @@ class Expected(PyBird):
 class PyBirdTestCase(MockBirdTestBase):
     """Test the PyBird library"""
 
+    keepalive = False
+
     def setUp(self):
         super().setUp()
-        self.pybird = PyBird(socket_file=self.socket_file)
+        self.pybird = PyBird(socket_file=self.socket_file, keepalive=self.keepalive)
         self.expected = Expected(None)
 
+    def tearDown(self):
+        self.pybird.close()
+        super().tearDown()
+
     def run_method_test(self, name, *args):
         func = getattr(self.pybird, name)
         if not func:
@@ -142,6 +153,16 @@ class PyBirdTestCase(MockBirdTestBase):
         announced_prefixes = self.pybird.get_peer_prefixes_announced("PS1")
         assert len(announced_prefixes) == 2
 
+    def test_peer_summaries(self):
+        summaries = self.pybird.get_peer_summaries()
+        assert [peer["name"] for peer in summaries] == ["PS2", "PS1"]
+        assert summaries[0]["table"] == "T_PS2"
+        assert summaries[0]["up"]
+        assert summaries[1]["state"] == "Passive"
+        assert summaries[1]["info"] == "Passive"
+        status = self.pybird.get_peer_status("PS1")
+        assert set(summaries[1]) < set(status)
+
     def test_specific_peer_prefixes_accepted(self):
         """Test the retrieval of prefixes announced by a peer."""
         accepted_prefixes = self.pybird.get_peer_prefixes_accepted("PS1")
@@ -156,6 +177,154 @@ class PyBirdTestCase(MockBirdTestBase):
         assert len(rejected_prefixes) == 1
         assert rejected_prefixes[0]["as_path"] == "8954 20144"
 
+    def test_rejected_summary(self):
+        summary = self.pybird.get_peer_prefixes_rejected_summary("PS1")
+        assert summary == {"count": 1, "origin_asns": [(20144, 1)]}
+        rejected = self.pybird.iter_peer_prefixes_rejected("PS1")
+        assert not isinstance(rejected, list)
+        assert list(rejected) == self.pybird.get_peer_prefixes_rejected("PS1")
+
+    def test_iter_routes(self):
+        """Test that routes are streamed, and match the non-streaming result."""
+        routes = self.pybird.iter_routes(peer="PS1")
+        assert not isinstance(routes, list)
+        routes = list(routes)
+        assert routes == self.pybird.get_peer_prefixes_accepted("PS1")
+
+    def test_get_routes_send_query_override(self):
+        """Test that routes are read with _send_query() of a subclass."""
+        reply = self.pybird._send_query("show route all protocol PS1")
+        queries = []
+
+        class Recording(PyBird):
+            def _send_query(self, query):
+                queries.append(query)
+                return reply
+
+        bird = Recording(None)
+        assert bird.get_routes(peer="PS1") == self.pybird.get_routes(peer="PS1")
+        assert list(bird.iter_peer_prefixes_rejected("PS1")) == []
+        assert queries == [
+            "show route all protocol PS1",
+            "show route all protocol PS1",
+            "show route table T_PS1 all protocol PS1",
+        ]
+
+    def test_get_routes_record_type(self):
+        routes = self.pybird.get_routes(peer="PS1", record_type=Route)
+        assert routes[0].as_path == "8954 8283"
+        assert routes == self.pybird.get_routes(peer="PS1")
+
+    def test_get_routes_fields(self):
+        routes = self.pybird.get_routes(peer="PS1", fields=["as_path"])
+        assert routes[0] == {
+            "prefix": "2a02:898::/32",
+            "peer": "2001:7f8:1::a500:8954:1",
+            "interface": "eth1",
+            "source": "PS2",
+            "time": "12:46",
+            "as_path": "8954 8283",
+        }
+
+    def test_routes_received_fields(self):
+        routes = self.pybird.get_routes_received("PS1", fields=["as_path"])
+        assert routes
+        assert all("next_hop" not in route for route in routes)
+        assert routes[0]["as_path"]
+
+    def test_rejected_fields(self):
+        rejected = self.pybird.get_peer_prefixes_rejected("PS1", fields=["med"])
+        assert set(rejected[0]) == {
+            "prefix",
+            "peer",
+            "interface",
+            "source",
+            "time",
+            "next_hop",
+            "as_path",
+        }
+        assert rejected[0]["as_path"] == "8954 20144"
+
+    def test_get_routes_typed(self):
+        self.pybird.typed_attributes = TypedAttributes()
+        routes = self.pybird.get_routes(peer="PS1")
+        assert routes[0]["as_path"] == (8954, 8283)
+        assert routes[0]["community"] == ((8954, 220), (8954, 620))
+        assert routes[0]["local_pref"] == 100
+        assert len(self.pybird.get_peer_prefixes_rejected("PS1")) == 1
+
+    def test_get_routes_times(self):
+        self.pybird.route_times = True
+        routes = self.pybird.get_routes(peer="PS1")
+        assert isinstance(routes[0]["time"], datetime)
+
+    def test_max_reply_size(self):
+        self.pybird.max_reply_size = 200
+        with pytest.raises(ValueError, match="max_reply_size"):
+            self.pybird.get_routes(peer="PS1")
+        with pytest.raises(ValueError, match="max_reply_size"):
+            list(self.pybird.iter_routes(peer="PS1"))
+        self.pybird.max_reply_size = None
+        assert self.pybird.get_routes(peer="PS1")
+
+    def test_get_routes_lazy(self):
+        routes = self.pybird.get_routes(peer="PS1", record_type=LazyRoute)
+        assert routes == self.pybird.get_routes(peer="PS1")
+
+    def test_get_routes_columnar(self):
+        table = self.pybird.get_routes(peer="PS1", table="T_PS1", columnar=True)
+        assert len(table) == 2
+        assert table.count(origin_asn=20144) == 1
+        assert list(table) == self.pybird.get_routes(peer="PS1", table="T_PS1")
+
+    def test_get_routes_workers(self):
+        self.pybird.parallel_parse_min_size = 0
+        routes = self.pybird.get_routes(peer="PS1", table="T_PS1", workers=2)
+        assert routes == self.pybird.get_routes(peer="PS1", table="T_PS1")
+
+    def test_get_route_snapshot(self):
+        old = self.pybird.get_route_snapshot(peer="PS1", table="T_PS1")
+        assert len(old) == 2
+        new = self.pybird.get_route_snapshot(peer="PS1")
+        added, withdrawn, changed = old.diff(new)
+        assert (added, changed) == ([], [])
+        assert withdrawn[0]["as_path"] == "8954 20144"
+
+    def test_get_prefix_index(self):
+        index = self.pybird.get_prefix_index(peer="PS1", table="T_PS1")
+        assert index.lookup("2001:500:3::1")[0]["as_path"] == "8954 20144"
+        assert index.lookup("2a02:898::/32") == self.pybird.get_peer_prefixes_accepted(
+            "PS1"
+        )
+
+    def test_route_count(self):
+        count = self.pybird.get_route_count(peer="PS1")
+        assert count == {"routes": 1, "total_routes": 2, "networks": 1, "tables": {}}
+
+    def test_route_count_tables(self):
+        count = self.pybird.get_route_count()
+        assert (count["routes"], count["total_routes"], count["networks"]) == (5, 6, 5)
+        assert count["tables"]["master6"] == {
+            "routes": 2,
+            "total_routes": 3,
+            "networks": 2,
+        }
+
+    def test_route_stats(self):
+        stats = self.pybird.get_route_stats()
+        assert stats["total"] == {"routes": 5, "total_routes": 6, "networks": 5}
+        assert set(stats["tables"]) == {"master4", "master6"}
+        assert stats["protocols"]["PS2"] == {
+            "table": "T_PS2",
+            "routes_imported": 24,
+            "routes_exported": 23,
+        }
+
+    def test_get_routes_table(self):
+        routes = self.pybird.get_routes(peer="PS1", table="T_PS1")
+        assert len(routes) == 2
+        assert routes[1]["prefix"] == "2001:500:3::/48"
+
     def test_specific_peer_prefixes_accepted_nonexistant_peer(self):
         """Test the handling of asking for accepted prefixes for a non-existing peer"""
         accepted_prefixes = self.pybird.get_peer_prefixes_accepted("PS99")
@@ -194,6 +363,63 @@ class PyBirdTestCase(MockBirdTestBase):
             assert expected == status
 
 
+class PyBirdKeepaliveTestCase(PyBirdTestCase):
+    """Run the PyBird tests over a persistent control socket connection"""
+
+    multi_query = True
+    keepalive = True
+
+    def test_single_connection(self):
+        self.pybird.get_bird_status()
+        self.pybird.get_peer_status("PS1")
+        self.pybird.get_peer_prefixes_accepted("PS1")
+        assert self.mock_bird.connections == 1
+
+    def test_pipelined_queries(self):
+        queries = [
+            "show status",
+            'show protocols all "PS1"',
+            "show route all protocol PS1",
+        ]
+        replies = self.pybird._send_queries(queries)
+        assert len(replies) == 3
+        assert "router_id" in self.pybird._parse_status(replies[0])
+        assert "1002-PS1" in replies[1]
+        assert len(self.pybird._parse_route_data(replies[2])) == 1
+        assert self.mock_bird.connections == 1
+
+    def test_pipelined_rejected(self):
+        assert len(self.pybird.get_peer_prefixes_rejected("PS1")) == 1
+        assert self.pybird.get_bird_status()
+        assert self.mock_bird.connections == 1
+
+    def test_reconnect(self):
+        """Test that the connection is reopened after BIRD closed it."""
+        self.pybird.get_bird_status()
+        self.mock_bird.drop_sessions()
+        sleep(0.1)
+        assert self.pybird.get_peer_status("PS1")["name"] == "PS1"
+        assert self.mock_bird.connections == 2
+
+    def test_query_while_streaming(self):
+        """Test that a query while iterating over a streamed reply raises,
+        instead of waiting for the connection forever."""
+        routes = self.pybird.iter_routes(peer="PS1", table="T_PS1")
+        next(routes)
+        with pytest.raises(RuntimeError):
+            self.pybird.get_bird_status()
+        routes.close()
+        assert self.pybird.get_bird_status()
+
+    def test_partial_read_closes(self):
+        """Test that a reply that was not read completely is not reused."""
+        routes = self.pybird.iter_routes(peer="PS1", table="T_PS1")
+        next(routes)
+        routes.close()
+        assert self.pybird._session is None
+        assert len(self.pybird.get_peer_prefixes_accepted("PS1")) == 1
+
+
 class MockBirdTestCase(MockBirdTestBase):
     """Run a basic test to see whether our mocked BIRD control socket
     actually works. Can save a lot of work in debugging."""
@@ -293,15 +519,215 @@ class MockBirdTestCase(MockBirdTestBase):
         )
 
 
+def make_reply(routes, end="0000"):
+    route = (
+        "1007-10.0.{}.0/24 via 10.203.0.143 on eth0 [peer 2017-01-15] * (100)\n"
+        "1008-   Type: BGP unicast univ\n"
+        "1012-   BGP.origin: IGP\n"
+        "        BGP.as_path: 65001\n"
+    )
+    body = "".join(route.format(i % 256) for i in range(routes))
+    return f"0001 BIRD 1.6.0 ready.\n{body}{end}\n"
+
+
+def reply_reader(data, bufsize=64):
+    """_ReplyReader with a tiny buffer, reading data sent in small pieces"""
+    sock, peer = socket.socketpair()
+
+    def send():
+        try:
+            for start in range(0, len(data), 7):
+                end = start + 7
+                peer.sendall(data[start:end])
+        except OSError:
+            # the reader stopped reading
+            pass
+        peer.close()
+
+    Thread(target=send, daemon=True).start()
+    return _ReplyReader(sock, PyBird.reply_end_fields, bufsize=bufsize)
+
+
+@pytest.mark.parametrize("end", ["0000", "0000 ", "8001 Network not in table"])
+def test_reply_reader_pipelined(end):
+    first = make_reply(100, end)
+    second = make_reply(3)
+    data = (first + second + first).encode("utf-8")
+    reader = reply_reader(data)
+    assert reader.read_reply(last=False) == first
+    assert list(reader.read_lines(last=False)) == second.splitlines()
+    assert not reader.in_reply
+    assert reader.read_reply() == first
+    with pytest.raises(ValueError):
+        reader.read_reply()
+
+
+def test_reply_reader_shrinks():
+    """Test that the buffer goes back to its initial size after a large
+    reply, keeping the data of the next reply."""
+    first = make_reply(100)
+    second = make_reply(1)
+    reader = reply_reader((first + second + first).encode("utf-8"), bufsize=256)
+    assert reader.read_reply(last=False) == first
+    assert list(reader.read_lines(last=False)) == second.splitlines()
+    assert list(reader.read_lines()) == first.splitlines()
+    assert len(reader._buf) == 256
+
+
+def test_reply_reader_lines():
+    data = make_reply(100)
+    assert list(reply_reader(data.encode("utf-8")).read_lines()) == data.splitlines()
+
+
+def test_reply_reader_code_in_line():
+    """Test that reply codes are only recognized at the start of a line."""
+    data = "1007-0000 \n 0000-\n10000\n0000\n"
+    assert reply_reader(data.encode("utf-8")).read_reply() == data
+
+
+def test_reply_reader_unterminated_line():
+    reader = reply_reader(b"0001 BIRD 1.6.0 ready.\n0013 Daemon is up")
+    assert list(reader.read_lines())[-1] == "0013 Daemon is up"
+
+
+def test_reply_reader_max_size():
+    data = make_reply(100).encode("utf-8")
+    reader = reply_reader(data)
+    reader.limit(max_size=len(data))
+    assert reader.read_reply()
+    reader = reply_reader(data)
+    reader.limit(max_size=len(data) // 2)
+    with pytest.raises(ValueError):
+        reader.read_reply()
+
+
+@pytest.fixture
+def silent_bird(tmpdir):
+    """The socket file of a BIRD that accepts connections, but never replies"""
+    socket_file = str(tmpdir.join("bird.ctl"))
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(socket_file)
+    sock.listen(8)
+    yield socket_file
+    sock.close()
+
+
+@pytest.mark.parametrize("keepalive", [False, True])
+def test_timeout(silent_bird, keepalive):
+    bird = PyBird(silent_bird, keepalive=keepalive, timeout=0.2)
+    start = monotonic()
+    with pytest.raises(TimeoutError):
+        bird.get_bird_status()
+    with pytest.raises(TimeoutError):
+        list(bird.iter_routes())
+    assert monotonic() - start < 2
+    assert bird._session is None
+
+
+def test_deadline(silent_bird):
+    bird = PyBird(silent_bird, timeout=10)
+    start = monotonic()
+    with bird.deadline(1):
+        with bird.deadline(0.2):
+            with pytest.raises(TimeoutError):
+                bird.get_bird_status()
+        assert bird._query_deadline() - monotonic() <= 1
+    assert monotonic() - start < 2
+    assert bird._query_deadline() - monotonic() > 9
+
+
+def cancel_until(bird, done):
+    """Cancel the queries of bird until done is set, in a thread"""
+
+    def cancel():
+        # the query may not have started yet
+        while not done.wait(0.05):
+            bird.cancel()
+
+    Thread(target=cancel, daemon=True).start()
+
+
+@pytest.mark.parametrize("keepalive", [False, True])
+def test_cancel(silent_bird, keepalive):
+    bird = PyBird(silent_bird, keepalive=keepalive)
+    done = Event()
+    cancel_until(bird, done)
+    try:
+        with pytest.raises(CancelledError):
+            bird.get_bird_status()
+    finally:
+        done.set()
+    assert not bird._running
+    assert bird._session is None
+
+
+@pytest.fixture
+def banner_bird(tmpdir):
+    """The socket file of a BIRD that greets, but never replies to queries"""
+    socket_file = str(tmpdir.join("bird.ctl"))
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(socket_file)
+    sock.listen(8)
+    connections = []
+
+    def accept():
+        while True:
+            try:
+                conn, _ = sock.accept()
+            except OSError:
+                return
+            connections.append(conn)
+            conn.sendall(b"0001 BIRD 2.0.8 ready.\n")
+
+    Thread(target=accept, daemon=True).start()
+    yield socket_file
+    sock.close()
+    for conn in connections:
+        conn.close()
+
+
+def test_cancel_keepalive_queries(banner_bird):
+    """Test that cancel() aborts a keepalive query waiting for its reply, and
+    one waiting for the connection."""
+    bird = PyBird(banner_bird, keepalive=True)
+    errors = []
+
+    def query():
+        try:
+            bird.get_bird_status()
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [Thread(target=query) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    done = Event()
+    cancel_until(bird, done)
+    try:
+        for thread in threads:
+            thread.join(5)
+            assert not thread.is_alive()
+    finally:
+        done.set()
+    assert [type(error) for error in errors] == [CancelledError] * 2
+    assert not bird._running
+    assert bird._session_owner is None
+
+
 class MockBird(Thread):
     """
     very small Mock(ing?) BIRD control socket, that can understand
     a few commands and reply with static output. Note that this is the same
-    for IPv4 and IPv6. This Mock BIRD only accepts one query per connect.
+    for IPv4 and IPv6. This Mock BIRD only accepts one query per connect,
+    unless multi_query is set: then it greets with a banner, like BIRD does,
+    and answers queries until the client disconnects.
     """
 
-    def __init__(self, socket_file):
+    def __init__(self, socket_file, multi_query=False):
         Thread.__init__(self)
+        self.multi_query = multi_query
+        self.connections = 0
+        self.sessions = []
 
         self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
         try:
@@ -334,21 +760,77 @@ class MockBird(Thread):
             except StopIteration:
                 pass
 
+    def drop_sessions(self):
+        """close all multi query connections from the server side"""
+        for conn in self.sessions:
+            conn.shutdown(socket.SHUT_RDWR)
+
+    def serve_session(self, conn, data):
+        """answer queries on conn until the client disconnects"""
+        self.sessions.append(conn)
+        while True:
+            while b"\n" not in data:
+                this_read = conn.recv(1024)
+                if not this_read:
+                    conn.close()
+                    return
+                data += this_read
+            cmd, data = data.split(b"\n", 1)
+
+            try:
+                response = self.get_response(cmd + b"\n")
+            except Exception as e:
+                self.send_error(conn, e)
+                conn.close()
+                return
+
+            # the banner was sent on connect
+            response = "".join(
+                line
+                for line in response.splitlines(True)
+                if not line.startswith("0001 ")
+            )
+            try:
+                conn.sendall(response.encode("utf-8"))
+            except OSError:
+                return
+
     def run(self):
         while 1:
             try:
                 conn, addr = self.socket.accept()
+                if self.multi_query:
+                    try:
+                        conn.send(b"0001 BIRD 1.3.0 ready.\n")
+                    except OSError:
+                        # the client closed the connection already, after
+                        # sending its command, like "terminate mockserver"
+                        pass
                 cmd = conn.recv(1024)
 
                 if not cmd or cmd == b"terminate mockserver\n":
                     break
 
+                self.connections += 1
+                if self.multi_query:
+                    Thread(
+                        target=self.serve_session, args=(conn, cmd), daemon=True
+                    ).start()
+                    continue
+
                 response = self.get_response(cmd)
                 if not isinstance(response, bytes):
                     response = response.encode("utf-8")
                 conn.send(response)
 
             except Exception as e:
-                conn.send(f"{str(e)}: {traceback.format_exc()}".encode())
+                self.send_error(conn, e)
 
             conn.close()
+
+    def send_error(self, conn, e):
+        try:
+            conn.send(f"{str(e)}: {traceback.format_exc()}".encode())
+        except OSError:
+            # the client already closed the connection
+            pass
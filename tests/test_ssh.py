@@ -0,0 +1,160 @@
+import os
+import stat
+import time
+
+import pytest
+
+import pybird
+from pybird import PyBird
+
+this_dir = os.path.dirname(__file__)
+data_dir = os.path.join(this_dir, "data")
+
+
+def make_script(path, body):
+    path.write("#!/bin/sh\n" + body)
+    path.chmod(stat.S_IRWXU)
+    return str(path)
+
+
+def fake_remote(tmpdir, reply_file, **kwargs):
+    """PyBird with ssh replaced by a local shell, and birdc by cat"""
+    bird = PyBird(
+        "/run/bird.ctl",
+        hostname="router",
+        user="bird",
+        bird_cmd=make_script(tmpdir.join("birdc"), f"cat {reply_file}\n"),
+        **kwargs,
+    )
+    # run the last argument, the remote command, locally
+    bird.ssh_cmd = make_script(
+        tmpdir.join("ssh"), 'for cmd; do :; done\nexec sh -c "$cmd"\n'
+    )
+    return bird
+
+
+def test_remote_routes(tmpdir):
+    reply_file = os.path.join(
+        data_dir, "commands", "show_route_all_protocol_PS1", "000.input"
+    )
+    bird = fake_remote(tmpdir, reply_file)
+    routes = bird.iter_routes(peer="PS1")
+    assert not isinstance(routes, list)
+    assert list(routes) == bird.get_routes(peer="PS1")
+    assert bird.get_routes(peer="PS1")[0]["as_path"] == "8954 8283"
+
+
+def test_ssh_command():
+    bird = PyBird("/run/bird.ctl", hostname="router", user="bird")
+    cmd = bird._ssh_command("birdc")
+    assert cmd[0] == "ssh"
+    assert cmd[-2:] == ["bird@router", "birdc"]
+    assert "ControlMaster=auto" not in cmd
+
+
+def test_ssh_command_keepalive():
+    bird = PyBird("/run/bird.ctl", hostname="router", user="bird", keepalive=True)
+    cmd = bird._ssh_command("birdc")
+    assert "ControlMaster=auto" in cmd
+    assert "ControlPersist=600" in cmd
+    control_path = [opt for opt in cmd if opt.startswith("ControlPath=")][0]
+    assert control_path.endswith("%C")
+    # all instances share the connection to the host
+    other = PyBird("/run/bird.ctl", hostname="router", user="bird", keepalive=True)
+    assert control_path in other._ssh_command("birdc")
+
+
+def test_remote_timeout(tmpdir):
+    bird = fake_remote(tmpdir, "/dev/null", timeout=0.2, config_file="/etc/bird.conf")
+    # an ssh connection that hangs
+    bird.ssh_cmd = make_script(tmpdir.join("slow_ssh"), "exec sleep 10\n")
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        bird.get_bird_status()
+    with pytest.raises(TimeoutError):
+        list(bird.iter_routes())
+    with pytest.raises(TimeoutError):
+        bird.get_config()
+    assert time.monotonic() - start < 5
+
+
+def test_remote_max_reply_size(tmpdir):
+    reply_file = os.path.join(
+        data_dir, "commands", "show_route_all_protocol_PS1", "000.input"
+    )
+    bird = fake_remote(tmpdir, reply_file, max_reply_size=100)
+    with pytest.raises(ValueError, match="max_reply_size"):
+        bird.get_routes(peer="PS1")
+
+
+def test_remote_stdin(tmpdir):
+    """Test that ssh doesn't read the stdin of the calling process."""
+    reply_file = os.path.join(
+        data_dir, "commands", "show_route_all_protocol_PS1", "000.input"
+    )
+    bird = fake_remote(tmpdir, reply_file)
+    bird.ssh_cmd = make_script(
+        tmpdir.join("ssh"),
+        f'cat > {tmpdir.join("stdin")}\nfor cmd; do :; done\nexec sh -c "$cmd"\n',
+    )
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, b"for the caller\n")
+    os.close(write_fd)
+    stdin = os.dup(0)
+    os.dup2(read_fd, 0)
+    try:
+        assert bird.get_routes(peer="PS1")
+        assert list(bird.iter_routes(peer="PS1"))
+    finally:
+        os.dup2(stdin, 0)
+        os.close(stdin)
+    assert tmpdir.join("stdin").read() == ""
+    assert os.read(read_fd, 100) == b"for the caller\n"
+    os.close(read_fd)
+
+
+def control_ssh(tmpdir, ssh_log):
+    """fake ssh like fake_remote(), that logs stopping the master to ssh_log"""
+    return make_script(
+        tmpdir.join("control_ssh"),
+        f'case "$*" in *"-O exit"*) echo exit >> {ssh_log}; exit 0;; esac\n'
+        'for cmd; do :; done\nexec sh -c "$cmd"\n',
+    )
+
+
+def test_close_shared_master(tmpdir):
+    """Test that the ssh master is only stopped by the last instance using
+    it."""
+    reply_file = os.path.join(data_dir, "commands", "show_status", "000.input")
+    ssh_log = tmpdir.join("ssh.log")
+    birds = [fake_remote(tmpdir, reply_file, keepalive=True) for _ in range(2)]
+    ssh_cmd = control_ssh(tmpdir, ssh_log)
+    for bird in birds:
+        bird.ssh_cmd = ssh_cmd
+        bird.get_bird_status()
+        bird.get_bird_status()
+    birds[0].close()
+    assert not ssh_log.exists()
+    assert birds[1].get_bird_status()
+    birds[1].close()
+    assert ssh_log.read() == "exit\n"
+    # closing again, or without a connection, doesn't stop a master
+    birds[1].close()
+    fake_remote(tmpdir, reply_file, keepalive=True).close()
+    assert ssh_log.read() == "exit\n"
+
+
+def test_exit_stops_masters(tmpdir, monkeypatch):
+    """Test that ssh masters still running at exit are stopped, and the
+    control socket directory is removed."""
+    control_dir = tmpdir.mkdir("control")
+    monkeypatch.setattr(pybird, "_ssh_control_dir_path", str(control_dir))
+    monkeypatch.setattr(pybird, "_ssh_master_options", {})
+    reply_file = os.path.join(data_dir, "commands", "show_status", "000.input")
+    ssh_log = tmpdir.join("ssh.log")
+    bird = fake_remote(tmpdir, reply_file, keepalive=True)
+    bird.ssh_cmd = control_ssh(tmpdir, ssh_log)
+    assert bird.get_bird_status()
+    pybird._remove_ssh_control_dir()
+    assert ssh_log.read() == "exit\n"
+    assert not control_dir.exists()
@@ -0,0 +1,125 @@
+from pybird import PyBird, Route, RouteTable, TypedAttributes
+
+
+def make_routes():
+    return [
+        {
+            "prefix": "10.0.0.0/8",
+            "peer": "192.0.2.1",
+            "interface": "eth0",
+            "source": "peer1",
+            "time": "2017-01-14",
+            "as_path": "65001 65002",
+            "community": "65001:100 65001:200",
+        },
+        {
+            # another path for the same prefix
+            "prefix": None,
+            "peer": "192.0.2.2",
+            "interface": "eth0",
+            "source": "peer2",
+            "time": "2017-01-14",
+            "as_path": "65003 65002",
+        },
+        {
+            "prefix": "2001:db8::/32",
+            "peer": "2001:db8::1",
+            "interface": "eth0",
+            "source": "peer3",
+            "time": "2017-01-14",
+            "as_path": "65004 {65005 65006}",
+            "community": "65001:200",
+        },
+        {
+            "prefix": "192.0.2.0/24",
+            "peer": None,
+            "interface": None,
+            "source": "static1",
+            "time": "2017-01-14",
+        },
+    ]
+
+
+def test_roundtrip(bird, data_parse_route_data):
+    data = data_parse_route_data
+    routes = bird._parse_route_data(data.input, record_type=Route)
+    table = RouteTable.from_routes(routes)
+    assert len(table) == len(data.expected)
+    assert list(table) == data.expected
+
+
+def test_columns():
+    table = RouteTable.from_routes(make_routes())
+    assert len(table) == 4
+    assert table.prefix(1) == "10.0.0.0/8"
+    assert table.prefix(2) == "2001:db8::/32"
+    assert table[2]["as_path"] == "65004 {65005 65006}"
+    assert list(table.origin_asn) == [65002, 65002, 0, 0]
+    assert table.counts("family") == {4: 3, 6: 1}
+    assert table.counts("source")["peer1"] == 1
+
+
+def test_filters():
+    table = RouteTable.from_routes(make_routes())
+    assert list(table.select(peer="192.0.2.1")) == [0]
+    assert list(table.select(peer=["192.0.2.1", "192.0.2.2"])) == [0, 1]
+    assert list(table.select(origin_asn=65002)) == [0, 1]
+    assert list(table.select(prefixlen=range(16, 33))) == [2, 3]
+    assert list(table.select(community="65001:200")) == [0, 2]
+    assert list(table.select(community="65001:200", family=6)) == [2]
+    assert list(table.select(community="65001:200", origin_asn=65002)) == [0]
+    assert table.count(prefixlen=8) == 2
+    assert table.count(peer="192.0.2.9") == 0
+
+
+def test_filter_table():
+    table = RouteTable.from_routes(make_routes()).filter(origin_asn=65002)
+    assert len(table) == 2
+    assert [route["source"] for route in table] == ["peer1", "peer2"]
+    assert table.counts("as_path") == {"65001 65002": 1, "65003 65002": 1}
+    assert table.count(community="65001:100") == 1
+
+
+LARGE_COMMUNITY_ROUTES = """0001 BIRD 2.0.8 ready.
+1007-192.0.2.0/24       unicast [RS1 2021-05-05] * (100) [AS65002i]
+\tvia 10.0.0.1 on eth0
+1008-\tType: BGP univ
+1012-\tBGP.origin: IGP
+\tBGP.as_path: 65001 65002
+\tBGP.next_hop: 10.0.0.1
+\tBGP.local_pref: 100
+\tBGP.community: (65001,100)
+\tBGP.large_community: (65535, 1101, 5) (65535, 1101, 6)
+1007-198.51.100.0/24    unicast [RS1 2021-05-05] * (100) [AS65003i]
+\tvia 10.0.0.1 on eth0
+1008-\tType: BGP univ
+1012-\tBGP.origin: IGP
+\tBGP.as_path: 65001 65003
+\tBGP.next_hop: 10.0.0.1
+\tBGP.local_pref: 100
+\tBGP.large_community: (65535, 1101, 6)
+0000
+"""
+
+
+def test_large_communities(bird):
+    routes = bird._parse_route_data(LARGE_COMMUNITY_ROUTES)
+    assert routes[0]["large_community"] == "(65535, 1101, 5) (65535, 1101, 6)"
+    table = RouteTable.from_routes(routes)
+    assert list(table.select(large_community="65535:1101:5")) == [0]
+    assert list(table.select(large_community="(65535, 1101, 6)")) == [0, 1]
+    assert list(table.select(large_community=["65535:1101:5", "1:2:3"])) == [0]
+    assert table.count(large_community="65535:1101") == 0
+    assert list(table.select(community="65001:100")) == [0]
+
+
+def test_typed_communities():
+    bird = PyBird(None, typed_attributes=TypedAttributes())
+    routes = bird._parse_route_data(LARGE_COMMUNITY_ROUTES)
+    assert routes[0]["community"] == ((65001, 100),)
+    table = RouteTable.from_routes(routes)
+    assert list(table.select(community="65001:100")) == [0]
+    assert list(table.select(community=(65001, 100))) == [0]
+    assert list(table.select(large_community="65535:1101:6")) == [0, 1]
+    assert list(table.select(large_community=[(65535, 1101, 5)])) == [0]
+    assert list(table.origin_asn) == [65002, 65003]